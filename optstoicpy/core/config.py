@@ -1,28 +1,72 @@
 import os
 from os.path import dirname, abspath, normpath
-import pandas as pd
+import csv
 import json
+from functools import lru_cache
 # import pdb
 
 current_dir = dirname(abspath(__file__))
 data_dir = normpath(os.path.join(current_dir, '../data'))
 
-# Load cofactors list
-cofactors_df = pd.read_csv(os.path.join(data_dir, 'cofactors.csv'))
-cofactorsList = cofactors_df['KEGG_ID'].tolist()
-cofactors = set(cofactorsList)
+# The data files below are only read the first time they are needed, so that
+# importing Reaction/Pathway (e.g. to post-process pathway JSON files) stays
+# cheap. The module attributes rxnSji, kegg_compound, cofactors and
+# cofactorsList are still available and resolve to the cached data.
+COFACTORS_FILEPATH = os.path.join(data_dir, 'cofactors.csv')
 
 # reaction Sij
 # rxnSij = json.load(open(
 #    os.path.join(data_dir, 'optstoic_db_v2',
 #                 '20160616_optstoic_Sji_dict.json')
 #    ,'r+'))
-rxnSji = json.load(open(os.path.join(data_dir,
-                                     'optstoic_db_v3',
-                                     'optstoic_v3_Sji_dict.json'), 'r+'))
+RXNSJI_FILEPATH = os.path.join(data_dir,
+                               'optstoic_db_v3',
+                               'optstoic_v3_Sji_dict.json')
+
+KEGG_COMPOUND_FILEPATH = os.path.join(data_dir, 'kegg_compound.json')
+
+
+@lru_cache(maxsize=None)
+def get_cofactors_list():
+    """Return the list of cofactor KEGG IDs (data/cofactors.csv)."""
+    with open(COFACTORS_FILEPATH, 'r', newline='') as f:
+        return [row['KEGG_ID'] for row in csv.DictReader(f)]
+
+
+@lru_cache(maxsize=None)
+def get_cofactors():
+    """Return the set of cofactor KEGG IDs."""
+    return set(get_cofactors_list())
+
+
+@lru_cache(maxsize=None)
+def get_rxnSji():
+    """Return the default reaction stoichiometry {rxn: {met: coeff}}."""
+    with open(RXNSJI_FILEPATH, 'r') as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def get_kegg_compound():
+    """Return the {KEGG compound ID: compound name} dictionary."""
+    with open(KEGG_COMPOUND_FILEPATH, 'r') as f:
+        return json.load(f)
+
+
+_LAZY_ATTRIBUTES = {
+    'cofactorsList': get_cofactors_list,
+    'cofactors': get_cofactors,
+    'rxnSji': get_rxnSji,
+    'kegg_compound': get_kegg_compound,
+}
+
+
+def __getattr__(name):
+    # Lazily resolve the module-level data (PEP 562)
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
-kegg_compound = json.load(open(os.path.join(data_dir,
-                                            'kegg_compound.json'), 'r+'))
 
 # Kegg_model default argument
 default_bound = {
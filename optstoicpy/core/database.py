@@ -5,7 +5,21 @@ from builtins import object
 import os
 import json
 import copy
+import bisect
+import shutil
+import hashlib
+import tempfile
+from multiprocessing import shared_memory, resource_tracker, parent_process
+from types import MappingProxyType
+from contextlib import contextmanager
+from collections import OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from optstoicpy.script import gams_parser
 from optstoicpy.script.utils import create_logger
 
@@ -13,6 +27,81 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.normpath(
     os.path.join(CURRENT_DIR, '../data/', 'optstoic_db_v3')
 )
+# Directory of the binary database snapshots (see load_db_v3)
+CACHE_DIR = os.environ.get(
+    'OPTSTOICPY_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'optstoicpy'))
+# Increase when the snapshot format or the preparation steps change
+SNAPSHOT_VERSION = 1
+# Alignment (bytes) of the arrays in a shared memory block
+SHARED_MEMORY_ALIGNMENT = 64
+
+
+def _in_sorted_list(sorted_list, item):
+    """Binary search for item in a sorted list."""
+    ind = bisect.bisect_left(sorted_list, item)
+    return ind < len(sorted_list) and sorted_list[ind] == item
+
+
+class StoichiometryView(Mapping):
+    """A lazy, read-only nested dictionary view of a sparse S matrix.
+
+    view[key] returns a read-only {label: coefficient} mapping of one row
+    (S view) or one column (Sji view) of the matrix. Each entry is only
+    materialized when it is accessed.
+    """
+
+    def __init__(self, matrix, labels, other_labels, index=None,
+                 excluded=None, cache=None):
+        """
+        Args:
+            matrix (scipy.sparse.csr_matrix or csc_matrix): CSR for a row view,
+                CSC for a column view.
+            labels (list): Labels of the outer keys (rows for CSR, columns for CSC)
+            other_labels (list): Labels of the inner keys
+            index (dict, optional): {label: position} of the outer keys
+            excluded (set, optional): Outer keys to be hidden from the view
+            cache (dict, optional): Materialized entries shared with the owner,
+                so that entries of untouched rows/columns survive matrix updates.
+        """
+        self._matrix = matrix
+        self._labels = labels
+        self._other_labels = other_labels
+        if index is None:
+            index = dict((k, ind) for ind, k in enumerate(labels))
+        self._index = index
+        self._excluded = excluded if excluded is not None else set()
+        self._cache = cache if cache is not None else {}
+
+    def __getitem__(self, key):
+        if key in self._excluded:
+            raise KeyError(key)
+        if key in self._cache:
+            return self._cache[key]
+        ind = self._index[key]
+        start, end = self._matrix.indptr[ind], self._matrix.indptr[ind + 1]
+        entry = MappingProxyType(dict(
+            (self._other_labels[k], float(c)) for k, c in zip(
+                self._matrix.indices[start:end], self._matrix.data[start:end])
+        ))
+        self._cache[key] = entry
+        return entry
+
+    def __contains__(self, key):
+        return key in self._index and key not in self._excluded
+
+    def __iter__(self):
+        return (k for k in self._labels if k not in self._excluded)
+
+    def __len__(self):
+        return len(self._labels) - len(self._excluded)
+
+    def to_dict(self):
+        """Return a copy of the view as a nested dictionary."""
+        return dict((k, dict(v)) for k, v in self.items())
+
+    def __repr__(self):
+        return "<StoichiometryView(%d entries)>" % len(self)
 
 
 class BaseReactionDatabase(object):
@@ -20,6 +109,10 @@ class BaseReactionDatabase(object):
 
     This converts GAMS model files to Python while retaining the
     model structure that GAMS users are familiar with.
+
+    The stoichiometry is stored once as a scipy.sparse CSC matrix
+    (metabolites x reactions). The nested dictionaries S (S[i][j]) and
+    Sji (Sji[j][i]) are lazy read-only views of the matrix.
     """
     REACTION_TYPE = {0: 'Forward irreversible', 1: 'Reversible',
                      2: 'Reverse irreverisble', 4: 'Export reaction'}
@@ -43,11 +136,14 @@ class BaseReactionDatabase(object):
         # initalize
         self.reactions = []
         self.metabolites = []
-        self.S = {}
-        self.Sji = {}
         self.rxntype = []
         self.user_defined_export_rxns = []
         self._S_df = None
+        self._set_S_matrix([], [], sparse.csc_matrix((0, 0)))
+        # Deferred changes (see batch())
+        self._batch_depth = 0
+        self._pending_entries = []
+        self._pending_reactions = set()
 
     def load(self):
         # Method 1: JSON approach
@@ -59,10 +155,9 @@ class BaseReactionDatabase(object):
                         self.data_filepath,
                         self.dbdict_json['Sji']),
                     'r+'))
-            self.S = self.transpose_S(self.Sji)
-            self.reactions = sorted(self.Sji.keys())
+            self.reactions = list(self._reaction_labels)
             self.internal_rxns = copy.deepcopy(self.reactions)
-            self.metabolites = sorted(self.S.keys())
+            self.metabolites = list(self._metabolite_labels)
             self.logger.debug('Reading reaction type file...')
             self.rxntype = json.load(
                 open(
@@ -78,20 +173,19 @@ class BaseReactionDatabase(object):
                 os.path.join(self.data_filepath,
                              self.dbdict_gams['Sji'])
             )
-            self.Sji = self.transpose_S(self.S)
 
             # Load reactions
             self.logger.debug('Reading reaction file...')
-            self.reactions = gams_parser.convert_set_to_list(
+            self.reactions = sorted(gams_parser.convert_set_to_list(
                 os.path.join(self.data_filepath, self.dbdict_gams['reaction'])
-            )
+            ))
             # Create internal reactions list
             self.internal_rxns = copy.deepcopy(self.reactions)
 
             self.logger.debug('Reading metabolite file...')
-            self.metabolites = gams_parser.convert_set_to_list(
+            self.metabolites = sorted(gams_parser.convert_set_to_list(
                 os.path.join(self.data_filepath, self.dbdict_gams['metabolite'])
-            )
+            ))
 
             self.logger.debug('Reading reaction type file...')
             self.rxntype = gams_parser.convert_parameter_list_to_dict(
@@ -121,46 +215,339 @@ class BaseReactionDatabase(object):
         if None in set(self.rxntype.values()):
             raise Exception("Some reaction type is not assigned!")
 
+    def _set_S_matrix(self, metabolites, reactions, Smat,
+                      touched_metabolites=None, touched_reactions=None):
+        """Replace the stoichiometric matrix.
+
+        Args:
+            metabolites (list): Row labels
+            reactions (list): Column labels
+            Smat (scipy.sparse.spmatrix): The S matrix (metabolites x reactions)
+            touched_metabolites (set, optional): If provided (together with
+                touched_reactions), only the cached S/Sji entries of the touched
+                rows and columns are discarded. Otherwise, the matrix is considered
+                new and all pending changes and cached entries are discarded.
+            touched_reactions (set, optional): See touched_metabolites
+        """
+        if touched_metabolites is None or touched_reactions is None:
+            # Reactions removed with refresh_database=False
+            self._pending_removal = set()
+            self._S_cache = {}
+            self._Sji_cache = {}
+        else:
+            for met in touched_metabolites:
+                self._S_cache.pop(met, None)
+            for rxn in touched_reactions:
+                self._Sji_cache.pop(rxn, None)
+
+        self._metabolite_labels = list(metabolites)
+        self._reaction_labels = list(reactions)
+        self._Smat = sparse.csc_matrix(
+            Smat, shape=(len(self._metabolite_labels),
+                         len(self._reaction_labels)))
+        self._metabolite_index = dict(
+            (k, ind) for ind, k in enumerate(self._metabolite_labels))
+        self._reaction_index = dict(
+            (k, ind) for ind, k in enumerate(self._reaction_labels))
+        self._invalidate_views()
+
+    def _invalidate_views(self):
+        self._S_view = None
+        self._Sji_view = None
+        self._Smat_csr = None
+        self._S_df = None
+
+    @staticmethod
+    def _dict_to_S_matrix(Sdict, orient='S'):
+        """Convert a nested dictionary to a sparse S matrix.
+
+        Args:
+            Sdict (dict): Either S[i][j] (orient='S') or Sji[j][i] (orient='Sji')
+            orient (str, optional): 'S' or 'Sji'
+
+        Returns:
+            tuple: (sorted metabolites, sorted reactions, scipy.sparse.csc_matrix)
+        """
+        outer = sorted(Sdict.keys())
+        inner = sorted(set(k for entries in Sdict.values() for k in entries))
+        inner_index = dict((k, ind) for ind, k in enumerate(inner))
+
+        outer_ind = []
+        inner_ind = []
+        coeffs = []
+        for ind, k in enumerate(outer):
+            for k2, coeff in Sdict[k].items():
+                outer_ind.append(ind)
+                inner_ind.append(inner_index[k2])
+                coeffs.append(float(coeff))
+
+        if orient == 'S':
+            metabolites, reactions = outer, inner
+            rows, cols = outer_ind, inner_ind
+        elif orient == 'Sji':
+            metabolites, reactions = inner, outer
+            rows, cols = inner_ind, outer_ind
+        else:
+            raise ValueError("orient must be either 'S' or 'Sji'!")
+
+        Smat = sparse.csc_matrix(
+            (np.array(coeffs, dtype=np.float64), (rows, cols)),
+            shape=(len(metabolites), len(reactions)))
+        return metabolites, reactions, Smat
+
+    @property
+    def S(self):
+        """Read-only view of the S matrix as a nested dictionary S[i][j]."""
+        if self._S_view is None:
+            if self._Smat_csr is None:
+                self._Smat_csr = self._Smat.tocsr()
+            self._S_view = StoichiometryView(
+                self._Smat_csr,
+                self._metabolite_labels,
+                self._reaction_labels,
+                index=self._metabolite_index,
+                cache=self._S_cache)
+        return self._S_view
+
+    @S.setter
+    def S(self, Sdict):
+        self._set_S_matrix(*self._dict_to_S_matrix(Sdict, orient='S'))
+
+    @property
+    def Sji(self):
+        """Read-only view of the S matrix as a nested dictionary Sji[j][i]."""
+        if self._Sji_view is None:
+            self._Sji_view = StoichiometryView(
+                self._Smat,
+                self._reaction_labels,
+                self._metabolite_labels,
+                index=self._reaction_index,
+                excluded=self._pending_removal,
+                cache=self._Sji_cache)
+        return self._Sji_view
+
+    @Sji.setter
+    def Sji(self, Sjidict):
+        self._set_S_matrix(*self._dict_to_S_matrix(Sjidict, orient='Sji'))
+
+    @property
+    def S_matrix(self):
+        """Return the S matrix as a scipy.sparse.csc_matrix, with rows in the order
+        of self.metabolites and columns in the order of self.reactions
+        (after refresh_database).
+        """
+        return self._Smat
+
+    @property
+    def metabolite_array(self):
+        """Return a numpy array of metabolite IDs (row labels of S_matrix)."""
+        return np.array(self._metabolite_labels, dtype=str)
+
+    @property
+    def reaction_array(self):
+        """Return a numpy array of reaction IDs (column labels of S_matrix)."""
+        return np.array(self._reaction_labels, dtype=str)
+
+    @property
+    def metabolite_index(self):
+        """Return a dictionary mapping metabolite IDs to row indices of S_matrix."""
+        return self._metabolite_index
+
+    @property
+    def reaction_index(self):
+        """Return a dictionary mapping reaction IDs to column indices of S_matrix."""
+        return self._reaction_index
+
+    @property
+    def rxntype_array(self):
+        """Return the reaction types as an int8 array in the order of the
+        columns of S_matrix (-1 if the reaction type is not assigned).
+        """
+        rxntype = np.empty(len(self._reaction_labels), dtype=np.int8)
+        for ind, rxn in enumerate(self._reaction_labels):
+            t = self.rxntype.get(rxn, None)
+            rxntype[ind] = -1 if t is None else t
+        return rxntype
+
     @staticmethod
     def transpose_S(Sji):
         """Tranpose Sji into Sij and also Sij to Sji dictionary."""
-        # Update to pandas 0.19 (using sparse dataframe)
-        df_Sji = pd.DataFrame(Sji).T
-        Sij = dict(
-            (k, v.dropna().to_dict()) for k, v in df_Sji.items()
-        )
+        Sij = {}
+        for k1, entries in Sji.items():
+            for k2, coeff in entries.items():
+                Sij.setdefault(k2, {})[k1] = coeff
         return Sij
 
     def create_or_update_S_df(self):
         """Create Pandas.DataFrame of the Sij matrix
         """
-        self._S_df = pd.DataFrame(self.Sji).fillna(0)
+        keep_cols = np.array(
+            [rxn not in self._pending_removal for rxn in self._reaction_labels],
+            dtype=bool)
+        Smat = self._Smat[:, np.flatnonzero(keep_cols)]
+        keep_rows = np.flatnonzero(Smat.getnnz(axis=1))
+        self._S_df = pd.DataFrame(
+            Smat[keep_rows, :].toarray(),
+            index=[self._metabolite_labels[i] for i in keep_rows],
+            columns=[rxn for rxn, keep in zip(self._reaction_labels, keep_cols)
+                     if keep])
+
+    def _update_S_matrix(self, entries):
+        """Insert or overwrite entries of the S matrix.
+
+        The CSC arrays are rebuilt once (O(nnz)) for all the entries, since
+        inserting a row or a column shifts the indices of all the entries
+        after it. Only the cached S/Sji entries of the touched rows and
+        columns are discarded.
+
+        Args:
+            entries (list): A list of (metabolite, reaction, coefficient)
+        """
+        if len(entries) == 0:
+            return
+        touched_mets = set(e[0] for e in entries)
+        touched_rxns = set(e[1] for e in entries)
+        new_mets = touched_mets - set(self._metabolite_index)
+        new_rxns = touched_rxns - set(self._reaction_index)
+        # A reaction removed with refresh_database=False is added back
+        self._pending_removal.difference_update(touched_rxns)
+
+        coo = self._Smat.tocoo()
+        rows = coo.row.astype(np.int64)
+        cols = coo.col.astype(np.int64)
+        metabolites = self._metabolite_labels
+        reactions = self._reaction_labels
+        met_index = self._metabolite_index
+        rxn_index = self._reaction_index
+
+        # Map the existing entries to the new row/column positions
+        if new_mets:
+            metabolites = sorted(metabolites + list(new_mets))
+            met_index = dict((k, ind) for ind, k in enumerate(metabolites))
+            rows = np.array([met_index[k] for k in self._metabolite_labels],
+                            dtype=np.int64)[rows]
+        if new_rxns:
+            reactions = sorted(reactions + list(new_rxns))
+            rxn_index = dict((k, ind) for ind, k in enumerate(reactions))
+            cols = np.array([rxn_index[k] for k in self._reaction_labels],
+                            dtype=np.int64)[cols]
+
+        new_rows = np.array([met_index[e[0]] for e in entries], dtype=np.int64)
+        new_cols = np.array([rxn_index[e[1]] for e in entries], dtype=np.int64)
+        new_data = np.array([float(e[2]) for e in entries], dtype=np.float64)
+
+        # New entries overwrite the existing ones (the last entry wins)
+        ncol = len(reactions)
+        new_keys = new_rows * ncol + new_cols
+        _, last = np.unique(new_keys[::-1], return_index=True)
+        last = len(new_keys) - 1 - last
+        keep = ~np.isin(rows * ncol + cols, new_keys)
+
+        Smat = sparse.csc_matrix(
+            (np.concatenate([coo.data[keep], new_data[last]]),
+             (np.concatenate([rows[keep], new_rows[last]]),
+              np.concatenate([cols[keep], new_cols[last]]))),
+            shape=(len(metabolites), ncol))
+        self._set_S_matrix(metabolites, reactions, Smat,
+                           touched_metabolites=touched_mets,
+                           touched_reactions=touched_rxns)
+
+    def _remove_S_matrix_columns(self, reactions):
+        """Remove reaction columns and the metabolite rows left without entries."""
+        remove_cols = np.array(
+            [rxn in reactions for rxn in self._reaction_labels], dtype=bool)
+        if remove_cols.any():
+            touched_rows = np.unique(
+                self._Smat[:, np.flatnonzero(remove_cols)].indices)
+            Smat = self._Smat[:, np.flatnonzero(~remove_cols)]
+        else:
+            touched_rows = np.array([], dtype=np.int64)
+            Smat = self._Smat
+        nnz_rows = Smat.getnnz(axis=1)
+        if not remove_cols.any() and nnz_rows.all():
+            return
+        keep_rows = np.flatnonzero(nnz_rows)
+        self._set_S_matrix(
+            [self._metabolite_labels[i] for i in keep_rows],
+            [rxn for rxn, remove in zip(self._reaction_labels, remove_cols)
+             if not remove],
+            Smat[keep_rows, :],
+            touched_metabolites=set(
+                self._metabolite_labels[i] for i in touched_rows),
+            touched_reactions=set(reactions))
+        self._pending_removal = set()
+        self._invalidate_views()
+
+    @contextmanager
+    def batch(self):
+        """Defer the refresh of the database until the end of the block.
+
+        The S matrix changes made by update_S, set_database_export_reaction,
+        extend_S_from_gams_inputfile and remove_reaction inside the block are
+        recorded and applied in a single update (followed by one validate())
+        when the block exits. The S/Sji views show the matrix before the block
+        until then. If an exception is raised inside the block, all changes
+        made inside the block are discarded.
+
+        Usage:
+            with db.batch():
+                for rxn in blocked_reactions:
+                    db.remove_reaction(rxn)
+                db.set_database_export_reaction(export_reactions_Sij)
+        """
+        if self._batch_depth == 0:
+            saved_state = dict(
+                (attr, copy.copy(getattr(self, attr, None)))
+                for attr in ['reactions', 'metabolites', 'rxntype',
+                             'internal_rxns', 'user_defined_export_rxns',
+                             '_pending_removal'])
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.logger.warning(
+                    "Database batch failed. Changes are discarded.")
+                self._pending_entries = []
+                self._pending_reactions = set()
+                for attr, value in saved_state.items():
+                    setattr(self, attr, value)
+                self._invalidate_views()
+            raise
+        else:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.refresh_database()
 
     def refresh_database(self, previous_operations_on='Sji'):
         """Afer loading the database, if any operations were
         performed on S(ij) or Sji, refresh the database to reflect
         the changes on all related attribute.
-        TODO: This can be simplified
+        Within a batch(), the refresh is deferred to the end of the batch.
 
         Args:
-            previous_operations_on (str, optional): Description
+            previous_operations_on (str, optional): Kept for backward compatibility.
+                Both S and Sji are views of the same sparse matrix.
         """
-        if previous_operations_on == 'Sji':
-            # re-create Sij from Sji
-            self.S = self.transpose_S(self.Sji)
-        elif previous_operations_on == "S":
-            # re-create Sji from S
-            self.Sji = self.transpose_S(self.S)
-        else:
+        if previous_operations_on not in ['S', 'Sji']:
             raise Exception(
                 "The previous_operations_on argument must be from the list: ['S', 'Sji']")
 
-        # update S df
-        self.create_or_update_S_df()
+        if self._batch_depth > 0:
+            return
+
+        # Apply the deferred insertions
+        entries = self._pending_entries
+        self._pending_entries = []
+        self._pending_reactions = set()
+        self._update_S_matrix(entries)
+        # Drop removed reactions and metabolites without any reaction
+        self._remove_S_matrix_columns(self._pending_removal)
         # update metabolites
-        self.metabolites = sorted(self.S.keys())
+        self.metabolites = list(self._metabolite_labels)
         # update reactions
-        self.reactions = sorted(self.Sji.keys())
+        self.reactions = list(self._reaction_labels)
         self.validate()
 
     @property
@@ -168,7 +555,7 @@ class BaseReactionDatabase(object):
         """Return a Pandas.DataFrame of the S matrix
         metabolites = self.S_df.index.tolist()
         reactions = self.db.S_df.columns.tolist()
-        Smat = self.S_df.as_matrix()
+        Smat = self.S_df.values
         Returns:
             `Pandas.DataFrame`: Description
         """
@@ -178,6 +565,8 @@ class BaseReactionDatabase(object):
 
     @staticmethod
     def to_json(Sdict, filepath):
+        if isinstance(Sdict, StoichiometryView):
+            Sdict = Sdict.to_dict()
         with open(filepath, 'w+') as fp:
             json.dump(Sdict, fp, sort_keys=True, indent=4)
 
@@ -217,9 +606,14 @@ class BaseReactionDatabase(object):
         Args:
             filename (None, optional): The name of the inputfile.
         """
-        self.S = gams_parser.convert_parameter_table_to_dict(
-            os.path.join(self.data_filepath, filename),
-            Sdict=self.S)
+        extension_dict = gams_parser.convert_parameter_table_to_dict(
+            os.path.join(self.data_filepath, filename))
+
+        for met, entries in extension_dict.items():
+            for rxn, coeff in entries.items():
+                self._pending_entries.append((met, rxn, coeff))
+                self._pending_reactions.add(rxn)
+                self._pending_removal.discard(rxn)
 
         self.refresh_database(previous_operations_on='S')
 
@@ -234,14 +628,15 @@ class BaseReactionDatabase(object):
             TYPE: Description
         """
         temp_rxn = []
-        for met, entries in extension_dict.items():
-            if met not in self.S:
-                self.S[met] = {}
-                self.metabolites.append(met)
-            for rxn, coeff in entries.items():
-                self.S[met][rxn] = float(coeff)
-                if rxn not in self.reactions:
-                    self.reactions.append(rxn)
+        for met, rxn_entries in extension_dict.items():
+            if not _in_sorted_list(self.metabolites, met):
+                bisect.insort(self.metabolites, met)
+            for rxn, coeff in rxn_entries.items():
+                self._pending_entries.append((met, rxn, float(coeff)))
+                self._pending_reactions.add(rxn)
+                self._pending_removal.discard(rxn)
+                if not _in_sorted_list(self.reactions, rxn):
+                    bisect.insort(self.reactions, rxn)
                     temp_rxn.append(rxn)
                     self.rxntype[rxn] = default_reactiontype
 
@@ -273,13 +668,24 @@ class BaseReactionDatabase(object):
                 but this is slow when removing a large number of reactions. In that case,
                 perform the refresh_database after the last iteration.
         """
-        assert reaction_id in self.Sji, "The reaction_id provided do not present in the database!"
-        # remove from S matrix
-        self.Sji.pop(reaction_id, None)
+        # Within a batch(), the reaction may only be in the pending entries
+        assert reaction_id in self.Sji or reaction_id in self._pending_reactions, \
+            "The reaction_id provided do not present in the database!"
+        # remove from S matrix (the column is dropped in refresh_database)
+        self._pending_removal.add(reaction_id)
+        if reaction_id in self._pending_reactions:
+            self._pending_entries = [e for e in self._pending_entries
+                                     if e[1] != reaction_id]
+            self._pending_reactions.discard(reaction_id)
         # remove reactions
-        self.reactions.remove(reaction_id)
+        ind = bisect.bisect_left(self.reactions, reaction_id)
+        if ind < len(self.reactions) and self.reactions[ind] == reaction_id:
+            del self.reactions[ind]
+        elif reaction_id in self.reactions:
+            self.reactions.remove(reaction_id)
         # remove from internal reactions, hard coded for the moment
-        if not reaction_id.startswith("EX_"):
+        if not reaction_id.startswith("EX_") and \
+                reaction_id in self.internal_rxns:
             self.internal_rxns.remove(reaction_id)
         # remove from reaction type
         self.rxntype.pop(reaction_id, None)
@@ -291,6 +697,17 @@ class BaseReactionDatabase(object):
             "Reaction %s removed from the database." %
             reaction_id)
 
+    def __getstate__(self):
+        # The views and the cached dataframe are rebuilt on demand
+        state = self.__dict__.copy()
+        state['_S_view'] = None
+        state['_Sji_view'] = None
+        state['_S_cache'] = {}
+        state['_Sji_cache'] = {}
+        state['_Smat_csr'] = None
+        state['_S_df'] = None
+        return state
+
     def __repr__(self):
         return "BaseReactionDatabase"
 
@@ -339,6 +756,8 @@ class Database(BaseReactionDatabase):
         self.loops = []
         self.Ninternal = {}
         self.all_excluded_reactions = []
+        # {lumped reaction: {reaction: coefficient}} (see model_reduction)
+        self.lumped_reactions = {}
         self.excluded_reactions = excluded_reactions
 
         if blocked_rxns is not None:
@@ -358,7 +777,6 @@ class Database(BaseReactionDatabase):
                         self.data_filepath,
                         self.dbdict_json['Sji']),
                     'r+'))
-            self.S = self.transpose_S(self.Sji)
             self.reactions = sorted(self.Sji.keys())
             self.internal_rxns = copy.deepcopy(self.reactions)
             self.metabolites = sorted(self.S.keys())
@@ -386,17 +804,16 @@ class Database(BaseReactionDatabase):
                 os.path.join(self.data_filepath,
                              self.dbdict_gams['Sji'])
             )
-            self.Sji = self.transpose_S(self.S)
 
             self.logger.debug('Reading metabolite file...')
-            self.metabolites = gams_parser.convert_set_to_list(
+            self.metabolites = sorted(gams_parser.convert_set_to_list(
                 os.path.join(self.data_filepath, self.dbdict_gams['metabolite'])
-            )
+            ))
             # Load reactions
             self.logger.debug('Reading reaction file...')
-            self.reactions = gams_parser.convert_set_to_list(
+            self.reactions = sorted(gams_parser.convert_set_to_list(
                 os.path.join(self.data_filepath, self.dbdict_gams['reaction'])
-            )
+            ))
             self.internal_rxns = copy.deepcopy(self.reactions)
 
             self.logger.debug('Reading reaction type file...')
@@ -438,10 +855,452 @@ class Database(BaseReactionDatabase):
 
         self.refresh_database(previous_operations_on='Sji')
 
+    def expand_fluxes(self, reaction_ids, fluxes):
+        """Replace the lumped reactions of a reduced database by the
+        reactions they were made of (v(j) = coeff(j) * v(lumped reaction)).
+
+        Args:
+            reaction_ids (list): Reaction IDs of a solution
+            fluxes (list): The fluxes of the reactions
+
+        Returns:
+            tuple: (reaction_ids, fluxes) with the original reaction IDs
+        """
+        expanded = OrderedDict()
+        for rxn, flux in zip(reaction_ids, fluxes):
+            for member, coeff in self.lumped_reactions.get(
+                    rxn, {rxn: 1}).items():
+                expanded[member] = expanded.get(member, 0) + coeff * flux
+        return list(expanded.keys()), list(expanded.values())
+
+    def compress_reaction_ids(self, reaction_ids):
+        """Replace the reactions that are part of a lumped reaction by the
+        lumped reaction (the inverse of expand_fluxes).
+
+        Args:
+            reaction_ids (list): Original reaction IDs
+
+        Returns:
+            list: Sorted reaction IDs of the database
+        """
+        lumped_reaction_of = dict(
+            (member, rxn) for rxn, members in self.lumped_reactions.items()
+            for member in members)
+        return sorted(set(lumped_reaction_of.get(rxn, rxn)
+                          for rxn in reaction_ids))
+
+    def get_flux_bounds(self, M, flux_bounds=None):
+        """Return the flux ranges of the reactions, with the ranges of the
+        lumped reactions implied by the bounds of the reactions they were
+        made of: since v(j) = coeff(j) * v(lumped reaction) and
+        -M <= v(j) <= M (or the flux range of j), a lumped reaction is
+        bounded by the tightest bound of its reactions over their coefficient
+        (e.g. M / max(|coeff(j)|)). Without them, the reduced problem would
+        be a relaxation of the original one.
+
+        Args:
+            M (float): The maximum flux bound
+            flux_bounds (dict, optional): Flux ranges {reaction: (LB, UB)}
+                (see OptStoic), of the reactions of this database or of the
+                reactions of the lumped reactions
+
+        Returns:
+            dict: The flux ranges {reaction: (LB, UB)} (None if there are no
+                flux ranges and no lumped reactions)
+        """
+        if flux_bounds is None and not self.lumped_reactions:
+            return None
+        flux_bounds = dict(flux_bounds or {})
+        for rxn, members in self.lumped_reactions.items():
+            lower, upper = flux_bounds.get(rxn, (None, None))
+            lower = -np.inf if lower is None else lower
+            upper = np.inf if upper is None else upper
+            for member, coeff in members.items():
+                member_lower, member_upper = flux_bounds.get(
+                    member, (None, None))
+                member_lower = -M if member_lower is None else max(
+                    member_lower, -M)
+                member_upper = M if member_upper is None else min(
+                    member_upper, M)
+                bounds = sorted([member_lower / coeff, member_upper / coeff])
+                lower = max(lower, bounds[0])
+                upper = min(upper, bounds[1])
+            flux_bounds[rxn] = (float(lower), float(upper))
+        return flux_bounds
+
+    def get_objective_weights(self, objective):
+        """Return the weights of the lumped reactions in the OptStoic
+        objective, so that the objective is the same as with the original
+        reactions.
+
+        Args:
+            objective (str): 'MinFlux' (sum of the absolute fluxes of the
+                original reactions) or 'MinRxn' (number of original reactions)
+
+        Returns:
+            dict: {lumped reaction: weight} (the other weights are 1)
+        """
+        if objective == 'MinRxn':
+            return dict((rxn, float(len(members)))
+                        for rxn, members in self.lumped_reactions.items())
+        return dict((rxn, float(sum(abs(c) for c in members.values())))
+                    for rxn, members in self.lumped_reactions.items())
+
+    def to_arrays(self):
+        """Export the Database to flat NumPy arrays and a JSON-serializable
+        metadata dictionary. The S matrix and Nint matrix are stored as CSC/CSR
+        arrays, and the reaction/metabolite IDs as string arrays.
+
+        Pending reaction removals (refresh_database=False) must be refreshed first.
+
+        Returns:
+            tuple: (dict of numpy.ndarray, dict)
+        """
+        if len(self._pending_removal) > 0:
+            raise Exception("Call refresh_database() before exporting the database!")
+
+        Smat = self.S_matrix
+        Nint_loops = sorted(self.Ninternal.keys())
+        Nint_rxns = sorted(set(
+            rxn for entries in self.Ninternal.values() for rxn in entries))
+        Nint_rxn_index = dict((k, ind) for ind, k in enumerate(Nint_rxns))
+        Nint_indptr = [0]
+        Nint_indices = []
+        Nint_data = []
+        for l in Nint_loops:
+            for rxn, coeff in self.Ninternal[l].items():
+                Nint_indices.append(Nint_rxn_index[rxn])
+                Nint_data.append(coeff)
+            Nint_indptr.append(len(Nint_indices))
+
+        arrays = {
+            'S_data': Smat.data,
+            'S_indices': Smat.indices,
+            'S_indptr': Smat.indptr,
+            'metabolite_labels': np.array(self._metabolite_labels, dtype=str),
+            'reaction_labels': np.array(self._reaction_labels, dtype=str),
+            'metabolites': np.array(self.metabolites, dtype=str),
+            'reactions': np.array(self.reactions, dtype=str),
+            'rxntype_reactions': np.array(list(self.rxntype.keys()), dtype=str),
+            'rxntype': np.array(
+                [-1 if t is None else t for t in self.rxntype.values()],
+                dtype=np.int8),
+            'internal_rxns': np.array(self.internal_rxns, dtype=str),
+            'user_defined_export_rxns': np.array(
+                self.user_defined_export_rxns, dtype=str),
+            'loops': np.array(self.loops, dtype=str),
+            'Nint_loops': np.array(Nint_loops, dtype=str),
+            'Nint_reactions': np.array(Nint_rxns, dtype=str),
+            'Nint_data': np.array(Nint_data, dtype=np.float64),
+            'Nint_indices': np.array(Nint_indices, dtype=np.int32),
+            'Nint_indptr': np.array(Nint_indptr, dtype=np.int64),
+            'all_excluded_reactions': np.array(
+                self.all_excluded_reactions or [], dtype=str)
+        }
+
+        metadata = {
+            'description': self.description,
+            'data_filepath': self.data_filepath,
+            'dbdict_json': self.dbdict_json,
+            'dbdict_gams': self.dbdict_gams,
+            'reduce_model_size': self.reduce_model_size,
+            'blocked_rxns': self.blocked_rxns,
+            'excluded_reactions': self.excluded_reactions,
+            'lumped_reactions': self.lumped_reactions,
+            'S_shape': list(Smat.shape)
+        }
+        return arrays, metadata
+
+    @classmethod
+    def from_arrays(cls, arrays, metadata, logger=None):
+        """Create a Database from the output of Database.to_arrays().
+        The arrays are used without copying where possible (e.g. memory-mapped
+        arrays).
+
+        Args:
+            arrays (dict): A dictionary of numpy.ndarray
+            metadata (dict): The metadata dictionary
+            logger (None, optional): A logging.Logger object
+
+        Returns:
+            Database
+        """
+        db = cls(description=metadata['description'],
+                 data_filepath=metadata['data_filepath'],
+                 dbdict_json=metadata['dbdict_json'],
+                 dbdict_gams=metadata['dbdict_gams'],
+                 blocked_rxns=metadata['blocked_rxns'],
+                 excluded_reactions=metadata['excluded_reactions'],
+                 reduce_model_size=metadata['reduce_model_size'],
+                 logger=logger)
+
+        Smat = sparse.csc_matrix(
+            (arrays['S_data'], arrays['S_indices'], arrays['S_indptr']),
+            shape=tuple(metadata['S_shape']), copy=False)
+        db._set_S_matrix(arrays['metabolite_labels'].tolist(),
+                         arrays['reaction_labels'].tolist(),
+                         Smat)
+        db.metabolites = arrays['metabolites'].tolist()
+        db.reactions = arrays['reactions'].tolist()
+        db.rxntype = dict(
+            (rxn, None if t == -1 else t) for rxn, t in zip(
+                arrays['rxntype_reactions'].tolist(),
+                arrays['rxntype'].tolist()))
+        db.internal_rxns = arrays['internal_rxns'].tolist()
+        db.user_defined_export_rxns = arrays['user_defined_export_rxns'].tolist()
+        db.loops = arrays['loops'].tolist()
+
+        Nint_rxns = arrays['Nint_reactions'].tolist()
+        Nint_indptr = arrays['Nint_indptr']
+        Nint_indices = arrays['Nint_indices']
+        Nint_data = arrays['Nint_data']
+        db.Ninternal = {}
+        for ind, l in enumerate(arrays['Nint_loops'].tolist()):
+            start, end = Nint_indptr[ind], Nint_indptr[ind + 1]
+            db.Ninternal[l] = dict(
+                (Nint_rxns[k], float(c)) for k, c in zip(
+                    Nint_indices[start:end], Nint_data[start:end]))
+
+        db.all_excluded_reactions = arrays['all_excluded_reactions'].tolist()
+        db.lumped_reactions = metadata.get('lumped_reactions', {})
+        return db
+
+    def save_snapshot(self, dirpath):
+        """Save the Database as a binary snapshot (a directory with one .npy file
+        per array and a metadata.json file). The directory is written to a
+        temporary location first and then renamed, so a snapshot is either
+        complete or absent.
+
+        Args:
+            dirpath (str): The snapshot directory
+        """
+        arrays, metadata = self.to_arrays()
+        parent = os.path.dirname(os.path.abspath(dirpath))
+        if not os.path.exists(parent):
+            os.makedirs(parent)
+
+        tmpdir = tempfile.mkdtemp(dir=parent, prefix='.tmp_snapshot_')
+        try:
+            for name, arr in arrays.items():
+                np.save(os.path.join(tmpdir, name + '.npy'), arr)
+            metadata = dict(metadata,
+                            snapshot_version=SNAPSHOT_VERSION,
+                            arrays=sorted(arrays.keys()))
+            with open(os.path.join(tmpdir, 'metadata.json'), 'w+') as fp:
+                json.dump(metadata, fp, sort_keys=True, indent=4)
+            os.rename(tmpdir, dirpath)
+        except OSError:
+            # Another process has written the same snapshot
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            if not os.path.exists(os.path.join(dirpath, 'metadata.json')):
+                raise
+        self.logger.debug("Database snapshot saved to %s." % dirpath)
+
+    @classmethod
+    def load_snapshot(cls, dirpath, mmap_mode='r', logger=None):
+        """Load a Database saved by Database.save_snapshot().
+
+        Args:
+            dirpath (str): The snapshot directory
+            mmap_mode (str, optional): Passed to numpy.load. The default ('r')
+                memory-maps the arrays. Use None to read them into memory.
+            logger (None, optional): A logging.Logger object
+
+        Returns:
+            Database
+        """
+        with open(os.path.join(dirpath, 'metadata.json'), 'r') as fp:
+            metadata = json.load(fp)
+        if metadata.get('snapshot_version') != SNAPSHOT_VERSION:
+            raise ValueError("Database snapshot %s has an incompatible "
+                             "version." % dirpath)
+        arrays = dict(
+            (name, np.load(os.path.join(dirpath, name + '.npy'),
+                           mmap_mode=mmap_mode))
+            for name in metadata['arrays'])
+        return cls.from_arrays(arrays, metadata, logger=logger)
+
+    def to_shared_memory(self, name=None):
+        """Export the Database to a shared memory block, so that worker
+        processes can attach to it by name (see attach_shared_memory) instead
+        of unpickling or reloading the database.
+
+        The block contains a JSON header (the metadata and the dtype, shape
+        and offset of each array of to_arrays()) followed by the arrays.
+
+        Args:
+            name (str, optional): Name of the shared memory block (a unique
+                name is generated if not provided)
+
+        Returns:
+            :obj:`SharedDatabase`: The owner of the block. The block is freed
+                by SharedDatabase.unlink() (or at the end of a with block).
+        """
+        arrays, metadata = self.to_arrays()
+        layout = {}
+        offset = 0
+        for key in sorted(arrays):
+            arr = np.ascontiguousarray(arrays[key])
+            arrays[key] = arr
+            offset = _align(offset)
+            layout[key] = dict(dtype=arr.dtype.str, shape=list(arr.shape),
+                               offset=offset)
+            offset += arr.nbytes
+        header = json.dumps(dict(metadata=metadata, layout=layout,
+                                 owner_pid=os.getpid()),
+                            sort_keys=True).encode('utf-8')
+        data_start = _align(8 + len(header))
+
+        shm = shared_memory.SharedMemory(
+            name=name, create=True, size=max(1, data_start + offset))
+        shm.buf[:8] = np.array([len(header)], dtype='<u8').tobytes()
+        shm.buf[8:8 + len(header)] = header
+        for key, arr in arrays.items():
+            start = data_start + layout[key]['offset']
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf,
+                       offset=start)[...] = arr
+        self.logger.debug("Database exported to shared memory %s (%d bytes)."
+                          % (shm.name, shm.size))
+        return SharedDatabase(shm)
+
+    @classmethod
+    def attach_shared_memory(cls, name, logger=None):
+        """Create a Database from a shared memory block written by
+        Database.to_shared_memory(). The S matrix uses the shared arrays
+        without copying them; they are read-only (changes to the database,
+        e.g. update_S, create new private arrays).
+
+        Args:
+            name (str): Name of the shared memory block
+            logger (None, optional): A logging.Logger object
+
+        Returns:
+            Database
+        """
+        shm, tracked = _attach_shared_memory_block(name)
+
+        header_size = int(np.frombuffer(shm.buf[:8], dtype='<u8')[0])
+        header = json.loads(bytes(shm.buf[8:8 + header_size]).decode('utf-8'))
+        if tracked and not _shares_resource_tracker(header['owner_pid']):
+            # The block is owned (and unlinked) by the process that created
+            # it. The resource tracker of this process would unlink it at
+            # exit. The tracker of the owner must keep it registered, so the
+            # block is only unregistered from a tracker of its own.
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        data_start = _align(8 + header_size)
+        arrays = {}
+        for key, info in header['layout'].items():
+            arr = np.ndarray(tuple(info['shape']), dtype=np.dtype(info['dtype']),
+                             buffer=shm.buf, offset=data_start + info['offset'])
+            arr.flags.writeable = False
+            arrays[key] = arr
+
+        db = cls.from_arrays(arrays, header['metadata'], logger=logger)
+        # Keep the block mapped as long as the database uses it
+        db._shared_memory = shm
+        return db
+
+    def __getstate__(self):
+        state = super(Database, self).__getstate__()
+        state.pop('_shared_memory', None)
+        return state
+
     def __repr__(self):
         return "OptStoic Database(Description='%s')" % self.description
 
 
+def _attach_shared_memory_block(name):
+    """Attach to an existing shared memory block.
+
+    Returns:
+        tuple: (block, whether the block is registered with the resource
+            tracker of this process)
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False), False
+    except TypeError:
+        # Python < 3.13 always registers the block (on POSIX)
+        return shared_memory.SharedMemory(name=name), os.name == 'posix'
+
+
+def _shares_resource_tracker(owner_pid):
+    """Return True if this process uses the resource tracker of the process
+    owner_pid, i.e. it is that process or one of its multiprocessing
+    children (which inherit the resource tracker of their parent)."""
+    parent = parent_process()
+    return (os.getpid() == owner_pid or
+            (parent is not None and parent.pid == owner_pid))
+
+
+def _align(offset):
+    return -(-offset // SHARED_MEMORY_ALIGNMENT) * SHARED_MEMORY_ALIGNMENT
+
+
+class SharedDatabase(object):
+    """The owner of a Database exported to shared memory
+    (see Database.to_shared_memory).
+
+    Usage:
+        with db.to_shared_memory() as shared_db:
+            pool = multiprocessing.Pool(4, initializer=init_worker,
+                                        initargs=(shared_db.name,))
+            ...
+        # in init_worker(name): db = Database.attach_shared_memory(name)
+    """
+
+    def __init__(self, shm):
+        self._shm = shm
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def size(self):
+        return self._shm.size
+
+    def attach(self, logger=None):
+        """Return a Database that uses the shared memory block."""
+        return Database.attach_shared_memory(self.name, logger=logger)
+
+    def unlink(self):
+        """Free the shared memory block. The databases attached to it
+        keep their mapping until they are deleted."""
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.unlink()
+
+    def __repr__(self):
+        return "<SharedDatabase(name='%s')>" % (
+            self._shm.name if self._shm is not None else None)
+
+
+def create_snapshot_key(filepaths, **kwargs):
+    """Create a content hash for a database snapshot.
+
+    Args:
+        filepaths (list): The input files used to create the database
+        **kwargs: Any other JSON-serializable arguments used to create the database
+
+    Returns:
+        str: A hex digest
+    """
+    sha = hashlib.sha256()
+    sha.update(str(SNAPSHOT_VERSION).encode('utf-8'))
+    for filepath in filepaths:
+        with open(filepath, 'rb') as fp:
+            sha.update(fp.read())
+    sha.update(json.dumps(kwargs, sort_keys=True).encode('utf-8'))
+    return sha.hexdigest()[:24]
+
+
 def load_custom_reactions_to_be_excluded():
     """A list of undesirable reactions that are specific
     to the glycolysis study
@@ -586,10 +1445,16 @@ def load_db_v3(
         'EX_nadp': {'C00006': -1.0},
         'EX_nadph': {'C00005': -1.0}
     },
+    use_cache=True,
+    cache_dir=None,
     logger=None
 ):
     """Load OptStoic database v3
 
+    The fully prepared Database is saved as a binary snapshot in cache_dir,
+    keyed by the content of the input files and the arguments. Repeated calls
+    load the (memory-mapped) snapshot instead of re-parsing the input files.
+
     Returns:
         TYPE: Description
 
@@ -599,6 +1464,9 @@ def load_db_v3(
         user_defined_export_rxns_Sji (dict, optional): The list of export reactions that
             need to be added to the model for metabolite exchange (i.e., any metabolite
             that participate in the design equation)
+        use_cache (bool, optional): If True, load/save the database snapshot.
+        cache_dir (str, optional): Directory of the snapshots. Default to CACHE_DIR
+            (~/.cache/optstoicpy or the OPTSTOICPY_CACHE_DIR environment variable).
     """
     if logger is None:
         logger = create_logger(name="optstoicpy.core.database.load_db_v3")
@@ -623,6 +1491,33 @@ def load_db_v3(
         'blocked_rxns': 'optstoic_v3_blocked_reactions_0to5ATP.txt',
     }
 
+    if use_cache:
+        input_files = [dbdict_json['Sji'],
+                       dbdict_json['Nint'],
+                       dbdict_json['reactiontype'],
+                       dbdict_gams['blocked_rxns'],
+                       'optstoic_v3_ATP_irreversible_forward_rxns.txt',
+                       'optstoic_v3_ATP_irreversible_backward_rxns.txt']
+        snapshot_key = create_snapshot_key(
+            [os.path.join(DATA_DIR, f) for f in input_files],
+            description='v3',
+            reduce_model_size=reduce_model_size,
+            excluded_reactions=sorted(excluded_reactions),
+            user_defined_export_rxns_Sji=user_defined_export_rxns_Sji)
+        snapshot_path = os.path.join(
+            cache_dir or CACHE_DIR, 'db_v3_%s' % snapshot_key)
+
+        if os.path.exists(snapshot_path):
+            try:
+                DB = Database.load_snapshot(snapshot_path)
+            except (OSError, IOError, ValueError, KeyError) as e:
+                logger.warning(
+                    "Unable to load database snapshot %s (%s)." % (snapshot_path, e))
+            else:
+                logger.debug(
+                    'Database loaded from snapshot %s.' % snapshot_path)
+                return DB
+
     logger.debug('Reading blocked reactions file...')
     if 'blocked_rxns' in dbdict_gams:
         blocked_rxns = gams_parser.convert_set_to_list(
@@ -675,6 +1570,13 @@ def load_db_v3(
 
         DB.set_database_export_reaction(user_defined_export_rxns_Sij)
 
+    if use_cache:
+        try:
+            DB.save_snapshot(snapshot_path)
+        except (OSError, IOError) as e:
+            logger.warning(
+                "Unable to save database snapshot %s (%s)." % (snapshot_path, e))
+
     return DB
 
 
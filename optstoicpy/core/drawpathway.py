@@ -2,17 +2,20 @@ from __future__ import division
 from builtins import str
 from past.utils import old_div
 from .pathway import Pathway
-from .config import cofactorsList, kegg_compound, color_configs
+from .config import get_cofactors_list, get_kegg_compound, color_configs
+from collections import ChainMap
 import graphviz as gv
 import os
 import logging
 import math
 
 # ##################CONSTANTS######################
-kegg_compound['C00009'] = 'Pi'
-kegg_compound['C00013'] = 'PPi'
-kegg_compound['C00236'] = '1,3-Bisphospho-D-glycerate'
-kegg_compound['C00111'] = 'dihydroxyacetone phosphate'
+# Compound names that override the ones in kegg_compound.json
+COMPOUND_NAMES = {
+    'C00009': 'Pi',
+    'C00013': 'PPi',
+    'C00236': '1,3-Bisphospho-D-glycerate',
+    'C00111': 'dihydroxyacetone phosphate'}
 
 REACTION_FONT_SIZE = '20'
 
@@ -24,7 +27,7 @@ def load_global_styles(colorConfig):
     Create a global styles dictionary for all Graphviz graph
     """
     colorMapping = colorConfig['colorMapping']
-    for c in cofactorsList:
+    for c in get_cofactors_list():
         if c not in colorMapping:
             colorMapping[c] = colorConfig['OTHER_COFACTOR_COLOR']
 
@@ -120,6 +123,8 @@ def draw_pathway(
         colorConfig = color_configs['light']
 
     global_styles, colorMapping = load_global_styles(colorConfig)
+    cofactorsList = get_cofactors_list()
+    kegg_compound = ChainMap(COMPOUND_NAMES, get_kegg_compound())
 
     g = gv.Digraph('G', format=imageFormat, engine=engine)
 
@@ -3,7 +3,7 @@ from builtins import map
 from builtins import zip
 from builtins import object
 from .reaction import Reaction
-from .config import cofactors, default_params, rxnSji
+from .config import get_cofactors, default_params
 import os
 from collections import OrderedDict
 from optstoicpy.script.utils import create_logger
@@ -174,7 +174,7 @@ class Pathway(object):
             next_substrate = []
             for rxn in rstore:
                 next_substrate.extend(rxn.products)
-            next_substrate = list(set(next_substrate) - cofactors)
+            next_substrate = list(set(next_substrate) - get_cofactors())
 
         # Add all reactions to the sorted reactions
         # (as the duplicates will be removed in the following command)
@@ -1,6 +1,6 @@
 from builtins import range
 from builtins import object
-from .config import rxnSji
+from .config import get_rxnSji
 from optstoicpy.script.utils import create_logger
 
 
@@ -39,7 +39,7 @@ class Reaction(object):
             self.logger.warning("Metabolites exists!")
         else:
             self.logger.info("Retrieving metabolites from default database")
-            self.metabolites = rxnSji[self.rid]
+            self.metabolites = get_rxnSji()[self.rid]
         return self.metabolites
 
     @property
@@ -109,6 +109,7 @@ class Reaction(object):
         Returns:
             TYPE: Description
         """
+        rxnSji = get_rxnSji()
         RxnObjList = []
         for i in range(len(dataDict['reaction_id'])):
             if excludeExchangeRxn:
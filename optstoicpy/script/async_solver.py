@@ -0,0 +1,334 @@
+"""
+Run command line solvers with asyncio.
+
+The solver is started with asyncio.create_subprocess_exec and its stdout and
+stderr are read line by line as they are written, so the event loop is never
+blocked and several OptStoic problems can be solved concurrently in one
+process (see OptStoic.solve_async). A SolverLimiter caps the number of
+solver processes running at the same time (e.g. the number of licenses) and
+the total number of solver threads.
+
+Usage:
+    limiter = SolverLimiter(max_solves=2, max_threads=8)
+
+    async def main():
+        jobs = [model.solve_async(limiter=limiter, threads=4)
+                for model in models]
+        return await asyncio.gather(*jobs)
+
+    results = asyncio.run(main())
+
+The progress of a gurobi_cl run can also be read as an async iterator of
+ProgressEvents (see GurobiClRun), and the run can be interrupted once a gap
+or time target is reached:
+
+    run = GurobiClRun('OptStoic', gap_target=0.05)
+    async for event in run:
+        print(event.incumbent, event.bound, event.gap)
+    status, message = run.result
+"""
+from builtins import object
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from optstoicpy.script.utils import create_logger
+from optstoicpy.script.gurobi_command_line_solver import (
+    GurobiLogParser,
+    gurobi_cl_command,
+    gurobi_cl_status,
+    interrupt_process)
+
+
+class SolverLimiter(object):
+    """Limit the number of concurrent solver processes and the total number
+    of threads they use."""
+
+    def __init__(self, max_solves=1, max_threads=None):
+        """
+        Args:
+            max_solves (int, optional): Maximum number of solver processes
+                running at the same time (e.g. the number of licenses)
+            max_threads (int, optional): Maximum total number of solver
+                threads (no limit if None)
+        """
+        if max_solves < 1:
+            raise ValueError("max_solves must be at least 1.")
+        self.max_solves = max_solves
+        self.max_threads = max_threads
+        self.num_solves = 0
+        self.num_threads = 0
+        # Created in the event loop on first use
+        self._condition = None
+
+    def _can_start(self, threads):
+        if self.num_solves >= self.max_solves:
+            return False
+        if self.max_threads is None or self.num_solves == 0:
+            # A job asking for more than max_threads runs alone
+            return True
+        return self.num_threads + threads <= self.max_threads
+
+    async def acquire(self, threads=1):
+        """Wait until a solver process with this number of threads can
+        be started."""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._can_start(threads))
+            self.num_solves += 1
+            self.num_threads += threads
+
+    async def release(self, threads=1):
+        async with self._condition:
+            self.num_solves -= 1
+            self.num_threads -= threads
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, threads=1):
+        """Async context manager holding a solver slot.
+
+        Usage:
+            async with limiter.slot(threads=4):
+                await run_solver_command(...)
+        """
+        await self.acquire(threads)
+        try:
+            yield self
+        finally:
+            await self.release(threads)
+
+    def __repr__(self):
+        return "<SolverLimiter(solves='%s/%s', threads='%s/%s')>" % (
+            self.num_solves, self.max_solves,
+            self.num_threads, self.max_threads)
+
+
+async def _read_stream(stream, name, lines, line_callback):
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        line = line.decode('utf-8', errors='replace').rstrip('\r\n')
+        lines.append(line)
+        if line_callback is not None:
+            line_callback(name, line)
+
+
+async def run_solver_command(command, cwd=None, line_callback=None,
+                             logger=None, stop_event=None,
+                             interrupt_timeout=60):
+    """Run a solver command and read its stdout and stderr concurrently.
+
+    Args:
+        command (list): The command and its arguments
+        cwd (str, optional): The working directory of the solver
+        line_callback (callable, optional): Called as line_callback(stream,
+            line) for each line written by the solver, where stream is
+            'stdout' or 'stderr'. By default, the lines are logged (debug).
+        logger (:obj:`logging.logger`, optional): The logging instance
+        stop_event (:obj:`asyncio.Event`, optional): When set, the solver is
+            interrupted (Ctrl-C) and killed if it has not exited after
+            interrupt_timeout seconds.
+        interrupt_timeout (int, optional): See stop_event
+
+    Returns:
+        tuple: (return code, stdout lines, stderr lines)
+    """
+    if logger is None:
+        logger = create_logger('optstoic.run_solver_command')
+    if line_callback is None:
+        def line_callback(stream, line):
+            logger.debug("%s: %s", stream, line)
+
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd)
+    stdout, stderr = [], []
+    readers = asyncio.gather(
+        _read_stream(process.stdout, 'stdout', stdout, line_callback),
+        _read_stream(process.stderr, 'stderr', stderr, line_callback))
+    stopper = None
+    try:
+        if stop_event is not None:
+            stopper = asyncio.ensure_future(stop_event.wait())
+            await asyncio.wait([readers, stopper],
+                               return_when=asyncio.FIRST_COMPLETED)
+            if not readers.done():
+                logger.info("Interrupting the solver...")
+                interrupt_process(process)
+                try:
+                    await asyncio.wait_for(asyncio.shield(readers),
+                                           interrupt_timeout)
+                except asyncio.TimeoutError:
+                    process.kill()
+        await readers
+        returncode = await process.wait()
+    except asyncio.CancelledError:
+        # Do not leave the solver running if the job is cancelled
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    finally:
+        if stopper is not None:
+            stopper.cancel()
+    return returncode, stdout, stderr
+
+
+def set_gurobi_option(options, key, value):
+    """Set an option in a gurobi_cl option string
+    (e.g. 'Threads=2 TimeLimit=1800').
+
+    Args:
+        options (str): The options
+        key (str): Name of the parameter
+        value: The new value
+
+    Returns:
+        str: The options with key=value
+    """
+    items = [item for item in options.split()
+             if item.split('=')[0].lower() != key.lower()]
+    items.append('%s=%s' % (key, value))
+    return ' '.join(items)
+
+
+async def solve_with_gurobi_cl_async(
+        lp_filename,
+        options='Threads=2 TimeLimit=1200 MIPGapAbs=1e-6',
+        limiter=None,
+        threads=None,
+        line_callback=None,
+        progress_callback=None,
+        gap_target=None,
+        time_target=None,
+        interrupt_timeout=60,
+        cwd=None,
+        logger=None):
+    """Solve lp_filename.lp with gurobi_cl without blocking the event loop.
+    The solution is written to lp_filename.sol (see parse_gurobi_sol).
+
+    Args:
+        lp_filename (str): The LP file without the .lp extension
+        options (str, optional): gurobi_cl parameters
+        limiter (:obj:`SolverLimiter`, optional): Wait for a solver slot
+            before starting gurobi_cl
+        threads (int, optional): Number of threads (overrides the Threads
+            parameter of the options)
+        line_callback (callable, optional): See run_solver_command
+        progress_callback (callable, optional): Called with each
+            ProgressEvent parsed from the output
+        gap_target (float, optional): Interrupt the solve once the relative
+            gap is at most gap_target (e.g. 0.05)
+        time_target (float, optional): Interrupt the solve after time_target
+            seconds if a solution was found
+        interrupt_timeout (int, optional): See run_solver_command
+        cwd (str, optional): The working directory of gurobi_cl (where
+            gurobi.log is written)
+        logger (:obj:`logging.logger`, optional): The logging instance
+
+    Returns:
+        tuple: (status, message), see gurobi_cl_status
+    """
+    if logger is None:
+        logger = create_logger('optstoic.solve_with_gurobi_cl_async')
+    if threads is not None:
+        options = set_gurobi_option(options, 'Threads', threads)
+    else:
+        threads = 1
+        for item in options.split():
+            if item.split('=')[0].lower() == 'threads':
+                threads = int(item.split('=')[1])
+    command = gurobi_cl_command(lp_filename, options)
+
+    parser = GurobiLogParser()
+    stop_event = asyncio.Event()
+
+    def check_target():
+        reason = parser.target_reached(gap_target, time_target)
+        if reason is not None and not stop_event.is_set():
+            logger.info("The %s target is reached.", reason)
+            stop_event.set()
+
+    def parse_line(stream, line):
+        if line_callback is not None:
+            line_callback(stream, line)
+        else:
+            logger.debug("%s: %s", stream, line)
+        if stream != 'stdout':
+            return
+        event = parser.parse_line(line)
+        if event is not None:
+            if progress_callback is not None:
+                progress_callback(event)
+            check_target()
+
+    async def watch_time():
+        # The time target is also checked when gurobi_cl writes nothing
+        while True:
+            await asyncio.sleep(1)
+            check_target()
+
+    async def run():
+        parser.start_time = time.time()
+        watcher = None
+        if time_target is not None:
+            watcher = asyncio.ensure_future(watch_time())
+        try:
+            return await run_solver_command(
+                command, cwd=cwd, line_callback=parse_line, logger=logger,
+                stop_event=stop_event, interrupt_timeout=interrupt_timeout)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+    if limiter is None:
+        _, stdout, _ = await run()
+    else:
+        async with limiter.slot(threads):
+            _, stdout, _ = await run()
+    return gurobi_cl_status('\n'.join(stdout))
+
+
+class GurobiClRun(object):
+    """Async iterator over the ProgressEvents of a gurobi_cl run (see the
+    module docstring). The (status, message) of the run is in result once
+    the iteration is over."""
+
+    def __init__(self, lp_filename, **kwargs):
+        """
+        Args:
+            lp_filename (str): The LP file without the .lp extension
+            **kwargs: Arguments of solve_with_gurobi_cl_async
+        """
+        self.lp_filename = lp_filename
+        self.kwargs = kwargs
+        self.result = None
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        events = asyncio.Queue()
+        task = asyncio.ensure_future(solve_with_gurobi_cl_async(
+            self.lp_filename, progress_callback=events.put_nowait,
+            **self.kwargs))
+        try:
+            while True:
+                get = asyncio.ensure_future(events.get())
+                await asyncio.wait([get, task],
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if get.done():
+                    yield get.result()
+                    continue
+                get.cancel()
+                while not events.empty():
+                    yield events.get_nowait()
+                self.result = task.result()
+                return
+        finally:
+            if not task.done():
+                task.cancel()
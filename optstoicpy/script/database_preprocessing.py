@@ -1,24 +1,275 @@
 import os
 import copy
 import json
+import multiprocessing
 import pulp
 from nose.tools import (
     assert_equal)
 import numpy as np
 import scipy.io
+import scipy.sparse
 import pandas as pd
-from sympy import (
-    Matrix,
-    S,
-    nsimplify
-)
-from sympy.matrices import SparseMatrix
 from optstoicpy.core.database import (
     load_custom_reactions_to_be_excluded,
     load_base_reaction_db
 )
 from optstoicpy.script.utils import create_logger
 from optstoicpy.script.solver import load_pulp_solver
+from optstoicpy.script.solver_backend import (
+    BaseSolverBackend,
+    load_solver_backend)
+from optstoicpy.script.matrix_model import (
+    create_fva_matrix_model,
+    propagate_bounds)
+from optstoicpy.script.nullspace import rational_null_space
+
+
+class FVASolver(object):
+    """Solve min/max v(j) for the reactions of one FVA problem.
+
+    The LP is built only once. Only the objective function changes between
+    two solves: in place in the solver if a persistent solver backend is used,
+    otherwise on the pulp.LpProblem.
+
+    With skip_ahead=True, every reaction that carries flux (|v(j)| > eps) in any
+    solution is recorded as unblocked (in self.observed_flux) and its own
+    min/max LPs are skipped.
+    """
+
+    def __init__(self,
+                 model,
+                 pulp_solver=None,
+                 backend_name=None,
+                 backend_options=None,
+                 skip_ahead=False,
+                 eps=1e-8,
+                 logger=None):
+        """
+        Args:
+            model (:obj:`MatrixModel`): The FVA problem
+                (see create_fva_matrix_model)
+            pulp_solver (optional): A pulp.solvers object
+            backend_name (str, optional): Name of a persistent solver backend
+                (e.g. 'HiGHS'). Used instead of pulp_solver if provided.
+            backend_options (dict, optional): Options of the solver backend
+            skip_ahead (bool, optional): If True, skip the LPs of reactions that
+                are already known to carry flux.
+            eps (float, optional): Flux threshold of a blocked reaction
+            logger (:obj:`logging.logger`, optional): The logging instance
+
+        Raises:
+            ValueError: If neither a pulp solver nor a backend is available
+        """
+        if logger is None:
+            logger = create_logger(
+                name="optstoicpy.script.database_preprocessing.FVASolver")
+        self.logger = logger
+        self.model = model
+        self.backend = None
+        self.pulp_solver = pulp_solver
+        self.skip_ahead = skip_ahead
+        self.eps = eps
+        # A nonzero flux seen for each column (0 if none seen yet)
+        self.observed_flux = np.zeros(model.num_cols)
+        self.num_solves = 0
+
+        if backend_name is not None:
+            self.backend = load_solver_backend(
+                backend_name, options=backend_options, logger=logger)
+            if self.backend is None:
+                raise ValueError(
+                    "Solver backend %s is not available." % backend_name)
+            self.backend.load(model)
+        elif pulp_solver is not None:
+            self.lp_prob, self.variables = model.to_pulp()
+        else:
+            raise ValueError("Either pulp_solver or backend must be provided.")
+
+    def solve(self, col, sense):
+        """Minimize or maximize the variable in column col.
+
+        Args:
+            col (int): Column of the variable in the model
+            sense (int): pulp.LpMinimize or pulp.LpMaximize
+
+        Returns:
+            tuple: The optimal objective value and the values of all the
+                variables (numpy.ndarray), or (None, None) if the LP is not
+                solved to optimality.
+        """
+        return self.solve_objective({self.model.col_names[col]: 1.0}, sense)
+
+    def solve_objective(self, coefficients, sense):
+        """Optimize the objective sum(coefficients[name] * variable).
+
+        Args:
+            coefficients (dict): {variable name: coefficient}
+            sense (int): pulp.LpMinimize or pulp.LpMaximize
+
+        Returns:
+            tuple: See solve
+        """
+        self.num_solves += 1
+        if self.backend is not None:
+            self.backend.set_objective(coefficients, sense)
+            status = self.backend.solve()
+            if status != 'Optimal':
+                return None, None
+            objective_value = self.backend.get_objective_value()
+            values = self.backend.get_values()
+        else:
+            col_index = self.model.col_index
+            self.lp_prob.setObjective(pulp.LpAffineExpression(
+                [(self.variables[col_index[name]], coeff)
+                 for name, coeff in coefficients.items()]))
+            self.lp_prob.sense = sense
+            self.lp_prob.solve(solver=self.pulp_solver)
+            if pulp.LpStatus[self.lp_prob.status] != 'Optimal':
+                return None, None
+            objective_value = pulp.value(self.lp_prob.objective)
+            values = np.array([var.varValue for var in self.variables],
+                              dtype=np.float64)
+
+        if self.skip_ahead:
+            self.record_fluxes(values)
+        return objective_value, values
+
+    def record_fluxes(self, values):
+        """Record the reactions that carry flux in a solution."""
+        new = (self.observed_flux == 0) & (np.abs(values) > self.eps)
+        self.observed_flux[new] = values[new]
+
+    def solve_min_max(self, col):
+        """Return {'min': min v(j), 'max': max v(j)} for the column col.
+
+        With skip_ahead, the LPs stop as soon as the reaction is known to
+        carry flux. The result then also contains 'flux', a nonzero flux of
+        the reaction seen in a solution, and 'min'/'max' are None for the
+        LPs that were skipped.
+        """
+        if not self.skip_ahead:
+            result = {}
+            for obj, sense in [('min', pulp.LpMinimize),
+                               ('max', pulp.LpMaximize)]:
+                result[obj] = self.solve(col, sense)[0]
+            return result
+
+        result = {'min': None, 'max': None}
+        for obj, sense in [('max', pulp.LpMaximize),
+                           ('min', pulp.LpMinimize)]:
+            if self.observed_flux[col] != 0:
+                result['flux'] = float(self.observed_flux[col])
+                break
+            result[obj] = self.solve(col, sense)[0]
+        return result
+
+    def solve_random_objectives(self, cols, num_objectives, seed=0):
+        """Maximize random combinations of the fluxes in cols to find
+        reactions that carry flux (used with skip_ahead).
+
+        Args:
+            cols (list): The columns included in the objectives
+            num_objectives (int): Number of LPs
+            seed (int, optional): Seed of the random generator
+        """
+        random_state = np.random.RandomState(seed)
+        names = [self.model.col_names[col] for col in cols]
+        for _ in range(num_objectives):
+            weights = random_state.uniform(-1, 1, len(names))
+            self.solve_objective(dict(zip(names, weights)), pulp.LpMaximize)
+
+
+# The FVASolver of a worker process (see _init_fva_worker)
+_FVA_SOLVER = None
+
+
+def _init_fva_worker(model, pulp_solver, backend_name, backend_options,
+                     skip_ahead, observed_flux):
+    """Build the FVA problem once in each worker process."""
+    global _FVA_SOLVER
+    _FVA_SOLVER = FVASolver(model,
+                            pulp_solver=pulp_solver,
+                            backend_name=backend_name,
+                            backend_options=backend_options,
+                            skip_ahead=skip_ahead)
+    _FVA_SOLVER.observed_flux[:] = observed_flux
+
+
+def _run_fva_chunk(cols):
+    """Run FVA on a chunk of columns in a worker process."""
+    return [_FVA_SOLVER.solve_min_max(col) for col in cols]
+
+
+def is_blocked(fva_result, eps=1e-8):
+    """Return True if a reaction cannot carry flux
+    (-eps < min v(j) and max v(j) < eps).
+    """
+    if fva_result['min'] is None or fva_result['max'] is None:
+        return False
+    return (fva_result['max'] < eps) and (fva_result['min'] > -eps)
+
+
+def read_fva_checkpoint(filepath):
+    """Read the FVA results of a checkpoint file written by FVACheckpoint.
+
+    An incomplete last line (e.g. if the job was killed while writing it) is
+    ignored.
+
+    Args:
+        filepath (str): Path of the checkpoint file (JSON lines)
+
+    Returns:
+        dict: {reaction id: {'min': min v(j), 'max': max v(j), ...}} in
+            the order of the file.
+    """
+    FVA_res = {}
+    if not os.path.exists(filepath):
+        return FVA_res
+    with open(filepath, 'r') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            res = json.loads(line)
+            FVA_res[res.pop('reaction')] = res
+    return FVA_res
+
+
+class FVACheckpoint(object):
+    """Append-only log of the FVA results (one JSON object per line).
+
+    Each result is written with a single write and flushed to the disk, so
+    the file holds every completed result if the job is killed, with at most
+    one incomplete last line.
+    """
+
+    def __init__(self, filepath, resume=False):
+        """
+        Args:
+            filepath (str): Path of the checkpoint file
+            resume (bool, optional): If True, keep the results already in the
+                file and append the new ones. Otherwise, the file is
+                overwritten.
+        """
+        self.filepath = filepath
+        if resume and os.path.exists(filepath):
+            self._file = open(filepath, 'r+b')
+            # Drop an incomplete last line
+            data = self._file.read()
+            self._file.seek(data.rfind(b'\n') + 1)
+            self._file.truncate()
+        else:
+            self._file = open(filepath, 'wb')
+
+    def write(self, reaction, res):
+        record = dict(res)
+        record['reaction'] = reaction
+        self._file.write(
+            (json.dumps(record, sort_keys=True) + '\n').encode())
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
 
 
 def blocked_reactions_analysis(
@@ -28,6 +279,14 @@ def blocked_reactions_analysis(
         custom_flux_constraints,
         excluded_reactions=None,
         target_reactions_list=None,
+        processes=1,
+        backend=None,
+        chunksize=None,
+        skip_ahead=False,
+        num_random_objectives=0,
+        random_seed=0,
+        checkpoint_filepath='temp_FVA_result.jsonl',
+        resume_from=None,
         logger=None):
     """
     Perform flux variability analysis on the database,
@@ -44,6 +303,26 @@ def blocked_reactions_analysis(
             sum(j, S(i,j) * v(j)) = 0, for all i
             custom_flux_constraints
 
+    The LP is built once (in each worker process) and only the objective
+    is changed between two solves. The target reactions are split into chunks
+    that are solved in a pool of `processes` worker processes. The results
+    are merged in the order of target_reactions_list, so they do not depend
+    on the number of processes.
+
+    With skip_ahead=True, each LP solution is scanned for reactions that
+    carry flux (|v(j)| > eps). These reactions are not blocked, so their
+    own min/max LPs are skipped. Optionally, num_random_objectives LPs with
+    random objectives (maximize sum(j, w(j) * v(j)), w(j) ~ U(-1, 1)) are
+    solved first to find most of the unblocked reactions at once. Only the
+    blocked reactions (and those not seen in any solution) need both LPs.
+    The skipped reactions have {'min': None, 'max': None, 'flux': v(j)} in
+    FVA_res, with min/max set for the LPs that were solved.
+
+    Each result is appended to checkpoint_filepath (JSON lines) as soon as
+    it is known. A job that was stopped can be restarted with
+    resume_from=checkpoint_filepath: the reactions found in the checkpoint
+    are not solved again.
+
         Note: The glycolysis study was done using the GAMS version of this code.
         This is written in attempt to port find_blocked_reactions.gms from GAMS to Python,
         as a part of effort to generalize optstoic analysis.
@@ -63,6 +342,21 @@ def blocked_reactions_analysis(
             will be performed on all reactions in the database. The excluded_reactions set
             can be subtracted(e.g., set(database.reactions) - excluded_reactions), since
             they are blocked reactions.
+        processes (int, optional): Number of worker processes (default 1, i.e.
+            solve all the LPs in the current process).
+        backend (str or :obj:`BaseSolverBackend`, optional): If provided (e.g. 'HiGHS'),
+            solve the LPs with a persistent solver backend instead of pulp_solver.
+        chunksize (int, optional): Number of target reactions sent to a worker
+            process at a time.
+        skip_ahead (bool, optional): If True, skip the LPs of the reactions
+            that already carry flux in a previous solution.
+        num_random_objectives (int, optional): Number of random-objective LPs
+            solved before the FVA (only used with skip_ahead).
+        random_seed (int, optional): Seed of the random objectives.
+        checkpoint_filepath (str, optional): Path of the checkpoint file
+            (None to disable the checkpoint).
+        resume_from (str, optional): Path of a checkpoint file of a previous
+            run. The reactions in this file are not solved again.
         logger (:obj:`logging.logger`, optional): The logging instance
 
     Returns:
@@ -86,105 +380,205 @@ def blocked_reactions_analysis(
     M = 1000
     EPS = 1e-8
 
-    # Initialize variables
-    v = pulp.LpVariable.dicts("v", database.reactions,
-                              lowBound=-M, upBound=M, cat='Continuous')
-
-    for j in database.reactions:
-        if database.rxntype[j] == 0:
-            # Forward irreversible
-            v[j].lowBound = 0
-            v[j].upBound = M
-
-        elif database.rxntype[j] == 1:
-            # Reversible
-            v[j].lowBound = -M
-            v[j].upBound = M
-
-        elif database.rxntype[j] == 2:
-            # Reverse irreversible
-            v[j].lowBound = -M
-            v[j].upBound = 0
+    if custom_flux_constraints is not None:
+        logger.info("Adding custom constraints...")
 
-        elif database.rxntype[j] == 4:
-            v[j].lowBound = 0
-            v[j].upBound = 0
-
-        else:
-            raise ValueError("Reaction type for reaction %s is unknown." % j)
-
-    if excluded_reactions is not None:
-        for j in excluded_reactions:
-            v[j].lowBound = 0
-            v[j].upBound = 0
+    model = create_fva_matrix_model(
+        database,
+        specific_bounds,
+        custom_flux_constraints=custom_flux_constraints,
+        excluded_reactions=excluded_reactions,
+        M=M)
 
-    # Fix stoichiometry of source/sink metabolites
-    for j, bounds in specific_bounds.items():
-        v[j].lowBound = bounds['LB']
-        v[j].upBound = bounds['UB']
+    if isinstance(backend, BaseSolverBackend):
+        backend_name, backend_options = backend.name, backend.options
+    else:
+        backend_name, backend_options = backend, None
 
     FVA_res = {}
     blocked_reactions = []
-    lp_prob = None
 
     if target_reactions_list is None:
         target_reactions_list = database.reactions
     num_rxn = len(target_reactions_list)
 
-    for ind, j1 in enumerate(target_reactions_list):
-        logger.debug("%s/%s" % (ind, num_rxn))
-        FVA_res[j1] = {}
-
-        for obj in ['min', 'max']:
-
-            # Variables (make a copy)
-            vt = copy.deepcopy(v)
-            del lp_prob
-
-            # Objective function
-            if obj == 'min':
-                lp_prob = pulp.LpProblem("FVA%s" % obj, pulp.LpMinimize)
-                lp_prob += vt[j1], "FVA_min"
-            elif obj == 'max':
-                lp_prob = pulp.LpProblem("FVA%s" % obj, pulp.LpMaximize)
-                lp_prob += vt[j1], "FVA_max"
-
-            # Constraints
-            # Mass_balance
-            for i in database.metabolites:
-                # If metabolites not involve in any reactions
-                if i not in database.S:
-                    continue
-                label = "mass_balance_%s" % i
-                dot_S_v = pulp.lpSum([database.S[i][j] * vt[j]
-                                      for j in list(database.S[i].keys())])
-                condition = dot_S_v == 0
-                lp_prob += condition, label
-
-            if custom_flux_constraints is not None:
-                logger.info("Adding custom constraints...")
-
-                for group in custom_flux_constraints:
-                    lp_prob += pulp.lpSum(vt[rxn] for rxn in group['reactions']
-                                          ) <= group['UB'], "%s_UB" % group['constraint_name']
-                    lp_prob += pulp.lpSum(vt[rxn] for rxn in group['reactions']
-                                          ) >= group['LB'], "%s_LB" % group['constraint_name']
-
-            lp_prob.solve(solver=pulp_solver)
-
-            FVA_res[j1][obj] = pulp.value(lp_prob.objective)
-
-        if (FVA_res[j1]['max'] < EPS) and (FVA_res[j1]['min'] > -EPS):
-            blocked_reactions.append(j1)
-
-        json.dump(FVA_res,
-                  open("temp_FVA_result.json", 'w+'),
-                  sort_keys=True,
-                  indent=4)
+    resumed_res = {}
+    if resume_from is not None:
+        resumed_res = read_fva_checkpoint(resume_from)
+        logger.info("Resuming from %s (%d reactions done).",
+                    resume_from, len(resumed_res))
+
+    rxn_pos = dict((j, k) for k, j in enumerate(database.reactions))
+    target_cols = [rxn_pos[j] for j in target_reactions_list
+                   if j not in resumed_res]
+
+    fva_solver = None
+    if processes == 1 or skip_ahead:
+        fva_solver = FVASolver(model,
+                               pulp_solver=pulp_solver,
+                               backend_name=backend_name,
+                               backend_options=backend_options,
+                               skip_ahead=skip_ahead,
+                               eps=EPS,
+                               logger=logger)
+
+    if skip_ahead and num_random_objectives > 0:
+        logger.info("Solving %d LPs with random objectives...",
+                    num_random_objectives)
+        fva_solver.solve_random_objectives(target_cols,
+                                           num_random_objectives,
+                                           seed=random_seed)
+        logger.info("%d/%d reactions carry flux.",
+                    np.count_nonzero(fva_solver.observed_flux[target_cols]),
+                    len(target_cols))
+
+    if processes > 1:
+        if skip_ahead:
+            pool_cols = [col for col in target_cols
+                         if fva_solver.observed_flux[col] == 0]
+            observed_flux = fva_solver.observed_flux
+        else:
+            pool_cols = target_cols
+            observed_flux = np.zeros(model.num_cols)
+        if chunksize is None:
+            chunksize = max(1, len(pool_cols) // (processes * 4))
+        chunks = [pool_cols[k:k + chunksize]
+                  for k in range(0, len(pool_cols), chunksize)]
+        logger.info("Running FVA on %d reactions with %d processes...",
+                    len(pool_cols), processes)
+        pool = multiprocessing.Pool(
+            processes,
+            initializer=_init_fva_worker,
+            initargs=(model, pulp_solver, backend_name, backend_options,
+                      skip_ahead, observed_flux))
+        pool_results = (res for chunk_res in pool.imap(_run_fva_chunk, chunks)
+                        for res in chunk_res)
+        if skip_ahead:
+            results = (fva_solver.solve_min_max(col)
+                       if fva_solver.observed_flux[col] != 0
+                       else next(pool_results)
+                       for col in target_cols)
+        else:
+            results = pool_results
+    else:
+        pool = None
+        results = (fva_solver.solve_min_max(col) for col in target_cols)
+
+    checkpoint = None
+    if checkpoint_filepath is not None:
+        append = (resume_from is not None and
+                  os.path.abspath(resume_from) ==
+                  os.path.abspath(checkpoint_filepath))
+        checkpoint = FVACheckpoint(checkpoint_filepath, resume=append)
+
+    try:
+        for ind, j1 in enumerate(target_reactions_list):
+            logger.debug("%s/%s" % (ind, num_rxn))
+            if j1 in resumed_res:
+                res = resumed_res[j1]
+                if checkpoint is not None and not append:
+                    checkpoint.write(j1, res)
+            else:
+                res = next(results)
+                if checkpoint is not None:
+                    checkpoint.write(j1, res)
+            FVA_res[j1] = res
+
+            if 'flux' not in res and (res['min'] is None or
+                                      res['max'] is None):
+                logger.warning("FVA of reaction %s is not optimal." % j1)
+
+            if is_blocked(res, eps=EPS):
+                blocked_reactions.append(j1)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if checkpoint is not None:
+            checkpoint.close()
 
     return blocked_reactions, FVA_res
 
 
+def flux_bounds_from_fva(FVA_res, integer_flux=True, tol=1e-6):
+    """Return the flux ranges {reaction: (LB, UB)} of the FVA results of
+    blocked_reactions_analysis, to be used as the per-reaction bounds and
+    big-M of OptStoic (see OptStoic flux_bounds).
+
+    The FVA results are only valid bounds if the FVA was run with the same
+    specific_bounds, custom_flux_constraints and excluded reactions as the
+    OptStoic problem (or with looser ones). A bound that was not computed
+    (None, e.g. skipped with skip_ahead) is None, i.e. no bound.
+
+    Args:
+        FVA_res (dict): {reaction: {'min': ..., 'max': ...}}
+        integer_flux (bool, optional): If True, the bounds are rounded to
+            the inner integers (the fluxes of OptStoic are integers)
+        tol (float, optional): Tolerance of the rounding
+
+    Returns:
+        dict
+    """
+    flux_bounds = {}
+    for j, res in FVA_res.items():
+        lb, ub = res.get('min'), res.get('max')
+        if integer_flux:
+            # + 0.0 turns -0.0 into 0.0
+            lb = None if lb is None else float(np.ceil(lb - tol)) + 0.0
+            ub = None if ub is None else float(np.floor(ub + tol)) + 0.0
+        flux_bounds[j] = (lb, ub)
+    return flux_bounds
+
+
+def bound_tightening_analysis(
+        database,
+        specific_bounds,
+        custom_flux_constraints=None,
+        excluded_reactions=None,
+        M=1000,
+        integer_flux=True,
+        max_passes=20,
+        logger=None):
+    """Compute flux ranges {reaction: (LB, UB)} by propagating the bounds of
+    the FVA problem of blocked_reactions_analysis through the mass balance
+    and custom constraints (see propagate_bounds). It is a fast alternative
+    to the FVA (no LP is solved), with looser ranges.
+
+    Args:
+        database (:obj:`BaseReactionDatabase`): The reaction database
+        specific_bounds (dict): LB and UB for exchange reactions,
+            e.g. {'EX_glc': {'LB': -1, 'UB': -1}}
+        custom_flux_constraints (list, optional): The custom constraints
+        excluded_reactions (list, optional): Reactions that are fixed to zero
+        M (int, optional): The maximum flux bound (default 1000)
+        integer_flux (bool, optional): If True, the bounds are rounded to
+            integers
+        max_passes (int, optional): Maximum number of propagation passes
+        logger (:obj:`logging.logger`, optional): The logging instance
+
+    Returns:
+        dict: The flux ranges (see OptStoic flux_bounds)
+    """
+    if logger is None:
+        logger = create_logger(
+            name="optstoicpy.script.database_preprocessing.bound_tightening_analysis")
+
+    model = create_fva_matrix_model(
+        database,
+        specific_bounds,
+        custom_flux_constraints=custom_flux_constraints,
+        excluded_reactions=excluded_reactions,
+        M=M)
+    model.col_integer[:] = integer_flux
+    col_lower, col_upper = propagate_bounds(model, max_passes=max_passes)
+
+    num_tightened = np.count_nonzero((col_lower > model.col_lower) |
+                                     (col_upper < model.col_upper))
+    logger.info("Bounds of %d/%d reactions tightened.",
+                num_tightened, model.num_cols)
+    return dict((j, (float(col_lower[k]), float(col_upper[k])))
+                for k, j in enumerate(database.reactions))
+
+
 def remove_cofactors_from_Sij(Sij_df, cofactors):
     """
     Remove row of cofactors i from Sij matrix.
@@ -220,44 +614,63 @@ def remove_cofactors_from_Sij(Sij_df, cofactors):
     return nSij_df2
 
 
-def internal_loop_analysis(S_df, logger=None):
+def internal_loop_analysis(S_df, eps=1e-9, processes=1, logger=None):
     """
     Identifies the "rational" basis for the null space of S_df matrix,
     and convert them to internal loops.
-    This is an alternative to the Matlab function
-    null(S_df, 'r') (which is significantly faster).
-    Warning: This is extremely time consuming. Please use the MATLAB
-        version.
+    This is the Python equivalent of the Matlab function
+    null(S_df, 'r') used in gams/find_null_space.m. The reduced row echelon
+    form of S_df is computed with exact (integer) sparse elimination, so the
+    loops are the same as the ones given by MATLAB. The reaction-metabolite
+    graph is first split into connected components, and the null space of
+    each component is computed independently (in a pool of `processes`
+    worker processes).
+
+    The basis vectors are numbered in the order of their free reaction
+    (column): the n-th vector gives the loop 'L<n>', e.g.
+    {'L1': {'R00009': -0.5, 'R00090': 1.0}, ...}. Loops with a single
+    reaction (reactions involving only cofactors) are removed, so the loop
+    names may skip numbers.
 
-    M = Matrix([[16, 2, 3,13],
-    [5,11,10, 8],
-    [9, 7, 6,12],
-    [4,14,15, 1]])
+    Args:
+        S_df (pandas.DataFrame): The internal S matrix without cofactors
+            (see remove_cofactors_from_Sij)
+        eps (float, optional): Loop coefficients with absolute value below
+            eps are removed.
+        processes (int, optional): Number of worker processes
+        logger (:obj:`logging.logger`, optional): The logging instance
 
-    print(nsimplify(M, rational=True).nullspace())
+    Returns:
+        tuple: (Ninternal, loops) in the format of optstoic_v3_Nint.json,
+            where Ninternal = {loop: {reaction: coefficient}} and loops is
+            the list of loop names.
     """
     if logger is None:
         logger = create_logger(
             name="optstoicpy.script.database_preprocessing.internal_loop_analysis")
 
-    raise NotImplementedError("Use the Matlab version as this is too slow.")
-
-    reactions = S_df_no_cofactor.columns.tolist()
-    metabolites = S_df_no_cofactor.index.tolist()
-    Sint = S_df_no_cofactor.as_matrix()
-
-    # Sint_mat = Matrix(Sint) # too slow
-    Smat = SparseMatrix(Sint.astype(int))
+    reactions = S_df.columns.tolist()
+    Sint = scipy.sparse.csr_matrix(S_df.values.astype(np.float64))
 
-    # Get the rational basis of the null space of Sint
-    Nint_mat = nsimplify(Smat, rational=True).nullspace()
+    logger.info("Calculating the null space of a %d x %d matrix...",
+                Sint.shape[0], Sint.shape[1])
+    basis = rational_null_space(Sint, processes=processes, logger=logger)
 
-    # Convert back to numpy array
-    Nint = np.array(Nint_mat).astype(np.float64)
+    Ninternal = {}
+    loops = []
+    for ind, vector in enumerate(basis):
+        loop = dict((reactions[j], float(coeff))
+                    for j, coeff in vector.items() if abs(coeff) > eps)
+        loop_name = 'L%d' % (ind + 1)
+        if len(loop) == 1:
+            logger.warning("Single reaction loop found! %s" %
+                           list(loop.keys())[0])
+            continue
+        Ninternal[loop_name] = loop
+        loops.append(loop_name)
 
-    eps = 1e-9
-    Nint[Nint < eps] = 0
-    # Remove single reaction loop (reaction involving only cofactors)
+    logger.info("%d loops found.", len(loops))
+    return Ninternal, loops
 
 
 def write_matfile(Sint_df, outputfilepath='Sint_no_cofactor_20160831.mat'):
@@ -346,7 +759,9 @@ def test_internal_loop_analysis():
     # sparseMat, reactionList = write_matfile(S_df_no_cofactor)
     # run find_null_space.m to obtain all the loops
 
-    # Method 2: This function is not yet implemented in Python as it is too slow
-    # internal_loop_analysis(S_df_no_cofactor)
+    # Method 2: Python
+    Ninternal, loops = internal_loop_analysis(S_df_no_cofactor, logger=logger)
+    # json.dump(Ninternal, open('optstoic_v3_Nint.json', 'w+'),
+    #           sort_keys=True, indent=4)
 
-    return S_df_no_cofactor
+    return S_df_no_cofactor, Ninternal, loops
@@ -2,49 +2,263 @@
 """
 Using Gurobi command line (gurobi_cl) to solve lp problem generated with Pulp.
 This is written to solve the issue of unable to install Gurobi in Cygwin.
+
+The log of gurobi_cl is parsed into progress events (GurobiLogParser):
+the incumbent, the best bound and the relative gap, from the heuristic
+solutions, the lines of the node log and the final summary. A solve can be
+interrupted as soon as a gap or time target is reached (e.g. MinRxn, which
+may still have a large gap after 20 minutes); gurobi_cl then writes the best
+solution found to the result file.
+
+Usage:
+    status, message = solve_with_gurobi_cl_debug(
+        'OptStoic', progress_callback=print, gap_target=0.05)
 """
 from __future__ import print_function
+from collections import namedtuple
 import os
-import pdb
+import re
+import signal
 import sys
+import threading
+import time
 from subprocess import Popen, PIPE
 
+# A progress event of gurobi_cl. kind is 'heuristic' (a heuristic solution),
+# 'node' (a line of the node log) or 'summary' (the final 'Best objective'
+# line). gap is relative (0.05 for 5%), time is in seconds since the start of
+# the solve. The values that are not known yet are None.
+ProgressEvent = namedtuple(
+    'ProgressEvent', ['kind', 'incumbent', 'bound', 'gap', 'time', 'line'])
+
+# Final status lines of gurobi_cl and the corresponding status
+GUROBI_CL_STATUS_LINES = [
+    ('Optimal solution found', 'Optimal'),
+    ('Time limit reached', 'Time_limit'),
+    ('Solve interrupted', 'Interrupted')]
+
+_HEURISTIC = re.compile(r'^Found heuristic solution: objective (\S+)')
+_SUMMARY = re.compile(
+    r'^Best objective (\S+), best bound (\S+), gap (\S+?)%?$')
+_NODE_COUNT = re.compile(r'^\d+\+?$')
+_NODE_TIME = re.compile(r'^(\d+)s$')
+_GAP = re.compile(r'^(\d+(\.\d+)?)%$')
+
+
+def _to_float(value):
+    try:
+        return float(value.rstrip(','))
+    except ValueError:
+        # '-' (no incumbent yet)
+        return None
+
+
+def relative_gap(incumbent, bound):
+    """Return the relative gap of Gurobi |bound - incumbent| / |incumbent|
+    (None if one of them is unknown)."""
+    if incumbent is None or bound is None:
+        return None
+    if incumbent == bound:
+        return 0.0
+    if incumbent == 0:
+        return float('inf')
+    return abs(bound - incumbent) / abs(incumbent)
+
+
+class GurobiLogParser(object):
+    """Parse the lines of a gurobi_cl log into ProgressEvents and keep track
+    of the incumbent, bound and gap."""
+
+    def __init__(self):
+        self.incumbent = None
+        self.bound = None
+        self.gap = None
+        self.start_time = time.time()
+
+    @property
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def parse_line(self, line):
+        """Return the ProgressEvent of a line (None if the line is not a
+        progress line)."""
+        line = line.rstrip()
+        match = _HEURISTIC.match(line.strip())
+        if match:
+            incumbent = _to_float(match.group(1))
+            if incumbent is not None:
+                self.incumbent = incumbent
+                self.gap = relative_gap(self.incumbent, self.bound)
+            return self._event('heuristic', self.elapsed, line)
+
+        match = _SUMMARY.match(line.strip())
+        if match:
+            self.incumbent = _to_float(match.group(1))
+            self.bound = _to_float(match.group(2))
+            gap = _to_float(match.group(3))
+            self.gap = gap / 100 if gap is not None else None
+            return self._event('summary', self.elapsed, line)
+
+        # Node log: [H|*]nodes unexplored ... incumbent bound gap it/node time
+        tokens = line.split()
+        if len(tokens) < 6 or not _NODE_TIME.match(tokens[-1]):
+            return None
+        first = tokens[0].lstrip('H*')
+        if not _NODE_COUNT.match(first or tokens[1]):
+            return None
+        gap = _GAP.match(tokens[-3])
+        if not (gap or tokens[-3] == '-'):
+            return None
+        bound = _to_float(tokens[-4])
+        if bound is None:
+            return None
+        self.bound = bound
+        incumbent = _to_float(tokens[-5])
+        if incumbent is not None:
+            self.incumbent = incumbent
+        self.gap = (float(gap.group(1)) / 100 if gap else
+                    relative_gap(self.incumbent, self.bound))
+        return self._event('node', float(_NODE_TIME.match(tokens[-1]).group(1)),
+                           line)
+
+    def _event(self, kind, elapsed, line):
+        return ProgressEvent(kind, self.incumbent, self.bound, self.gap,
+                             elapsed, line)
+
+    def target_reached(self, gap_target=None, time_target=None):
+        """Return 'gap' or 'time' if a target is reached, None otherwise.
+        The targets are only reached once there is an incumbent.
+
+        Args:
+            gap_target (float, optional): Relative gap (e.g. 0.05 for 5%)
+            time_target (float, optional): Time (seconds)
+        """
+        if self.incumbent is None:
+            return None
+        if (gap_target is not None and self.gap is not None and
+                self.gap <= gap_target):
+            return 'gap'
+        if time_target is not None and self.elapsed >= time_target:
+            return 'time'
+        return None
+
+
+def gurobi_cl_status(output):
+    """Return (status, message) from the output of gurobi_cl.
+
+    The status is 'Optimal', 'Time_limit', 'Interrupted' (see
+    GUROBI_CL_STATUS_LINES) or 'Not_optimal'. The message is the 'Best
+    objective' line if the solve did not end with an optimal solution.
+    """
+    status = 'Not_optimal'
+    best = None
+    for line in output.splitlines():
+        line = line.strip()
+        for prefix, line_status in GUROBI_CL_STATUS_LINES:
+            if line.startswith(prefix):
+                status = line_status
+        if line.startswith('Best'):
+            best = line
+    if status in ['Optimal', 'Not_optimal']:
+        return status, None
+    return status, best
+
+
+def gurobi_cl_command(lp_filename, options):
+    return (['gurobi_cl'] + options.split() +
+            ['ResultFile=%s.sol' % lp_filename, '%s.lp' % lp_filename])
+
+
+def interrupt_process(process):
+    """Ask a solver to stop (Ctrl-C). gurobi_cl then writes the best
+    solution found."""
+    if sys.platform == 'win32':
+        process.terminate()
+    else:
+        process.send_signal(signal.SIGINT)
+
 
 def solve_with_gurobi_cl_debug(
         lp_filename,
-        options='Threads=2 TimeLimit=1200 MIPGapAbs=1e-6'):
-    args = 'gurobi_cl ' + options + \
-        ' ResultFile=%s.sol %s.lp' % (lp_filename, lp_filename)
-    command = args.split()
-    process = Popen(command, stdout=PIPE, stderr=PIPE)
-    output = ""
-    while True:
-        nextline = process.stdout.readline()
-        if nextline == '' and process.poll() is not None:
-            break
-        output += nextline
-        sys.stdout.write(nextline)
-        sys.stdout.flush()
-
-    # Iteration limit reached
-    if 'Optimal solution found' in output:
-        return 'Optimal', None
-    elif 'Time limit reached' in output:
-        status_message = [
-            l for l in output.splitlines() if l.startswith('Best')]
-        return 'Time_limit', status_message[0]
-    else:
-        return 'Not_optimal', None
+        options='Threads=2 TimeLimit=1200 MIPGapAbs=1e-6',
+        progress_callback=None,
+        gap_target=None,
+        time_target=None,
+        interrupt_timeout=60,
+        verbose=True,
+        cwd=None):
+    """Solve lp_filename.lp with gurobi_cl and stream its output.
+
+    stdout is read line by line (and stderr in a thread, so that the solver
+    never blocks on a full pipe). The time target is checked when gurobi_cl
+    writes a line (every few seconds in the node log).
+
+    Args:
+        lp_filename (str): The LP file without the .lp extension
+        options (str, optional): gurobi_cl parameters
+        progress_callback (callable, optional): Called with each
+            ProgressEvent
+        gap_target (float, optional): Interrupt the solve once the relative
+            gap is at most gap_target (e.g. 0.05)
+        time_target (float, optional): Interrupt the solve after time_target
+            seconds if a solution was found
+        interrupt_timeout (int, optional): Seconds to wait for gurobi_cl to
+            exit after the interruption before killing it
+        verbose (bool, optional): If True, write the output to stdout
+        cwd (str, optional): The working directory of gurobi_cl (where
+            gurobi.log is written), e.g. a ScratchDirectory
+
+    Returns:
+        tuple: (status, message), see gurobi_cl_status
+    """
+    process = Popen(gurobi_cl_command(lp_filename, options),
+                    stdout=PIPE, stderr=PIPE, universal_newlines=True,
+                    cwd=cwd)
+    stderr = []
+    stderr_reader = threading.Thread(
+        target=lambda: stderr.extend(process.stderr))
+    stderr_reader.daemon = True
+    stderr_reader.start()
+
+    parser = GurobiLogParser()
+    output = []
+    killer = None
+    for line in process.stdout:
+        output.append(line)
+        if verbose:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+        event = parser.parse_line(line)
+        if event is not None and progress_callback is not None:
+            progress_callback(event)
+        if killer is None:
+            reason = parser.target_reached(gap_target, time_target)
+            if reason is not None:
+                if verbose:
+                    print("The %s target is reached. Interrupting gurobi_cl..."
+                          % reason)
+                interrupt_process(process)
+                killer = threading.Timer(interrupt_timeout, process.kill)
+                killer.daemon = True
+                killer.start()
+
+    process.wait()
+    if killer is not None:
+        killer.cancel()
+    stderr_reader.join()
+    if stderr and verbose:
+        sys.stderr.write(''.join(stderr))
+    return gurobi_cl_status(''.join(output))
 
 
 def solve_with_gurobi_cl(
         lp_filename,
         options='Threads=2 TimeLimit=1200 MIPGapAbs=1e-6',
-        verbose=True):
-    args = 'gurobi_cl ' + options + \
-        ' ResultFile=%s.sol %s.lp' % (lp_filename, lp_filename)
-    command = args.split()
-    process = Popen(command, stdout=PIPE, stderr=PIPE)
+        verbose=True,
+        cwd=None):
+    process = Popen(gurobi_cl_command(lp_filename, options),
+                    stdout=PIPE, stderr=PIPE, universal_newlines=True,
+                    cwd=cwd)
     stdout, stderr = process.communicate()
     #exitCode = process.returncode
 
@@ -54,28 +268,22 @@ def solve_with_gurobi_cl(
     if stderr:
         print(stderr)
 
-    # Iteration limit reached
-    if 'Optimal solution found' in stdout:
-        return 'Optimal', None
-    elif 'Time limit reached' in stdout:
-        status_message = [
-            l for l in stdout.splitlines() if l.startswith('Best')]
-        return 'Time_limit', status_message[0]
-    else:
-        return 'Not_optimal', None
+    return gurobi_cl_status(stdout)
 
 
 def parse_gurobi_sol(sol_filename):
     try:
-        f = open(sol_filename + '.sol', 'rU')
+        f = open(sol_filename + '.sol', 'r')
     except IOError:
         print("%s.sol is not in the current directory." % sol_filename)
         return None
 
-    data = f.read().splitlines()
+    with f:
+        data = f.read().splitlines()
     # Objective function
     objective_function = float(data[0].split()[-1])
-    varValueList = [line.split() for line in data[1:] if line is not None]
+    varValueList = [line.split() for line in data[1:]
+                    if line and not line.startswith('#')]
     varValue = dict((k, float(v)) for (k, v) in varValueList)
     return objective_function, varValue
 
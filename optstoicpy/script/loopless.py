@@ -0,0 +1,125 @@
+"""
+Detect thermodynamically infeasible cycles in a flux distribution.
+
+The loopless constraints of OptStoic (sum(j, Nint(l,j) * G(j)) = 0 and the
+big-M constraints linking the sign of G(j) to the direction of v(j)) have a
+solution G if and only if there is no cycle u in the span of the loops
+(u = sum(l, lambda(l) * Nint(l,:)), u != 0) that only uses the reactions
+carrying flux, in the direction of their flux. Instead of adding all the
+loopless constraints to the MILP, OptStoic can solve without them, look for
+such a cycle in the solution with a small LP and cut the cycle off with a
+no-good cut on yf/yb (lazy constraint generation).
+
+Usage:
+    detector = LoopDetector(database)
+    cycle = detector.find_cycle({'R00200': 1.0, ...})
+    # cycle = {'R00200': 1, 'R00300': -1, ...} or None
+"""
+from builtins import object
+import numpy as np
+import scipy.sparse
+from scipy.optimize import linprog
+from optstoicpy.script.utils import create_logger
+
+# Coefficients of a cycle below EPS are ignored
+EPS = 1e-9
+
+
+class LoopDetector(object):
+    """Find the infeasible cycles of a flux distribution using the
+    loops (Ninternal) of a database."""
+
+    def __init__(self, database, logger=None):
+        """
+        Args:
+            database (:obj:`BaseReactionDatabase`): The database (with loops)
+            logger (:obj:`logging.logger`, optional): The logging instance
+        """
+        if logger is None:
+            self.logger = create_logger('optstoic.LoopDetector')
+        else:
+            self.logger = logger
+
+        loop_reactions = set()
+        for l in database.loops:
+            loop_reactions.update(database.Ninternal[l].keys())
+        self.reactions = sorted(loop_reactions)
+        rxn_pos = dict((j, k) for k, j in enumerate(self.reactions))
+
+        # The sign of G(j) is only linked to v(j) for these reactions
+        loop_rxn = (set(database.internal_rxns) -
+                    set(database.blocked_rxns or []))
+        self.is_loop_rxn = np.array([j in loop_rxn for j in self.reactions],
+                                    dtype=bool)
+
+        rows, cols, vals = [], [], []
+        for ind, l in enumerate(database.loops):
+            for j, coeff in database.Ninternal[l].items():
+                rows.append(ind)
+                cols.append(rxn_pos[j])
+                vals.append(coeff)
+        # Nint^T (reactions x loops)
+        self.NT = scipy.sparse.csr_matrix(
+            (vals, (cols, rows)),
+            shape=(len(self.reactions), len(database.loops)))
+
+    def find_cycle(self, fluxes, eps=1e-5):
+        """Find a cycle of reactions that carry flux in the direction of the
+        cycle (which violates the loopless constraints).
+
+        Solve the LP (with variables lambda(l)):
+
+            minimize sum(j in J, d(j) * u(j))
+            subject to:
+                u = Nint^T * lambda
+                d(j) * u(j) >= 0, for j in J
+                u(j) = 0, for j not in J
+                sum(j in J, d(j) * u(j)) >= 1
+
+        where J is the set of loop reactions with |v(j)| > eps and d(j) is the
+        sign of v(j).
+
+        Args:
+            fluxes (dict): {reaction: flux}
+            eps (float, optional): Flux threshold of an active reaction
+
+        Returns:
+            dict: {reaction: direction (1 or -1)} of the reactions of the
+                cycle, or None if the flux distribution is loopless.
+        """
+        direction = np.zeros(len(self.reactions))
+        for k, j in enumerate(self.reactions):
+            flux = fluxes.get(j) or 0
+            if self.is_loop_rxn[k] and abs(flux) > eps:
+                direction[k] = np.sign(flux)
+
+        active = direction != 0
+        if self.NT.shape[1] == 0 or active.sum() < 2:
+            return None
+
+        NT_active = scipy.sparse.diags(direction[active]).dot(
+            self.NT[active])
+        NT_inactive = self.NT[~active]
+        c = np.asarray(NT_active.sum(axis=0)).ravel()
+        A_ub = scipy.sparse.vstack([-NT_active, -c.reshape(1, -1)]).tocsr()
+        b_ub = np.zeros(A_ub.shape[0])
+        b_ub[-1] = -1
+
+        res = linprog(c,
+                      A_ub=A_ub, b_ub=b_ub,
+                      A_eq=NT_inactive if NT_inactive.shape[0] else None,
+                      b_eq=np.zeros(NT_inactive.shape[0])
+                      if NT_inactive.shape[0] else None,
+                      bounds=(None, None),
+                      method='highs')
+        if res.status != 0:
+            # Infeasible: no cycle
+            return None
+
+        u = NT_active.dot(res.x)
+        active_reactions = np.array(self.reactions, dtype=object)[active]
+        active_direction = direction[active]
+        cycle = dict((j, int(d)) for j, d, value in
+                     zip(active_reactions, active_direction, u) if value > EPS)
+        self.logger.debug("Cycle found: %s", cycle)
+        return cycle or None
@@ -0,0 +1,235 @@
+"""
+Write a MatrixModel to a file in LP format without going through PuLP.
+
+The file is rendered straight from the arrays of the MatrixModel. An
+LPWriter remembers where the constraint section of the file ends, so a
+new constraint (e.g. an integer cut) is written in place: the file is
+truncated at the end of the constraints, the new row is appended and the
+(cached) Bounds/Generals/Binaries sections are written again. The rows that
+are already in the file are never rendered or written again.
+
+The indicator constraints of the model are written in the Gurobi LP format
+(e.g. 'cons2_R00200: yf_R00200 = 0 -> +1 vf_R00200 <= 0'), which gurobi_cl
+reads but most other LP readers do not.
+
+Usage:
+    writer = LPWriter(model, 'OptStoic.lp')
+    writer.write()
+    ... solve OptStoic.lp with the command line solver ...
+    writer.add_row('IntegerCut_1', {'yf_R00200': -1.0, ...}, lower=0)
+"""
+from builtins import object
+import numpy as np
+import pulp
+from optstoicpy.script.utils import create_logger
+
+INF = float('inf')
+
+# Number of terms per line (some LP readers limit the line length)
+TERMS_PER_LINE = 8
+
+
+def _format_number(value):
+    return '%.12g' % value
+
+
+def _format_terms(names, coeffs):
+    """Return a linear expression, e.g. '+1 x +0.5 y', wrapped over lines."""
+    terms = ['%+.12g %s' % (coeff, name) for coeff, name in zip(coeffs, names)]
+    lines = [' '.join(terms[k:k + TERMS_PER_LINE])
+             for k in range(0, len(terms), TERMS_PER_LINE)]
+    return '\n '.join(lines)
+
+
+def format_row(name, names, coeffs, lower, upper, empty_name):
+    """Return a constraint in LP format.
+
+    Args:
+        name (str): Name of the constraint
+        names (list): Variable names of the nonzero coefficients
+        coeffs (list): The nonzero coefficients
+        lower (float): Lower bound of the constraint (-inf if none)
+        upper (float): Upper bound of the constraint (inf if none)
+        empty_name (str): A variable name used to write an empty constraint
+
+    Returns:
+        str
+
+    Raises:
+        ValueError: If the constraint has both a lower and an upper bound
+    """
+    if len(names) == 0:
+        expression = '0 %s' % empty_name
+    else:
+        expression = _format_terms(names, coeffs)
+
+    if lower == upper:
+        sense, rhs = '=', lower
+    elif upper == INF:
+        sense, rhs = '>=', lower
+    elif lower == -INF:
+        sense, rhs = '<=', upper
+    else:
+        raise ValueError("Ranged constraint %s is not supported." % name)
+
+    return '%s: %s %s %s\n' % (name, expression, sense, _format_number(rhs))
+
+
+def format_indicator(indicator, col_names):
+    """Return an indicator constraint (see IndicatorConstraint) in the LP
+    format of Gurobi.
+
+    Args:
+        indicator (:obj:`IndicatorConstraint`): The indicator constraint
+        col_names (list): The variable names of the columns
+
+    Returns:
+        str
+    """
+    row = format_row(indicator.name,
+                     [col_names[k] for k in indicator.cols],
+                     indicator.vals,
+                     indicator.lower,
+                     indicator.upper,
+                     col_names[0])
+    name, constraint = row.split(': ', 1)
+    return '%s: %s = %d -> %s' % (name, col_names[indicator.binary],
+                                  indicator.value, constraint)
+
+
+class LPWriter(object):
+    """Write a MatrixModel to an LP file and append constraints in place."""
+
+    def __init__(self, model, filepath, logger=None):
+        """
+        Args:
+            model (:obj:`MatrixModel`): The problem
+            filepath (str): Path of the LP file
+            logger (None, optional): A logging.Logger object
+        """
+        if logger is None:
+            self.logger = create_logger('optstoic.LPWriter')
+        else:
+            self.logger = logger
+        self.model = model
+        self.filepath = filepath
+        self._trailer = None
+        self._trailer_offset = None
+
+    def _header(self):
+        model = self.model
+        cost = model.col_cost
+        cols = np.nonzero(cost)[0]
+        if model.sense == pulp.LpMaximize:
+            sense = 'Maximize'
+        else:
+            sense = 'Minimize'
+        if len(cols) == 0:
+            objective = '0 %s' % model.col_names[0]
+        else:
+            objective = _format_terms([model.col_names[k] for k in cols],
+                                      cost[cols])
+        return '\\* %s *\\\n%s\n%s: %s\nSubject To\n' % (
+            model.name, sense, model.objective_name, objective)
+
+    def _rows(self):
+        """Yield the constraints in LP format."""
+        model = self.model
+        A = model.A.tocsr()
+        names = np.array(model.col_names, dtype=object)
+        for ind in range(model.num_rows):
+            start, end = A.indptr[ind], A.indptr[ind + 1]
+            yield format_row(model.row_names[ind],
+                             names[A.indices[start:end]],
+                             A.data[start:end],
+                             model.row_lower[ind],
+                             model.row_upper[ind],
+                             model.col_names[0])
+
+    def _indicators(self):
+        """Yield the indicator constraints in LP format."""
+        for indicator in self.model.indicators:
+            yield format_indicator(indicator, self.model.col_names)
+
+    def _bounds(self):
+        """Return the Bounds, Generals and Binaries sections."""
+        model = self.model
+        lines = ['Bounds\n']
+        binaries = []
+        generals = []
+        for name, lower, upper, is_int in zip(model.col_names,
+                                              model.col_lower,
+                                              model.col_upper,
+                                              model.col_integer):
+            if is_int:
+                if lower == 0 and upper == 1:
+                    binaries.append(name)
+                    continue
+                generals.append(name)
+
+            if lower == upper:
+                lines.append(' %s = %s\n' % (name, _format_number(lower)))
+            elif lower == -INF and upper == INF:
+                lines.append(' %s free\n' % name)
+            elif lower == 0 and upper == INF:
+                # Default bounds
+                continue
+            else:
+                lines.append(' %s <= %s <= %s\n' % (
+                    '-inf' if lower == -INF else _format_number(lower),
+                    name,
+                    '+inf' if upper == INF else _format_number(upper)))
+
+        for section, col_names in [('Generals', generals),
+                                   ('Binaries', binaries)]:
+            if col_names:
+                lines.append('%s\n' % section)
+                lines.extend(' %s\n' % name for name in col_names)
+        lines.append('End\n')
+        return ''.join(lines).encode()
+
+    def write(self):
+        """Write the whole model to the LP file."""
+        self.logger.debug("Writing %s...", self.filepath)
+        with open(self.filepath, 'wb') as f:
+            f.write(self._header().encode())
+            for row in self._rows():
+                f.write(row.encode())
+            for indicator in self._indicators():
+                f.write(indicator.encode())
+            self._trailer_offset = f.tell()
+            self._trailer = self._bounds()
+            f.write(self._trailer)
+
+    def add_row(self, name, coefficients, lower, upper):
+        """Append a constraint to the model and to the LP file, without
+        rewriting the constraints that are already in the file.
+
+        Args:
+            name (str): Name of the constraint
+            coefficients (dict): {variable name: coefficient}
+            lower (float): Lower bound of the constraint (-inf if none)
+            upper (float): Upper bound of the constraint (inf if none)
+        """
+        model = self.model
+        cols, vals = model.add_row(name, coefficients, lower, upper)
+
+        if self._trailer_offset is None:
+            self.write()
+            return
+
+        # Render the new row from its own entries (reading model.A would
+        # stack it onto the whole constraint matrix)
+        order = np.argsort(cols)
+        row = format_row(name,
+                         [model.col_names[k] for k in cols[order]],
+                         vals[order],
+                         lower,
+                         upper,
+                         model.col_names[0])
+        with open(self.filepath, 'r+b') as f:
+            f.seek(self._trailer_offset)
+            f.truncate()
+            f.write(row.encode())
+            self._trailer_offset = f.tell()
+            f.write(self._trailer)
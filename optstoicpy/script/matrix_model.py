@@ -0,0 +1,931 @@
+"""
+Matrix (array) representation of an optimization problem.
+
+A MatrixModel holds the same information as a pulp.LpProblem, but as NumPy
+arrays and a scipy.sparse constraint matrix, so that it can be handed to a
+persistent solver backend (see solver_backend.py) without going through
+PuLP's expression objects again.
+
+    minimize/maximize  c * x
+    subject to         row_lower <= A * x <= row_upper
+                       col_lower <= x <= col_upper
+                       x(j) integer, for j in integer columns
+
+create_minflux_matrix_model() builds the OptStoic MILP (the same problem as
+OptStoic.create_minflux_problem) directly from the sparse S matrix of a
+Database, one block of constraints at a time, without creating any PuLP
+objects.
+
+A MatrixModel may also hold indicator constraints
+(binary = value -> lower <= a * x <= upper), which replace the big-M
+constraints for the solvers that support them (see LPWriter).
+"""
+from builtins import object
+from collections import namedtuple
+import numpy as np
+import pulp
+from scipy import sparse
+
+INF = float('inf')
+
+# binary = value -> lower <= sum(vals * x[cols]) <= upper, where binary is the
+# column index of a binary variable and cols the column indices of the terms
+IndicatorConstraint = namedtuple(
+    'IndicatorConstraint',
+    ['name', 'binary', 'value', 'cols', 'vals', 'lower', 'upper'])
+
+
+def lp_name(name):
+    """Return the name that PuLP would give to a variable/constraint
+    (illegal characters such as '-', '+' and '>' are replaced by '_').
+    """
+    return str(name).translate(pulp.LpElement.trans)
+
+
+class MatrixModel(object):
+    """A linear (mixed-integer) problem in matrix form.
+
+    Attributes:
+        col_names (list): The variable names (same as the PuLP variable names)
+        col_lower (numpy.ndarray): Lower bound of the variables (-inf if unbounded)
+        col_upper (numpy.ndarray): Upper bound of the variables (inf if unbounded)
+        col_cost (numpy.ndarray): Objective coefficients
+        col_integer (numpy.ndarray): Boolean array, True for integer/binary variables
+        row_names (list): The constraint names
+        row_lower (numpy.ndarray): Lower bound of the constraints
+        row_upper (numpy.ndarray): Upper bound of the constraints
+        A (scipy.sparse.csr_matrix): The constraint matrix (rows x cols).
+            The rows appended by add_row are only stacked onto A (and
+            row_lower/row_upper) when one of them is read.
+        sense (int): pulp.LpMinimize (1) or pulp.LpMaximize (-1)
+        name (str): Name of the problem
+        indicators (list): The IndicatorConstraints
+    """
+
+    def __init__(self,
+                 col_names,
+                 col_lower,
+                 col_upper,
+                 col_cost,
+                 col_integer,
+                 row_names,
+                 row_lower,
+                 row_upper,
+                 A,
+                 sense=pulp.LpMinimize,
+                 name='OptStoic',
+                 objective_name='OBJ',
+                 indicators=None):
+
+        self.name = name
+        self.objective_name = objective_name
+        self.sense = sense
+        self.col_names = list(col_names)
+        self.col_lower = np.asarray(col_lower, dtype=np.float64)
+        self.col_upper = np.asarray(col_upper, dtype=np.float64)
+        self.col_cost = np.asarray(col_cost, dtype=np.float64)
+        self.col_integer = np.asarray(col_integer, dtype=bool)
+        self.row_names = list(row_names)
+        self._row_lower = np.asarray(row_lower, dtype=np.float64)
+        self._row_upper = np.asarray(row_upper, dtype=np.float64)
+        self._A = sparse.csr_matrix(A, shape=(len(self.row_names),
+                                              len(self.col_names)))
+        # (cols, vals, lower, upper) of the rows not stacked onto A yet
+        self._new_rows = []
+        self.indicators = list(indicators or [])
+        self._col_index = None
+
+    @property
+    def A(self):
+        self._stack_new_rows()
+        return self._A
+
+    @A.setter
+    def A(self, A):
+        self._stack_new_rows()
+        self._A = sparse.csr_matrix(A)
+
+    @property
+    def row_lower(self):
+        self._stack_new_rows()
+        return self._row_lower
+
+    @row_lower.setter
+    def row_lower(self, row_lower):
+        self._stack_new_rows()
+        self._row_lower = np.asarray(row_lower, dtype=np.float64)
+
+    @property
+    def row_upper(self):
+        self._stack_new_rows()
+        return self._row_upper
+
+    @row_upper.setter
+    def row_upper(self, row_upper):
+        self._stack_new_rows()
+        self._row_upper = np.asarray(row_upper, dtype=np.float64)
+
+    def _stack_new_rows(self):
+        """Stack the rows appended by add_row onto A, row_lower and
+        row_upper."""
+        if not self._new_rows:
+            return
+        new_rows = self._new_rows
+        self._new_rows = []
+        rows = np.repeat(np.arange(len(new_rows), dtype=np.int32),
+                         [len(row[0]) for row in new_rows])
+        new_A = sparse.csr_matrix(
+            (np.concatenate([row[1] for row in new_rows]),
+             (rows, np.concatenate([row[0] for row in new_rows]))),
+            shape=(len(new_rows), self.num_cols))
+        self._A = sparse.vstack([self._A, new_A], format='csr')
+        self._row_lower = np.append(self._row_lower,
+                                    [row[2] for row in new_rows])
+        self._row_upper = np.append(self._row_upper,
+                                    [row[3] for row in new_rows])
+
+    @property
+    def num_cols(self):
+        return len(self.col_names)
+
+    @property
+    def num_rows(self):
+        return len(self.row_names)
+
+    @property
+    def col_index(self):
+        """Return a dictionary mapping variable names to column indices."""
+        if self._col_index is None:
+            self._col_index = dict(
+                (name, ind) for ind, name in enumerate(self.col_names))
+        return self._col_index
+
+    def sparse_row(self, coefficients):
+        """Convert a {variable name: coefficient} dictionary to
+        (column indices, values) arrays.
+
+        Args:
+            coefficients (dict): Coefficients of the row
+
+        Returns:
+            tuple: (numpy.ndarray of int, numpy.ndarray of float)
+        """
+        index = self.col_index
+        cols = np.array([index[name] for name in coefficients],
+                        dtype=np.int32)
+        vals = np.array(list(coefficients.values()), dtype=np.float64)
+        return cols, vals
+
+    def add_row(self, name, coefficients, lower=-INF, upper=INF):
+        """Append a constraint row, e.g. an integer cut, to the model.
+        The cost is proportional to the size of the row: the row is only
+        stacked onto A when A is read.
+
+        Args:
+            name (str): Name of the constraint
+            coefficients (dict): {variable name: coefficient}
+            lower (float, optional): Lower bound of the constraint
+            upper (float, optional): Upper bound of the constraint
+
+        Returns:
+            tuple: The (column indices, values) of the row (see sparse_row)
+        """
+        cols, vals = self.sparse_row(coefficients)
+        self._new_rows.append((cols, vals, lower, upper))
+        self.row_names.append(name)
+        return cols, vals
+
+    def set_objective(self, coefficients, sense=pulp.LpMinimize,
+                      objective_name=None):
+        """Replace the objective function.
+
+        Args:
+            coefficients (dict): {variable name: coefficient}
+            sense (int, optional): pulp.LpMinimize (1) or pulp.LpMaximize (-1)
+            objective_name (str, optional): Name of the objective
+        """
+        cols, vals = self.sparse_row(coefficients)
+        self.col_cost = np.zeros(self.num_cols)
+        self.col_cost[cols] = vals
+        self.sense = sense
+        if objective_name is not None:
+            self.objective_name = objective_name
+
+    def values_to_dict(self, values):
+        """Map an array of column values back to the variable names."""
+        return dict(zip(self.col_names, values))
+
+    @classmethod
+    def from_pulp(cls, lp_prob):
+        """Create a MatrixModel from a pulp.LpProblem.
+
+        Args:
+            lp_prob (pulp.LpProblem): The problem
+
+        Returns:
+            MatrixModel
+        """
+        variables = lp_prob.variables()
+        col_index = dict((var.name, ind) for ind, var in enumerate(variables))
+
+        col_lower = np.array(
+            [-INF if var.lowBound is None else var.lowBound
+             for var in variables], dtype=np.float64)
+        col_upper = np.array(
+            [INF if var.upBound is None else var.upBound
+             for var in variables], dtype=np.float64)
+        col_integer = np.array(
+            [var.cat == pulp.LpInteger for var in variables], dtype=bool)
+
+        col_cost = np.zeros(len(variables))
+        if lp_prob.objective is not None:
+            for var, coeff in lp_prob.objective.items():
+                col_cost[col_index[var.name]] = coeff
+
+        row_names = []
+        row_lower = []
+        row_upper = []
+        rows = []
+        cols = []
+        vals = []
+        for ind, (name, constraint) in enumerate(lp_prob.constraints.items()):
+            lower, upper = constraint_bounds(constraint)
+            row_names.append(name)
+            row_lower.append(lower)
+            row_upper.append(upper)
+            for var, coeff in constraint.items():
+                rows.append(ind)
+                cols.append(col_index[var.name])
+                vals.append(coeff)
+
+        A = sparse.csr_matrix((vals, (rows, cols)),
+                              shape=(len(row_names), len(variables)))
+
+        objective_name = getattr(lp_prob.objective, 'name', None) or 'OBJ'
+
+        return cls(col_names=[var.name for var in variables],
+                   col_lower=col_lower,
+                   col_upper=col_upper,
+                   col_cost=col_cost,
+                   col_integer=col_integer,
+                   row_names=row_names,
+                   row_lower=row_lower,
+                   row_upper=row_upper,
+                   A=A,
+                   sense=lp_prob.sense,
+                   name=lp_prob.name,
+                   objective_name=objective_name)
+
+    def to_pulp(self):
+        """Create a pulp.LpProblem from the MatrixModel.
+
+        Returns:
+            tuple: (pulp.LpProblem, `list` of pulp.LpVariable in column order)
+
+        Raises:
+            ValueError: If a constraint has both a lower and an upper bound,
+                or if the model has indicator constraints
+        """
+        if self.indicators:
+            raise ValueError("PuLP does not support indicator constraints.")
+        lp_prob = pulp.LpProblem(self.name, self.sense)
+        variables = []
+        for name, lower, upper, is_int in zip(self.col_names,
+                                              self.col_lower,
+                                              self.col_upper,
+                                              self.col_integer):
+            variables.append(pulp.LpVariable(
+                name,
+                lowBound=None if lower == -INF else lower,
+                upBound=None if upper == INF else upper,
+                cat=pulp.LpInteger if is_int else pulp.LpContinuous))
+
+        cols = np.nonzero(self.col_cost)[0]
+        lp_prob += pulp.LpAffineExpression(
+            [(variables[k], self.col_cost[k]) for k in cols]), \
+            self.objective_name
+
+        A = self.A
+        for ind, name in enumerate(self.row_names):
+            start, end = A.indptr[ind], A.indptr[ind + 1]
+            expression = pulp.LpAffineExpression(
+                [(variables[k], c) for k, c in zip(A.indices[start:end],
+                                                   A.data[start:end])])
+            lower, upper = self.row_lower[ind], self.row_upper[ind]
+            if lower == upper:
+                sense, rhs = pulp.LpConstraintEQ, lower
+            elif upper == INF:
+                sense, rhs = pulp.LpConstraintGE, lower
+            elif lower == -INF:
+                sense, rhs = pulp.LpConstraintLE, upper
+            else:
+                raise ValueError(
+                    "Ranged constraint %s is not supported." % name)
+            lp_prob += pulp.LpConstraint(expression, sense, name, rhs)
+
+        return lp_prob, variables
+
+    def __repr__(self):
+        return "<MatrixModel(name='%s', rows=%d, cols=%d)>" % (
+            self.name, self.num_rows, self.num_cols)
+
+
+def constraint_bounds(constraint):
+    """Return the (lower, upper) bounds of a pulp.LpConstraint,
+    i.e. lower <= sum(coeff * var) <= upper.
+    """
+    rhs = -constraint.constant
+    if constraint.sense == pulp.LpConstraintEQ:
+        return rhs, rhs
+    elif constraint.sense == pulp.LpConstraintGE:
+        return rhs, INF
+    elif constraint.sense == pulp.LpConstraintLE:
+        return -INF, rhs
+    else:
+        raise ValueError("Unknown constraint sense %s" % constraint.sense)
+
+
+def constraint_to_row(constraint):
+    """Convert a pulp.LpConstraint to
+    ({variable name: coefficient}, lower, upper).
+    """
+    coefficients = dict((var.name, coeff) for var, coeff in constraint.items())
+    lower, upper = constraint_bounds(constraint)
+    return coefficients, lower, upper
+
+
+def _block_rows(names, lower, upper, entries, prefix):
+    """Return a block of constraint rows, one per name in names.
+
+    Args:
+        names (list): Names appended to prefix to give the row names
+        lower (float or numpy.ndarray): Lower bound of the rows
+        upper (float or numpy.ndarray): Upper bound of the rows
+        entries (list): A list of (row indices, column indices, coefficients)
+            with row indices local to the block
+        prefix (str): Prefix of the row names
+
+    Returns:
+        dict
+    """
+    num_rows = len(names)
+    rows, cols, vals = [], [], []
+    for r, c, v in entries:
+        r = np.broadcast_to(np.asarray(r, dtype=np.int64), np.shape(c))
+        rows.append(r)
+        cols.append(np.asarray(c, dtype=np.int64))
+        vals.append(np.broadcast_to(np.asarray(v, dtype=np.float64),
+                                    np.shape(c)))
+    return dict(
+        names=[lp_name(prefix + str(name)) for name in names],
+        lower=np.broadcast_to(np.asarray(lower, dtype=np.float64), (num_rows,)),
+        upper=np.broadcast_to(np.asarray(upper, dtype=np.float64), (num_rows,)),
+        rows=np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64),
+        cols=np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64),
+        vals=np.concatenate(vals) if vals else np.zeros(0))
+
+
+def _indicators(names, binary_cols, value, var_cols, coeff, lower, upper,
+                prefix):
+    """Return one IndicatorConstraint
+    (binary = value -> lower <= coeff * var <= upper) per name in names."""
+    return [IndicatorConstraint(lp_name(prefix + str(name)), int(binary),
+                                value, np.array([var], dtype=np.int64),
+                                np.array([coeff], dtype=np.float64),
+                                lower, upper)
+            for name, binary, var in zip(names, binary_cols, var_cols)]
+
+
+def _mass_balance_rows(database, rxn_pos, v_offset):
+    """Return the mass balance rows sum(j, S(i,j) * v(j)) = 0
+    (metabolites that are not involved in any reaction are skipped).
+
+    Args:
+        database (:obj:`Database`): An optStoic Database object
+        rxn_pos (dict): {reaction: position of the reaction in the v block}
+        v_offset (int): Column index of the first v variable
+
+    Returns:
+        dict
+    """
+    S = sparse.coo_matrix(database.S_matrix)
+    label_to_pos = np.array([rxn_pos[j] for j in database.reaction_array],
+                            dtype=np.int64)
+    nnz = np.bincount(S.row, minlength=S.shape[0])
+    met_index = database.metabolite_index
+    metabolites = [i for i in database.metabolites
+                   if i in met_index and nnz[met_index[i]] > 0]
+    met_row = np.full(S.shape[0], -1, dtype=np.int64)
+    met_row[[met_index[i] for i in metabolites]] = np.arange(len(metabolites))
+    return _block_rows(
+        metabolites, 0, 0,
+        [(met_row[S.row], v_offset + label_to_pos[S.col], S.data)],
+        'mass_balance_')
+
+
+def _custom_flux_rows(custom_flux_constraints, rxn_pos, v_offset):
+    """Return the rows of the custom flux constraints
+    (LB <= sum(j in reactions, v(j)) <= UB, as two rows).
+    """
+    row_blocks = []
+    for group in custom_flux_constraints:
+        cols = v_offset + np.array([rxn_pos[rxn] for rxn in group['reactions']],
+                                   dtype=np.int64)
+        for suffix, lower, upper in [('_UB', -INF, group['UB']),
+                                     ('_LB', group['LB'], INF)]:
+            row_blocks.append(_block_rows(
+                [''], lower, upper, [(0, cols, 1)],
+                group['constraint_name'] + suffix))
+    return row_blocks
+
+
+def _stack_rows(row_blocks, num_cols):
+    """Stack blocks of rows into (row_names, row_lower, row_upper, A)."""
+    row_names = []
+    row_lower = []
+    row_upper = []
+    rows = []
+    for block in row_blocks:
+        rows.append(block['rows'] + len(row_names))
+        row_names.extend(block['names'])
+        row_lower.append(block['lower'])
+        row_upper.append(block['upper'])
+
+    A = sparse.coo_matrix(
+        (np.concatenate([block['vals'] for block in row_blocks]),
+         (np.concatenate(rows),
+          np.concatenate([block['cols'] for block in row_blocks]))),
+        shape=(len(row_names), num_cols)).tocsr()
+    return (row_names, np.concatenate(row_lower), np.concatenate(row_upper),
+            A)
+
+
+def apply_flux_bounds(reactions, lower, upper, flux_bounds,
+                      specific_bounds=None):
+    """Intersect the flux bounds of the reactions with flux ranges, e.g. from
+    FVA (see flux_bounds_from_fva) or bound propagation (see
+    bound_tightening_analysis).
+
+    Args:
+        reactions (list): The reactions, in the order of lower and upper
+        lower (numpy.ndarray): Lower bound of v(j)
+        upper (numpy.ndarray): Upper bound of v(j)
+        flux_bounds (dict): {reaction: (LB, UB)} (None for no bound)
+        specific_bounds (dict, optional): The bounds of these reactions are
+            kept as they are
+
+    Returns:
+        tuple: (lower, upper), new arrays
+
+    Raises:
+        ValueError: If the flux range of a reaction does not intersect
+            its bounds
+    """
+    lower = np.array(lower, dtype=np.float64)
+    upper = np.array(upper, dtype=np.float64)
+    specific_bounds = specific_bounds or {}
+    for k, j in enumerate(reactions):
+        if j not in flux_bounds or j in specific_bounds:
+            continue
+        lb, ub = flux_bounds[j]
+        if lb is not None:
+            lower[k] = max(lower[k], lb)
+        if ub is not None:
+            upper[k] = min(upper[k], ub)
+        if lower[k] > upper[k]:
+            raise ValueError("The flux range %s of reaction %s does not "
+                             "intersect its bounds." % ((lb, ub), j))
+    return lower, upper
+
+
+def fixed_flux_variables(specific_bounds):
+    """Return the values of vf, vb, yf and yb (MinFlux) implied by the
+    specific bounds with LB == UB. Since v(j) = vf(j) - vb(j),
+    vf(j) >= 0.5 * yf(j), vb(j) >= 0.5 * yb(j) and yf(j) + yb(j) <= 1, the
+    sign of a fixed flux fixes all four variables.
+
+    Args:
+        specific_bounds (dict): LB and UB of the reactions,
+            e.g. {'EX_glc': {'LB': -1, 'UB': -1}}
+
+    Returns:
+        dict: {reaction: {'vf': ..., 'vb': ..., 'yf': ..., 'yb': ...}}
+    """
+    fixed = {}
+    for rxn, bounds in specific_bounds.items():
+        if bounds['LB'] != bounds['UB']:
+            continue
+        value = bounds['LB']
+        fixed[rxn] = dict(vf=max(value, 0), vb=max(-value, 0),
+                          yf=int(value > 0), yb=int(value < 0))
+    return fixed
+
+
+def propagate_bounds(model, max_passes=20, tol=1e-6):
+    """Tighten the bounds of the variables by propagating the bounds of the
+    other variables through each constraint row:
+
+        a(k) * x(k) >= row_lower - max(sum(j != k, a(j) * x(j)))
+        a(k) * x(k) <= row_upper - min(sum(j != k, a(j) * x(j)))
+
+    All rows are processed at once, in passes, until no bound improves by
+    more than tol or max_passes is reached. The bounds of integer variables
+    are rounded. This is much faster than FVA (no LP is solved), but the
+    bounds are not as tight.
+
+    Args:
+        model (:obj:`MatrixModel`): The problem
+        max_passes (int, optional): Maximum number of passes
+        tol (float, optional): Minimum improvement of a bound
+
+    Returns:
+        tuple: (col_lower, col_upper), new arrays
+
+    Raises:
+        ValueError: If the bounds show that the problem is infeasible
+    """
+    A = model.A.tocoo()
+    rows, cols, vals = A.row, A.col, A.data
+    keep = vals != 0
+    rows, cols, vals = rows[keep], cols[keep], vals[keep]
+    positive = vals > 0
+    num_rows = model.num_rows
+    lower = model.col_lower.copy()
+    upper = model.col_upper.copy()
+
+    def activity_without(contrib, infinite):
+        # Activity of each row without the term of each entry
+        finite = np.where(infinite, 0, contrib)
+        total = np.bincount(rows, weights=finite, minlength=num_rows)
+        num_inf = np.bincount(rows, weights=infinite, minlength=num_rows)
+        return np.where(num_inf[rows] - infinite > 0,
+                        np.nan, total[rows] - finite)
+
+    def step(bound):
+        # Minimum improvement of a bound (relative to large bounds)
+        return tol * np.maximum(1, abs(np.nan_to_num(bound, posinf=0,
+                                                     neginf=0)))
+
+    for _ in range(max_passes):
+        with np.errstate(invalid='ignore'):
+            min_contrib = np.where(positive, vals * lower[cols],
+                                   vals * upper[cols])
+            max_contrib = np.where(positive, vals * upper[cols],
+                                   vals * lower[cols])
+        min_rest = activity_without(min_contrib, np.isinf(min_contrib))
+        max_rest = activity_without(max_contrib, np.isinf(max_contrib))
+        # nan: the rest of the row is unbounded, no bound is implied
+        with np.errstate(invalid='ignore'):
+            term_lower = np.nan_to_num(model.row_lower[rows] - max_rest,
+                                       nan=-INF)
+            term_upper = np.nan_to_num(model.row_upper[rows] - min_rest,
+                                       nan=INF)
+            implied_lower = np.where(positive, term_lower, term_upper) / vals
+            implied_upper = np.where(positive, term_upper, term_lower) / vals
+
+        new_lower = lower.copy()
+        new_upper = upper.copy()
+        np.maximum.at(new_lower, cols, np.nan_to_num(implied_lower, nan=-INF))
+        np.minimum.at(new_upper, cols, np.nan_to_num(implied_upper, nan=INF))
+        integer = model.col_integer
+        new_lower[integer] = np.ceil(new_lower[integer] - tol)
+        new_upper[integer] = np.floor(new_upper[integer] + tol)
+
+        improved_lower = new_lower > lower + step(lower)
+        improved_upper = new_upper < upper - step(upper)
+        lower[improved_lower] = new_lower[improved_lower]
+        upper[improved_upper] = new_upper[improved_upper]
+
+        infeasible = lower > upper + tol
+        if infeasible.any():
+            raise ValueError("The problem is infeasible (bounds of %s)." %
+                             model.col_names[infeasible.nonzero()[0][0]])
+        upper = np.maximum(upper, lower)
+        if not (improved_lower.any() or improved_upper.any()):
+            break
+
+    return lower, upper
+
+
+def create_minflux_matrix_model(database,
+                                specific_bounds,
+                                objective='MinFlux',
+                                zlb=None,
+                                add_loopless_constraints=True,
+                                custom_flux_constraints=None,
+                                M=1000,
+                                integer_flux=True,
+                                flux_bounds=None,
+                                indicator_constraints=False):
+    """Create the minFlux/minRxn problem of OptStoic as a MatrixModel.
+
+    The problem is identical to the one created by
+    OptStoic.create_minflux_problem (same variable names, constraint names,
+    bounds and coefficients), but the constraint matrix is assembled from
+    the sparse S matrix of the database as COO blocks. The only difference
+    is that a variable that does not appear in any constraint or in the
+    objective is still a column of the model (PuLP drops it).
+
+    Args:
+        database (:obj:`Database`): An optStoic Database object
+        specific_bounds (dict): LB and UB for exchange reactions,
+            e.g. {'EX_glc': {'LB': -1, 'UB': -1}}
+        objective (str, optional): 'MinFlux' or 'MinRxn'
+        zlb (float, optional): If provided, fix the MinFlux objective value
+        add_loopless_constraints (bool, optional): If True, add the loopless
+            constraints
+        custom_flux_constraints (list, optional): The custom constraints
+            (see OptStoic)
+        M (int, optional): The maximum flux bound (default 1000)
+        integer_flux (bool, optional): If True, v, vf and vb are integer
+            variables
+        flux_bounds (dict, optional): Flux ranges {reaction: (LB, UB)}
+            (see OptStoic). They tighten the bounds of v(j), vf(j) and vb(j)
+            and are the big-M coefficients of the constraints on v(j), vf(j)
+            and vb(j), instead of M.
+        indicator_constraints (bool, optional): If True, the big-M
+            constraints (cons2, cons4 and the loopless constraints) are
+            indicator constraints, e.g. yf(j) = 0 -> vf(j) <= 0 (only
+            supported in LP files for gurobi_cl, see LPWriter)
+
+    Returns:
+        MatrixModel
+    """
+    if objective not in ['MinFlux', 'MinRxn']:
+        raise ValueError("The objective for OptStoic is "
+                         "not correctly defined. "
+                         "Please use either 'MinFlux' or 'MinRxn'.")
+
+    reactions = list(database.reactions)
+    n = len(reactions)
+    rxn_pos = dict((j, k) for k, j in enumerate(reactions))
+    rxn_names = [lp_name(j) for j in reactions]
+    rxn_range = np.arange(n)
+
+    # Variables: one block of n columns per variable
+    blocks = ['v', 'vf', 'vb', 'yf', 'yb']
+    if add_loopless_constraints:
+        blocks += ['a', 'G']
+    offset = dict((b, ind * n) for ind, b in enumerate(blocks))
+    num_cols = len(blocks) * n
+
+    def cols(b, positions=rxn_range):
+        return offset[b] + np.asarray(positions, dtype=np.int64)
+
+    col_names = ['%s_%s' % (b, j) for b in blocks for j in rxn_names]
+    col_lower = np.zeros(num_cols)
+    col_upper = np.zeros(num_cols)
+    col_integer = np.zeros(num_cols, dtype=bool)
+    bound_of = dict(v=(-M, M), vf=(0, M), vb=(0, M), yf=(0, 1), yb=(0, 1),
+                    a=(0, 1), G=(-M, M))
+    is_integer = dict(v=integer_flux, vf=integer_flux, vb=integer_flux,
+                      yf=True, yb=True, a=True, G=False)
+    for b in blocks:
+        col_lower[cols(b)] = bound_of[b][0]
+        col_upper[cols(b)] = bound_of[b][1]
+        col_integer[cols(b)] = is_integer[b]
+
+    # Update lower and upper bound based on reaction directionality
+    rxntype = np.array([database.rxntype.get(j, -1) for j in reactions],
+                       dtype=np.int8)
+    excluded_set = set(database.all_excluded_reactions or [])
+    excluded = np.array([j in excluded_set for j in reactions], dtype=bool)
+
+    forward = ((rxntype == 0) & ~excluded).nonzero()[0]
+    col_lower[cols('v', forward)] = 0
+    col_upper[cols('yb', forward)] = 0
+    col_upper[cols('vb', forward)] = 0
+
+    backward = ((rxntype == 2) & ~excluded).nonzero()[0]
+    col_upper[cols('v', backward)] = 0
+    col_upper[cols('vf', backward)] = 0
+    col_upper[cols('yf', backward)] = 0
+
+    fixed = ((rxntype == 4) & ~excluded).nonzero()[0]
+    col_lower[cols('v', fixed)] = 0
+    col_upper[cols('v', fixed)] = 0
+
+    excluded = excluded.nonzero()[0]
+    for b in ['v', 'vf', 'yf', 'yb']:
+        col_lower[cols(b, excluded)] = 0
+        col_upper[cols(b, excluded)] = 0
+
+    # Fix stoichiometry of source/sink metabolites
+    for rxn, bounds in specific_bounds.items():
+        col_lower[offset['v'] + rxn_pos[rxn]] = bounds['LB']
+        col_upper[offset['v'] + rxn_pos[rxn]] = bounds['UB']
+
+    # Big-M of the forward (vf) and backward (vb) fluxes
+    Mf = Mb = M
+    # Lumped reactions of a reduced database are bounded by their reactions
+    flux_bounds = database.get_flux_bounds(M, flux_bounds)
+    if flux_bounds is not None:
+        v_lower, v_upper = apply_flux_bounds(
+            reactions, col_lower[cols('v')], col_upper[cols('v')],
+            flux_bounds, specific_bounds)
+        col_lower[cols('v')] = v_lower
+        col_upper[cols('v')] = v_upper
+        Mf = np.maximum(v_upper, 0)
+        Mb = np.maximum(-v_lower, 0)
+        col_upper[cols('vf')] = np.minimum(col_upper[cols('vf')], Mf)
+        col_upper[cols('vb')] = np.minimum(col_upper[cols('vb')], Mb)
+
+    if objective == 'MinFlux':
+        for rxn, values in fixed_flux_variables(specific_bounds).items():
+            for b, value in values.items():
+                col_lower[offset[b] + rxn_pos[rxn]] = value
+                col_upper[offset[b] + rxn_pos[rxn]] = value
+    indicators = []
+
+    # Objective (lumped reactions of a reduced database are weighted)
+    active = (rxntype != 4).nonzero()[0]
+    weights = database.get_objective_weights(objective)
+    active_weights = np.array([weights.get(reactions[k], 1.0) for k in active])
+    col_cost = np.zeros(num_cols)
+    if objective == 'MinRxn':
+        objective_cols = np.concatenate([cols('yf', active),
+                                         cols('yb', active)])
+    else:
+        objective_cols = np.concatenate([cols('vf', active),
+                                         cols('vb', active)])
+    objective_coeffs = np.concatenate([active_weights, active_weights])
+    col_cost[objective_cols] = objective_coeffs
+
+    row_blocks = []
+    if objective == 'MinFlux' and zlb is not None:
+        row_blocks.append(_block_rows(
+            [''], zlb, zlb, [(0, objective_cols, objective_coeffs)],
+            'zLowerBound'))
+
+    row_blocks.append(_mass_balance_rows(database, rxn_pos, offset['v']))
+
+    if objective == 'MinFlux':
+        # v(j) = vf(j) - vb(j)
+        row_blocks.append(_block_rows(
+            rxn_names, 0, 0,
+            [(rxn_range, cols('v'), 1),
+             (rxn_range, cols('vf'), -1),
+             (rxn_range, cols('vb'), 1)], 'flux_'))
+        # These constraints ensure that when yf=0 and yb=0,
+        # no flux goes through the reaction
+        for name, var, y, coeff, lower, upper in [
+                ('cons1_', 'vf', 'yf', -0.5, 0, INF),
+                ('cons2_', 'vf', 'yf', -Mf, -INF, 0),
+                ('cons3_', 'vb', 'yb', -0.5, 0, INF),
+                ('cons4_', 'vb', 'yb', -Mb, -INF, 0)]:
+            if indicator_constraints and name in ['cons2_', 'cons4_']:
+                # y(j) = 0 -> v(j) <= 0
+                indicators.extend(_indicators(
+                    rxn_names, cols(y), 0, cols(var), 1, -INF, 0, name))
+                continue
+            row_blocks.append(_block_rows(
+                rxn_names, lower, upper,
+                [(rxn_range, cols(var), 1),
+                 (rxn_range, cols(y), coeff)], name))
+        # Ensure that either yf or yb can be 1, not both
+        row_blocks.append(_block_rows(
+            rxn_names, -INF, 1,
+            [(rxn_range, cols('yf'), 1),
+             (rxn_range, cols('yb'), 1)], 'cons5_'))
+
+    if add_loopless_constraints:
+        loop_rows, loop_cols, loop_vals = [], [], []
+        for ind, l in enumerate(database.loops):
+            for j, coeff in database.Ninternal[l].items():
+                loop_rows.append(ind)
+                loop_cols.append(rxn_pos[j])
+                loop_vals.append(coeff)
+        row_blocks.append(_block_rows(
+            database.loops, 0, 0,
+            [(loop_rows, cols('G', loop_cols), loop_vals)],
+            'loopless_cons_'))
+
+        loop_rxn = sorted(set(database.internal_rxns) -
+                          set(database.blocked_rxns or []))
+        loop_pos = np.array([rxn_pos[j] for j in loop_rxn], dtype=np.int64)
+        loop_range = np.arange(len(loop_rxn))
+        loop_names = [lp_name(j) for j in loop_rxn]
+        if indicator_constraints:
+            # a(j) = 0 -> G(j) >= 1 and v(j) <= 0
+            # a(j) = 1 -> G(j) <= -1 and v(j) >= 0
+            for name, var, value, lower, upper in [
+                    ('llcons1_', 'G', 0, 1, INF),
+                    ('llcons2_', 'G', 1, -INF, -1),
+                    ('llcons3_', 'v', 1, 0, INF),
+                    ('llcons4_', 'v', 0, -INF, 0)]:
+                indicators.extend(_indicators(
+                    loop_names, cols('a', loop_pos), value,
+                    cols(var, loop_pos), 1, lower, upper, name))
+        else:
+            loop_Mf = Mf if np.isscalar(Mf) else Mf[loop_pos]
+            loop_Mb = Mb if np.isscalar(Mb) else Mb[loop_pos]
+            # G(j) >= -M * a(j) + (1 - a(j))
+            # G(j) <= -a(j) + M * (1 - a(j))
+            # v(j) >= -Mb(j) * (1 - a(j))
+            # v(j) <= Mf(j) * a(j)
+            for name, var, coeff, lower, upper in [
+                    ('llcons1_', 'G', M + 1, 1, INF),
+                    ('llcons2_', 'G', M + 1, -INF, M),
+                    ('llcons3_', 'v', -loop_Mb, -loop_Mb, INF),
+                    ('llcons4_', 'v', -loop_Mf, -INF, 0)]:
+                row_blocks.append(_block_rows(
+                    loop_names, lower, upper,
+                    [(loop_range, cols(var, loop_pos), 1),
+                     (loop_range, cols('a', loop_pos), coeff)], name))
+
+    if custom_flux_constraints is not None:
+        row_blocks.extend(_custom_flux_rows(
+            custom_flux_constraints, rxn_pos, offset['v']))
+
+    row_names, row_lower, row_upper, A = _stack_rows(row_blocks, num_cols)
+
+    return MatrixModel(col_names=col_names,
+                       col_lower=col_lower,
+                       col_upper=col_upper,
+                       col_cost=col_cost,
+                       col_integer=col_integer,
+                       row_names=row_names,
+                       row_lower=row_lower,
+                       row_upper=row_upper,
+                       A=A,
+                       sense=pulp.LpMinimize,
+                       name='OptStoic',
+                       objective_name=objective,
+                       indicators=indicators)
+
+
+def create_fva_matrix_model(database,
+                            specific_bounds,
+                            custom_flux_constraints=None,
+                            excluded_reactions=None,
+                            M=1000):
+    """Create the flux variability analysis LP of blocked_reactions_analysis
+    as a MatrixModel (without objective).
+
+        sum(j, S(i,j) * v(j)) = 0, for all i
+        custom_flux_constraints
+        LB(j) <= v(j) <= UB(j)
+
+    Args:
+        database (:obj:`BaseReactionDatabase`): The reaction database
+        specific_bounds (dict): LB and UB for exchange reactions,
+            e.g. {'EX_glc': {'LB': -1, 'UB': -1}}
+        custom_flux_constraints (list, optional): The custom constraints
+        excluded_reactions (list, optional): Reactions that are fixed to zero
+        M (int, optional): The maximum flux bound (default 1000)
+
+    Returns:
+        MatrixModel: The variables are the v_ columns, in the order of
+            database.reactions.
+
+    Raises:
+        ValueError: If the reaction type of a reaction is unknown
+    """
+    reactions = list(database.reactions)
+    n = len(reactions)
+    rxn_pos = dict((j, k) for k, j in enumerate(reactions))
+
+    rxntype = np.array([database.rxntype[j] for j in reactions], dtype=np.int8)
+    unknown = ~np.isin(rxntype, [0, 1, 2, 4])
+    if unknown.any():
+        raise ValueError("Reaction type for reaction %s is unknown." %
+                         reactions[unknown.nonzero()[0][0]])
+
+    col_lower = np.full(n, -float(M))
+    col_upper = np.full(n, float(M))
+    # Forward irreversible
+    col_lower[rxntype == 0] = 0
+    # Reverse irreversible
+    col_upper[rxntype == 2] = 0
+    col_lower[rxntype == 4] = 0
+    col_upper[rxntype == 4] = 0
+
+    if excluded_reactions is not None:
+        excluded = [rxn_pos[j] for j in excluded_reactions]
+        col_lower[excluded] = 0
+        col_upper[excluded] = 0
+
+    # Fix stoichiometry of source/sink metabolites
+    for j, bounds in specific_bounds.items():
+        col_lower[rxn_pos[j]] = bounds['LB']
+        col_upper[rxn_pos[j]] = bounds['UB']
+
+    row_blocks = [_mass_balance_rows(database, rxn_pos, 0)]
+    if custom_flux_constraints is not None:
+        row_blocks.extend(_custom_flux_rows(
+            custom_flux_constraints, rxn_pos, 0))
+
+    row_names, row_lower, row_upper, A = _stack_rows(row_blocks, n)
+
+    return MatrixModel(col_names=['v_%s' % lp_name(j) for j in reactions],
+                       col_lower=col_lower,
+                       col_upper=col_upper,
+                       col_cost=np.zeros(n),
+                       col_integer=np.zeros(n, dtype=bool),
+                       row_names=row_names,
+                       row_lower=row_lower,
+                       row_upper=row_upper,
+                       A=A,
+                       sense=pulp.LpMinimize,
+                       name='FVA',
+                       objective_name='FVA')
@@ -0,0 +1,343 @@
+"""
+Reduce the size of an OptStoic database before solving.
+
+reduce_database returns a smaller copy of a Database with the same
+pathways (after expansion):
+
+1. Reactions fixed to zero are removed: the excluded reactions and the
+   export reactions without specific bounds.
+2. Dead-end metabolites are removed repeatedly, with all the reactions
+   that involve them: metabolites involved in a single reaction, or that
+   can only be produced (or only consumed) given the directions of the
+   reactions.
+3. Fully coupled reactions are lumped: if a metabolite is involved in
+   exactly two reactions, the mass balance fixes the ratio of their fluxes.
+   Each group of coupled reactions (e.g. a linear chain) is replaced by one
+   lumped reaction 'LUMP_<first reaction>' with v(j) = coeff(j) * v(lump).
+   The coefficients are coprime integers, so the fluxes of the original
+   reactions are integers if and only if the flux of the lump is.
+
+Steps 2 and 3 are repeated until nothing changes. The reactions with
+specific bounds or custom flux constraints (and the metabolites they
+involve) are never touched.
+
+The reduced database stores the lumped reactions (lumped_reactions) so that
+OptStoic can weight them in the objective (see
+Database.get_objective_weights) and expand the pathways to the original
+reaction IDs (see Database.expand_fluxes). The loops (Ninternal) are
+recomputed exactly: the new loops span the combinations of the original
+loops that are zero on the removed reactions and consistent with the
+lumped reactions.
+
+Usage:
+    reduced_db = reduce_database(db, specific_bounds,
+                                 custom_flux_constraints=custom_flux_constraints)
+    model = OptStoic(database=reduced_db, ...)
+"""
+import copy
+from fractions import Fraction
+from functools import reduce
+from math import gcd
+import scipy.sparse
+from optstoicpy.script.utils import create_logger
+from optstoicpy.script.nullspace import (
+    MAX_DENOMINATOR,
+    rational_null_space)
+
+
+def _to_fraction(value):
+    return Fraction(value).limit_denominator(MAX_DENOMINATOR)
+
+
+def _coprime_integers(ratios):
+    """Scale {key: Fraction} to coprime integers, with a positive first
+    entry (in sorted order of the keys)."""
+    scale = reduce(lambda a, b: a * b // gcd(a, b),
+                   (r.denominator for r in ratios.values()), 1)
+    values = dict((k, int(r * scale)) for k, r in ratios.items())
+    divisor = reduce(gcd, values.values(), 0)
+    if values[min(values)] < 0:
+        divisor = -divisor
+    return dict((k, v // divisor) for k, v in values.items())
+
+
+class _ReductionState(object):
+    """The network being reduced, as dictionaries of Fractions."""
+
+    def __init__(self, database, protected_reactions):
+        self.Sji = dict(
+            (rxn, dict((met, _to_fraction(coeff))
+                       for met, coeff in database.Sji[rxn].items()))
+            for rxn in database.reactions)
+        # Allowed directions (forward, backward) of each reaction
+        self.directions = dict(
+            (rxn, (database.rxntype[rxn] != 2, database.rxntype[rxn] != 0))
+            for rxn in database.reactions)
+        self.members = dict((rxn, {rxn: Fraction(1)})
+                            for rxn in database.reactions)
+        self.protected_reactions = set(protected_reactions)
+        self.protected_metabolites = set(
+            met for rxn in protected_reactions if rxn in self.Sji
+            for met in self.Sji[rxn])
+        self.removed = set()
+
+    def remove(self, reactions):
+        for rxn in reactions:
+            del self.Sji[rxn]
+            del self.directions[rxn]
+            self.removed.update(self.members.pop(rxn))
+
+    def metabolite_reactions(self):
+        """Return {metabolite: [reactions]} of the unprotected metabolites."""
+        met_rxns = {}
+        for rxn in sorted(self.Sji):
+            for met in self.Sji[rxn]:
+                if met not in self.protected_metabolites:
+                    met_rxns.setdefault(met, []).append(rxn)
+        return met_rxns
+
+    def dead_end_reactions(self):
+        blocked = set()
+        for met, rxns in self.metabolite_reactions().items():
+            if len(rxns) == 1:
+                blocked.update(rxns)
+                continue
+            can_produce = can_consume = False
+            for rxn in rxns:
+                forward, backward = self.directions[rxn]
+                if self.Sji[rxn][met] > 0:
+                    can_produce |= forward
+                    can_consume |= backward
+                else:
+                    can_produce |= backward
+                    can_consume |= forward
+            if not (can_produce and can_consume):
+                blocked.update(rxns)
+        return blocked - self.protected_reactions
+
+    def coupled_groups(self):
+        """Return the groups of coupled reactions as {reaction: flux ratio
+        to the first reaction of the group}, or None if the ratios are
+        inconsistent (then the fluxes of the group are zero)."""
+        edges = {}
+        for met, rxns in self.metabolite_reactions().items():
+            if len(rxns) != 2 or self.protected_reactions & set(rxns):
+                continue
+            j1, j2 = rxns
+            # S(i,j1) * v(j1) + S(i,j2) * v(j2) = 0
+            ratio = -self.Sji[j1][met] / self.Sji[j2][met]
+            edges.setdefault(j1, []).append((j2, ratio))
+            edges.setdefault(j2, []).append((j1, 1 / ratio))
+
+        groups = []
+        visited = set()
+        for root in sorted(edges):
+            if root in visited:
+                continue
+            group = {root: Fraction(1)}
+            consistent = True
+            stack = [root]
+            while stack:
+                j1 = stack.pop()
+                for j2, ratio in edges[j1]:
+                    if j2 not in group:
+                        group[j2] = group[j1] * ratio
+                        stack.append(j2)
+                    elif group[j2] != group[j1] * ratio:
+                        consistent = False
+            visited.update(group)
+            groups.append(group if consistent else dict.fromkeys(group))
+        return groups
+
+    def lump(self, group):
+        """Replace a group of coupled reactions by a lumped reaction.
+
+        Returns:
+            bool: False if the group cannot carry flux (it is removed).
+        """
+        coeffs = _coprime_integers(group)
+        forward = all(self.directions[rxn][0 if c > 0 else 1]
+                      for rxn, c in coeffs.items())
+        backward = all(self.directions[rxn][1 if c > 0 else 0]
+                       for rxn, c in coeffs.items())
+        if not (forward or backward):
+            self.remove(group)
+            return False
+
+        stoichiometry = {}
+        members = {}
+        for rxn, c in coeffs.items():
+            for met, coeff in self.Sji[rxn].items():
+                stoichiometry[met] = stoichiometry.get(met, 0) + c * coeff
+            for member, coeff in self.members[rxn].items():
+                members[member] = members.get(member, 0) + c * coeff
+
+        name = 'LUMP_%s' % min(members)
+        for rxn in coeffs:
+            del self.Sji[rxn]
+            del self.directions[rxn]
+            del self.members[rxn]
+        self.Sji[name] = dict((met, coeff) for met, coeff
+                              in stoichiometry.items() if coeff != 0)
+        self.directions[name] = (forward, backward)
+        self.members[name] = members
+        return True
+
+
+def _reduced_loops(database, state):
+    """Return (Ninternal, loops) of the reduced network.
+
+    The loops of the reduced network are the combinations
+    u = sum(l, lambda(l) * Nint(l,:)) of the original loops such that
+    u(j) = 0 for the removed reactions and u(j) / coeff(j) is the same for all
+    the reactions j of a lumped reaction (u(lump) is that value).
+    """
+    loops = list(database.loops)
+    loop_index = dict((l, ind) for ind, l in enumerate(loops))
+    columns = {}
+    for l in loops:
+        for rxn, coeff in database.Ninternal[l].items():
+            columns.setdefault(rxn, {})[loop_index[l]] = _to_fraction(coeff)
+
+    # Each constraint is a dict {loop index: coefficient} (= 0)
+    constraints = [columns[rxn] for rxn in state.removed if rxn in columns]
+    lumped = dict((rxn, members) for rxn, members in state.members.items()
+                  if rxn not in database.Sji)
+    for members in lumped.values():
+        if not set(members) & set(columns):
+            continue
+        ref = min(members)
+        for member in members:
+            if member == ref:
+                continue
+            row = {}
+            for rxn, sign in [(member, 1), (ref, -1)]:
+                for ind, coeff in columns.get(rxn, {}).items():
+                    row[ind] = (row.get(ind, 0) +
+                                sign * coeff / members[rxn])
+            constraints.append(row)
+
+    rows, cols, vals = [], [], []
+    for ind, row in enumerate(constraints):
+        for col, value in row.items():
+            if value != 0:
+                rows.append(ind)
+                cols.append(col)
+                vals.append(float(value))
+    C = scipy.sparse.csr_matrix((vals, (rows, cols)),
+                                shape=(len(constraints), len(loops)))
+
+    Ninternal = {}
+    new_loops = []
+    for vector in rational_null_space(C):
+        u = {}
+        for ind, lam in vector.items():
+            for rxn, coeff in database.Ninternal[loops[ind]].items():
+                u[rxn] = u.get(rxn, 0) + lam * columns[rxn][ind]
+        loop = {}
+        for rxn, members in state.members.items():
+            ref = min(members)
+            if u.get(ref, 0) != 0:
+                loop[rxn] = float(u[ref] / members[ref])
+        if len(loop) > 1:
+            # The free column of a basis vector of the reduced row echelon
+            # form is its largest index
+            name = loops[max(vector)]
+            Ninternal[name] = loop
+            new_loops.append(name)
+    return Ninternal, new_loops
+
+
+def reduce_database(database,
+                    specific_bounds,
+                    custom_flux_constraints=None,
+                    protected_reactions=None,
+                    lump_reactions=True,
+                    logger=None):
+    """Return a reduced copy of the database (see the module docstring).
+
+    Args:
+        database (:obj:`Database`): The database
+        specific_bounds (dict): LB and UB for exchange reactions which defined the
+            overall design equations. E.g. {'Ex_glc': {'LB': -1, 'UB':-1}}
+        custom_flux_constraints (list, optional): The custom constraints
+            (see OptStoic). Their reactions (and the reactions in
+            specific_bounds) are not removed or lumped.
+        protected_reactions (list, optional): Other reactions that must not be
+            removed or lumped.
+        lump_reactions (bool, optional): If True, lump the coupled reactions.
+        logger (:obj:`logging.logger`, optional): The logging instance
+
+    Returns:
+        :obj:`Database`: The reduced database
+    """
+    if logger is None:
+        logger = create_logger(
+            name="optstoicpy.script.model_reduction.reduce_database")
+
+    protected = set(protected_reactions or []) | set(specific_bounds)
+    for group in custom_flux_constraints or []:
+        protected.update(group['reactions'])
+
+    state = _ReductionState(database, protected)
+
+    # Reactions fixed to zero
+    fixed = set(database.all_excluded_reactions or [])
+    fixed.update(rxn for rxn in database.reactions
+                 if database.rxntype[rxn] == 4)
+    state.remove((fixed & set(state.Sji)) - protected)
+
+    while True:
+        blocked = state.dead_end_reactions()
+        if blocked:
+            state.remove(blocked)
+            continue
+        if not lump_reactions:
+            break
+        groups = state.coupled_groups()
+        if not groups:
+            break
+        for group in groups:
+            if None in group.values():
+                state.remove(group)
+            else:
+                state.lump(group)
+
+    lumped = dict((rxn, members) for rxn, members in state.members.items()
+                  if rxn not in database.Sji)
+    Ninternal, loops = _reduced_loops(database, state)
+
+    reduced = copy.deepcopy(database)
+    with reduced.batch():
+        for rxn in database.reactions:
+            if rxn not in state.Sji:
+                reduced.remove_reaction(rxn)
+        extension = {}
+        for rxn in lumped:
+            for met, coeff in state.Sji[rxn].items():
+                extension.setdefault(met, {})[rxn] = float(coeff)
+        reduced.update_S(extension)
+        for rxn in lumped:
+            forward, backward = state.directions[rxn]
+            reduced.rxntype[rxn] = 1 if forward and backward else (
+                0 if forward else 2)
+            reduced.internal_rxns.append(rxn)
+
+    reduced.lumped_reactions = dict(
+        (rxn, dict((member, float(coeff))
+                   for member, coeff in sorted(members.items())))
+        for rxn, members in lumped.items())
+    reduced.Ninternal = Ninternal
+    reduced.loops = loops
+    reduced.blocked_rxns = [rxn for rxn in database.blocked_rxns or []
+                            if rxn in state.Sji]
+    reduced.all_excluded_reactions = [
+        rxn for rxn in database.all_excluded_reactions or []
+        if rxn in state.Sji]
+
+    logger.info("Database reduced from %d to %d reactions (%d removed, "
+                "%d lumped reactions) and from %d to %d loops.",
+                len(database.reactions), len(reduced.reactions),
+                len(state.removed), len(lumped),
+                len(database.loops), len(loops))
+    return reduced
@@ -0,0 +1,238 @@
+"""
+Exact rational basis of the null space of a sparse matrix.
+
+This is the Python equivalent of the MATLAB function null(A, 'r'): the
+reduced row echelon form (RREF) of A is computed with exact integer
+arithmetic, and each free column f gives one basis vector x with x(f) = 1,
+x(p) = -R(i, f) / R(i, p) for the pivot column p of each row i, and 0
+elsewhere. The RREF is unique, so the basis is the same as the one given
+by MATLAB (up to its floating point tolerance).
+
+The elimination is fraction-free: each row is stored as a sparse dict of
+integers {column: value} and divided by the gcd of its entries after each
+update, so the entries stay small. Stoichiometric matrices are very sparse
+and most pivot columns only appear in a few rows, so the elimination only
+touches a small part of the matrix.
+
+The null space of a block diagonal matrix is the union of the null spaces
+of its blocks. rational_null_space splits the bipartite graph of rows and
+columns of A into connected components and computes the null space of each
+component independently (optionally in a process pool). The RREF of A
+restricted to the columns of a component is the RREF of the component, so
+the basis is the same as without the decomposition.
+
+Usage:
+    basis = rational_null_space(S)  # S is a scipy.sparse matrix
+    # basis = [{column: Fraction}, ...], one dict per free column
+"""
+from fractions import Fraction
+from functools import reduce
+from math import gcd
+import multiprocessing
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+# Maximum denominator used to convert float coefficients to fractions
+MAX_DENOMINATOR = 10**6
+
+
+def _lcm(a, b):
+    return a * b // gcd(a, b)
+
+
+def _integer_row(row):
+    """Scale a row of Fractions to coprime integers."""
+    scale = reduce(_lcm, (value.denominator for value in row.values()), 1)
+    row = dict((col, int(value * scale)) for col, value in row.items())
+    return _normalize(row)
+
+
+def _normalize(row):
+    divisor = reduce(gcd, row.values(), 0)
+    if divisor > 1:
+        row = dict((col, value // divisor) for col, value in row.items())
+    return row
+
+
+def _sparse_rows(A):
+    """Return the rows of A as dicts of integers {column: value}."""
+    A = scipy.sparse.csr_matrix(A)
+    rows = []
+    for ind in range(A.shape[0]):
+        start, end = A.indptr[ind], A.indptr[ind + 1]
+        row = dict(
+            (int(col), Fraction(float(value)).limit_denominator(MAX_DENOMINATOR))
+            for col, value in zip(A.indices[start:end], A.data[start:end])
+            if value != 0)
+        if row:
+            rows.append(_integer_row(row))
+    return rows
+
+
+def sparse_rref(A):
+    """Return the reduced row echelon form of A.
+
+    Args:
+        A (scipy.sparse matrix or numpy.ndarray): The matrix
+
+    Returns:
+        tuple: (rows, pivots) where rows[k] is the k-th nonzero row of the
+            RREF as a dict of integers {column: value} (scaled by the
+            positive integer rows[k][pivots[k]]) and pivots[k] is its pivot
+            column. The pivots are in increasing order.
+    """
+    rows = _sparse_rows(A)
+
+    # col_rows[c] is the set of rows with a nonzero entry in column c
+    col_rows = {}
+    for ind, row in enumerate(rows):
+        for col in row:
+            col_rows.setdefault(col, set()).add(ind)
+
+    pivot_row_of_col = {}
+    is_pivot_row = [False] * len(rows)
+
+    for col in sorted(col_rows):
+        candidates = [ind for ind in col_rows[col] if not is_pivot_row[ind]]
+        if not candidates:
+            continue
+        # Choose the sparsest row to limit the fill-in
+        pivot = min(candidates, key=lambda ind: (len(rows[ind]), ind))
+        pivot_row = rows[pivot]
+        if pivot_row[col] < 0:
+            pivot_row = dict((c, -v) for c, v in pivot_row.items())
+            rows[pivot] = pivot_row
+        is_pivot_row[pivot] = True
+        pivot_row_of_col[col] = pivot
+        p = pivot_row[col]
+
+        # Eliminate col from all the other rows (including the pivot rows
+        # found before, to obtain the reduced form)
+        for ind in list(col_rows[col]):
+            if ind == pivot:
+                continue
+            row = rows[ind]
+            a = row[col]
+            g = gcd(p, a)
+            row_scale, pivot_scale = p // g, a // g
+            new_row = {}
+            for c, v in row.items():
+                new_row[c] = v * row_scale
+            for c, v in pivot_row.items():
+                value = new_row.get(c, 0) - v * pivot_scale
+                if value == 0:
+                    new_row.pop(c, None)
+                else:
+                    new_row[c] = value
+            # row_scale > 0, so the pivot of a pivot row stays positive
+            new_row = _normalize(new_row)
+
+            for c in set(row) - set(new_row):
+                col_rows[c].discard(ind)
+            for c in set(new_row) - set(row):
+                col_rows.setdefault(c, set()).add(ind)
+            rows[ind] = new_row
+
+    pivots = sorted(pivot_row_of_col)
+    return [rows[pivot_row_of_col[col]] for col in pivots], pivots
+
+
+def connected_components(A):
+    """Split the rows and columns of A into connected components (two
+    columns are connected if they have a nonzero entry in the same row).
+
+    Args:
+        A (scipy.sparse matrix or numpy.ndarray): The matrix
+
+    Returns:
+        list: (rows, cols) arrays of the row and column indices of each
+            component, in increasing order of the first column. A column
+            of zeros is a component without rows.
+    """
+    A = scipy.sparse.csr_matrix(A)
+    A.eliminate_zeros()
+    num_rows, num_cols = A.shape
+    # Bipartite graph: nodes 0..num_cols-1 are the columns, the next ones
+    # are the rows
+    pattern = scipy.sparse.csr_matrix(
+        (np.ones(A.nnz), A.indices, A.indptr), shape=A.shape)
+    graph = scipy.sparse.bmat([[None, pattern.T], [pattern, None]])
+    _, labels = scipy.sparse.csgraph.connected_components(graph,
+                                                          directed=False)
+    col_labels, row_labels = labels[:num_cols], labels[num_cols:]
+
+    components = []
+    # np.unique returns the labels by increasing first column
+    _, first_cols = np.unique(col_labels, return_index=True)
+    for col in sorted(first_cols):
+        label = col_labels[col]
+        components.append((np.nonzero(row_labels == label)[0],
+                           np.nonzero(col_labels == label)[0]))
+    return components
+
+
+def _null_space_by_free_column(A):
+    """Return {free column: basis vector {column: Fraction}}."""
+    num_cols = A.shape[1]
+    rows, pivots = sparse_rref(A)
+    pivot_set = set(pivots)
+
+    basis = dict((col, {col: Fraction(1)})
+                 for col in range(num_cols) if col not in pivot_set)
+    for row, pivot in zip(rows, pivots):
+        p = row[pivot]
+        for col, value in row.items():
+            if col != pivot:
+                basis[col][pivot] = Fraction(-value, p)
+    return basis
+
+
+def _component_null_space(args):
+    """Return the null space of a component with the column indices of A."""
+    submatrix, cols = args
+    basis = _null_space_by_free_column(submatrix)
+    return dict((cols[free_col], dict((cols[col], value)
+                                      for col, value in vector.items()))
+                for free_col, vector in basis.items())
+
+
+def rational_null_space(A, processes=1, logger=None):
+    """Return the rational basis of the null space of A (null(A, 'r') in
+    MATLAB).
+
+    Args:
+        A (scipy.sparse matrix or numpy.ndarray): The matrix
+        processes (int, optional): Number of worker processes used to
+            compute the null spaces of the connected components.
+        logger (:obj:`logging.logger`, optional): The logging instance
+
+    Returns:
+        list: One dict {column: Fraction} per free column of A (in increasing
+            order of the free column), with the value 1 at the free column.
+    """
+    A = scipy.sparse.csr_matrix(A)
+    components = connected_components(A)
+    if logger is not None:
+        logger.info("%d connected components (largest: %d columns).",
+                    len(components),
+                    max([len(cols) for _, cols in components] + [0]))
+
+    # Largest components first, to balance the load between the processes
+    components.sort(key=lambda component: -len(component[1]))
+    tasks = ((A[rows][:, cols], [int(col) for col in cols])
+             for rows, cols in components)
+
+    basis = {}
+    if processes > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            for res in pool.imap_unordered(_component_null_space, tasks):
+                basis.update(res)
+        finally:
+            pool.terminate()
+    else:
+        for task in tasks:
+            basis.update(_component_null_space(task))
+
+    return [basis[col] for col in sorted(basis)]
@@ -24,6 +24,9 @@ import os
 import time
 import sys
 import copy
+import asyncio
+import functools
+from contextlib import contextmanager
 import random
 import string  # to generate random hex code
 import json
@@ -33,7 +36,28 @@ import pulp
 from optstoicpy.core.database import load_db_v3
 from optstoicpy.core.pathway import Pathway
 from optstoicpy.script.utils import create_logger
-from optstoicpy.script.solver import load_pulp_solver
+from optstoicpy.script.solver import (
+    is_command_line_solver,
+    load_pulp_solver,
+    solver_scratch_directory,
+    solver_warm_start,
+    supports_solution_pool,
+    solve_with_solution_pool)
+from optstoicpy.script.solver_backend import (
+    BaseSolverBackend,
+    load_solver_backend)
+from optstoicpy.script.lp_writer import LPWriter
+from optstoicpy.script.scratch import ScratchDirectory
+from optstoicpy.script.pathway_store import PathwayStore
+from optstoicpy.script.loopless import LoopDetector
+from optstoicpy.script.async_solver import solve_with_gurobi_cl_async
+from optstoicpy.script.matrix_model import (
+    INF,
+    MatrixModel,
+    apply_flux_bounds,
+    create_minflux_matrix_model,
+    fixed_flux_variables,
+    lp_name)
 from .gurobi_command_line_solver import *
 
 # Global variables/solver options
@@ -58,6 +82,12 @@ class OptStoic(object):
                  pulp_solver=None,
                  result_filepath=None,
                  M=1000,
+                 lazy_loopless=False,
+                 scratch_root=None,
+                 use_shm=False,
+                 flux_bounds=None,
+                 indicator_constraints=False,
+                 pathway_store=None,
                  logger=None):
         """
         Args:
@@ -79,6 +109,32 @@ class OptStoic(object):
                 solver)
             result_filepath (str, optional): Filepath for result
             M (int, optional): The maximum flux bound (default 1000)
+            lazy_loopless (bool, optional): If True (and add_loopless_constraints
+                is True), the loopless constraints are not added to the problem.
+                Instead, each solution is checked for infeasible cycles (see
+                LoopDetector), which are cut off with a no-good cut before the
+                problem is solved again. Only MinFlux is supported.
+            scratch_root (str, optional): The directory where a scratch
+                directory is created for the files of each solve (LP,
+                solution, log and parameter files of the command line
+                solvers). Default to the temporary directory of the system.
+            use_shm (bool, optional): If True (and scratch_root is None),
+                create the scratch directories in /dev/shm
+            flux_bounds (dict, optional): Flux ranges {reaction: (LB, UB)},
+                e.g. from the FVA of blocked_reactions_analysis (see
+                flux_bounds_from_fva) or from bound_tightening_analysis. They
+                tighten the bounds of v(j), vf(j) and vb(j) and replace M as
+                the big-M coefficient of each reaction (a smaller big-M gives
+                a tighter LP relaxation). They must be valid for the problem
+                (i.e. computed with the same or looser constraints).
+            indicator_constraints (bool, optional): If True, the big-M
+                constraints are written as indicator constraints with the
+                solvers that support them (gurobi_cl). The other solvers use
+                the big-M constraints.
+            pathway_store (str or :obj:`PathwayStore`, optional): A pathway
+                store (or the path of its SQLite file). Each pathway is
+                appended to it as soon as it is found (one run per solve),
+                instead of rewriting all the pathways to temp_pathways.json.
             logger (:obj:`logging.Logger`, optional): A logging.Logger object
 
         Raises:
@@ -98,6 +154,11 @@ class OptStoic(object):
         self.add_loopless_constraints = add_loopless_constraints
         self.custom_flux_constraints = custom_flux_constraints
         self.M = M
+        self.flux_bounds = flux_bounds
+        self.indicator_constraints = indicator_constraints
+        self.lazy_loopless = lazy_loopless
+        self.loop_detector = None
+        self.num_loop_cuts = 0
 
         self._varCat = 'Integer'
         # self._varCat = 'Continuous'
@@ -121,6 +182,16 @@ class OptStoic(object):
         self.pulp_solver = pulp_solver
         self.lp_prob_fname = "OptStoic_{0}".format(
             self.generate_random_string(6))
+        self.scratch_root = scratch_root
+        self.use_shm = use_shm
+        self.scratch = None
+        # The values {variable name: value} of the last optimal solution
+        self.last_solution = None
+        if isinstance(pathway_store, str):
+            pathway_store = PathwayStore(pathway_store)
+        self.pathway_store = pathway_store
+        # The run of the current solve in the pathway store
+        self.store_run_id = None
 
     @staticmethod
     def generate_random_string(N):
@@ -139,6 +210,12 @@ class OptStoic(object):
                              "Please use either 'MinFlux' or 'MinRxn'.")
         self.objective = new_objective
 
+    @property
+    def formulate_loopless_constraints(self):
+        """True if the loopless constraints are part of the problem
+        (i.e. not generated lazily)."""
+        return self.add_loopless_constraints and not self.lazy_loopless
+
     def change_zlb(self, zlb):
         self.zlb = zlb
 
@@ -151,20 +228,27 @@ class OptStoic(object):
             v(j) = vf(j) - vb(j)
             sum(j, S(i,j) * v(j)) = 0, for all i
             vf(j) >= yf(j) * eps, for all j
-            vf(j) <= yf(j) * M, for all j
+            vf(j) <= yf(j) * Mf(j), for all j
             vb(j) >= yb(j) * eps, for all j
-            vb(j) <= yb(j) * M, for all j
+            vb(j) <= yb(j) * Mb(j), for all j
             yf(j) + yb(j) <= 1, for all j
 
             for reaction in jloop (not in jblock)
             sum(j, Nint(l,j) * G(j)) = 0, for all l
             G(j) >= -M * a(j) + (1 - a(j))
             G(j) <= -a(j) + M * (1 - a(j))
-            v(j) >= -M * (1 - a(j))
-            v(j) <= M * a(j)
+            v(j) >= -Mb(j) * (1 - a(j))
+            v(j) <= Mf(j) * a(j)
 
+        where Mf(j) = max(UB(j), 0) and Mb(j) = max(-LB(j), 0) if flux_bounds
+        is provided (or j is a lumped reaction, see Database.get_flux_bounds),
+        M otherwise. vf, vb, yf and yb are fixed for the reactions with
+        LB == UB in specific_bounds (see fixed_flux_variables).
         """
         self.logger.info("Formulating problem...")
+        if self.indicator_constraints:
+            self.logger.warning("PuLP does not support indicator constraints."
+                                " The big-M constraints are used.")
         # Scalar
         M = self.M
 
@@ -180,7 +264,7 @@ class OptStoic(object):
         yb = pulp.LpVariable.dicts("yb", self.database.reactions,
                                    lowBound=0, upBound=1, cat='Binary')
 
-        if self.add_loopless_constraints:
+        if self.formulate_loopless_constraints:
             a = pulp.LpVariable.dicts("a", self.database.reactions,
                                       lowBound=0, upBound=1, cat='Binary')
             G = pulp.LpVariable.dicts("G", self.database.reactions,
@@ -233,6 +317,37 @@ class OptStoic(object):
             v[rxn].lowBound = bounds['LB']
             v[rxn].upBound = bounds['UB']
 
+        # Big-M of the forward (vf) and backward (vb) fluxes
+        Mf = dict.fromkeys(self.database.reactions, M)
+        Mb = dict.fromkeys(self.database.reactions, M)
+        # Lumped reactions of a reduced database are bounded by their
+        # reactions
+        flux_bounds = self.database.get_flux_bounds(M, self.flux_bounds)
+        if flux_bounds is not None:
+            reactions = list(self.database.reactions)
+            lower, upper = apply_flux_bounds(
+                reactions,
+                [v[j].lowBound for j in reactions],
+                [v[j].upBound for j in reactions],
+                flux_bounds, self.specific_bounds)
+            for j, lb, ub in zip(reactions, lower, upper):
+                v[j].lowBound = float(lb)
+                v[j].upBound = float(ub)
+                Mf[j] = max(float(ub), 0)
+                Mb[j] = max(-float(lb), 0)
+                vf[j].upBound = min(vf[j].upBound, Mf[j])
+                vb[j].upBound = min(vb[j].upBound, Mb[j])
+
+        if self.objective == 'MinFlux':
+            for j, values in fixed_flux_variables(
+                    self.specific_bounds).items():
+                for var, value in [(vf[j], values['vf']),
+                                   (vb[j], values['vb']),
+                                   (yf[j], values['yf']),
+                                   (yb[j], values['yb'])]:
+                    var.lowBound = value
+                    var.upBound = value
+
         LB = {}
         UB = {}
 
@@ -242,16 +357,19 @@ class OptStoic(object):
 
         lp_prob = pulp.LpProblem("OptStoic", pulp.LpMinimize)
 
+        # Weights of the lumped reactions of a reduced database
+        weights = self.database.get_objective_weights(self.objective)
+
         # Min-Rxn objective
         if self.objective == 'MinRxn':
-            condition = pulp.lpSum([yf[j] + yb[j]
+            condition = pulp.lpSum([weights.get(j, 1) * (yf[j] + yb[j])
                                     for j in self.database.reactions
                                     if self.database.rxntype[j] != 4])
             lp_prob += condition, "MinRxn"
 
         # Min-Flux objective
         elif self.objective == 'MinFlux':
-            condition = pulp.lpSum([vf[j] + vb[j]
+            condition = pulp.lpSum([weights.get(j, 1) * (vf[j] + vb[j])
                                     for j in self.database.reactions
                                     if self.database.rxntype[j] != 4])
             lp_prob += condition, "MinFlux"
@@ -267,8 +385,8 @@ class OptStoic(object):
             if i not in self.database.S:
                 continue
             label = "mass_balance_%s" % i
-            dot_S_v = pulp.lpSum([self.database.S[i][j] * v[j]
-                                  for j in list(self.database.S[i].keys())])
+            dot_S_v = pulp.lpSum([coeff * v[j]
+                                  for j, coeff in self.database.S[i].items()])
             condition = dot_S_v == 0
             lp_prob += condition, label
 
@@ -285,13 +403,13 @@ class OptStoic(object):
                 # These constraints ensure that when yf=0 and yb=0 ,
                 # no flux goes through the reaction
                 lp_prob += vf[j] >= yf[j] * 0.5, "cons1_%s" % j
-                lp_prob += vf[j] <= yf[j] * M, "cons2_%s" % j
+                lp_prob += vf[j] <= yf[j] * Mf[j], "cons2_%s" % j
                 lp_prob += vb[j] >= yb[j] * 0.5, "cons3_%s" % j
-                lp_prob += vb[j] <= yb[j] * M, "cons4_%s" % j
+                lp_prob += vb[j] <= yb[j] * Mb[j], "cons4_%s" % j
                 # Ensure that either yf or yb can be 1, not both
                 lp_prob += yf[j] + yb[j] <= 1, 'cons5_%s' % j
 
-        if self.add_loopless_constraints:
+        if self.formulate_loopless_constraints:
             self.logger.info("Loopless constraints are turned on.")
 
             loop_rxn = list(set(self.database.internal_rxns) -
@@ -308,8 +426,8 @@ class OptStoic(object):
             for j in loop_rxn:
                 lp_prob += G[j] >= -M * a[j] + (1 - a[j]), "llcons1_%s" % j
                 lp_prob += G[j] <= -a[j] + M * (1 - a[j]), "llcons2_%s" % j
-                lp_prob += v[j] >= -M * (1 - a[j]), "llcons3_%s" % j
-                lp_prob += v[j] <= M * a[j], "llcons4_%s" % j
+                lp_prob += v[j] >= -Mb[j] * (1 - a[j]), "llcons3_%s" % j
+                lp_prob += v[j] <= Mf[j] * a[j], "llcons4_%s" % j
 
         # Fix nad(p)h production and consumption
         if self.custom_flux_constraints is not None:
@@ -323,11 +441,130 @@ class OptStoic(object):
 
         return lp_prob, v, vf, vb, yf, yb, a, G
 
+    def create_minflux_matrix_model(self, indicator_constraints=False):
+        """
+        Create the same minflux/minRxn problem as create_minflux_problem,
+        but as a MatrixModel that is assembled directly from the sparse
+        S matrix of the database (much faster than building PuLP expressions).
+
+        Args:
+            indicator_constraints (bool, optional): If True, the big-M
+                constraints are indicator constraints (for the solvers that
+                support them)
+
+        Returns:
+            MatrixModel: The problem in matrix form
+        """
+        self.logger.info("Formulating problem (matrix form)...")
+        if self.formulate_loopless_constraints:
+            self.logger.info("Loopless constraints are turned on.")
+        if self.custom_flux_constraints is not None:
+            self.logger.info("Adding custom constraints...")
+
+        return create_minflux_matrix_model(
+            self.database,
+            self.specific_bounds,
+            objective=self.objective,
+            zlb=self.zlb,
+            add_loopless_constraints=self.formulate_loopless_constraints,
+            custom_flux_constraints=self.custom_flux_constraints,
+            M=self.M,
+            integer_flux=(self._varCat == 'Integer'),
+            flux_bounds=self.flux_bounds,
+            indicator_constraints=indicator_constraints)
+
+    def add_integer_cut(self, lp_prob, reactions, name,
+                        yf=None, yb=None, backend=None):
+        """Add an integer cut so that the set of reactions cannot be
+        used together again: sum(j, 1 - yf(j) - yb(j)) >= 1.
+
+        Args:
+            lp_prob (pulp.LpProblem or :obj:`MatrixModel`): The problem
+            reactions (list): The reactions (excluding export reactions)
+                of a pathway
+            name (str): Name of the constraint
+            yf (dict, optional): The yf pulp variables (for pulp.LpProblem)
+            yb (dict, optional): The yb pulp variables (for pulp.LpProblem)
+            backend (:obj:`BaseSolverBackend` or :obj:`LPWriter`, optional): If
+                provided, the cut is appended to the problem loaded in the
+                backend or to the LP file (which also updates lp_prob).
+        """
+        if isinstance(lp_prob, MatrixModel):
+            coefficients = {}
+            for j in reactions:
+                coefficients['yf_%s' % lp_name(j)] = -1.0
+                coefficients['yb_%s' % lp_name(j)] = -1.0
+            lower = 1.0 - len(reactions)
+            if backend is not None:
+                backend.add_row(name, coefficients, lower, INF)
+            else:
+                lp_prob.add_row(name, coefficients, lower, INF)
+        else:
+            condition = pulp.lpSum([(1 - yf[j] - yb[j])
+                                    for j in reactions]) >= 1
+            lp_prob += condition, name
+
+    def add_loop_cut(self, lp_prob, fluxes,
+                     yf=None, yb=None, backend=None):
+        """Look for an infeasible cycle in the fluxes of a solution and, if
+        there is one, add a no-good cut so that the reactions of the cycle
+        cannot be used together in the same directions again:
+        sum(j in cycle, yf(j) or yb(j)) <= |cycle| - 1.
+
+        Args:
+            lp_prob (pulp.LpProblem or :obj:`MatrixModel`): The problem
+            fluxes (dict): {reaction: flux} of the solution
+            yf (dict, optional): The yf pulp variables (for pulp.LpProblem)
+            yb (dict, optional): The yb pulp variables (for pulp.LpProblem)
+            backend (:obj:`BaseSolverBackend` or :obj:`LPWriter`, optional):
+                See add_integer_cut.
+
+        Returns:
+            bool: True if a cut was added.
+        """
+        if self.loop_detector is None:
+            self.loop_detector = LoopDetector(self.database,
+                                              logger=self.logger)
+
+        cycle = self.loop_detector.find_cycle(fluxes, eps=EPS)
+        if cycle is None:
+            return False
+
+        self.num_loop_cuts += 1
+        name = "LoopCut_%d" % self.num_loop_cuts
+        self.logger.info("Infeasible cycle found (%s): %s",
+                         name, sorted(cycle.keys()))
+        if isinstance(lp_prob, MatrixModel):
+            coefficients = dict(
+                ('%s_%s' % ('yf' if d > 0 else 'yb', lp_name(j)), 1.0)
+                for j, d in cycle.items())
+            upper = len(cycle) - 1.0
+            if backend is not None:
+                backend.add_row(name, coefficients, -INF, upper)
+            else:
+                lp_prob.add_row(name, coefficients, -INF, upper)
+        else:
+            condition = pulp.lpSum([yf[j] if d > 0 else yb[j]
+                                    for j, d in cycle.items()]
+                                   ) <= len(cycle) - 1
+            lp_prob += condition, name
+        return True
+
+    def check_lazy_loopless(self):
+        """Raise a ValueError if lazy loopless constraints are not supported."""
+        if self.lazy_loopless and self.objective != 'MinFlux':
+            raise ValueError("Lazy loopless constraints require the "
+                             "MinFlux objective.")
+
     def solve(
             self,
             exclude_existing_solution=False,
             outputfile="OptStoic_pulp_result.txt",
-            max_iteration=None):
+            max_iteration=None,
+            backend=None,
+            pool_size=None,
+            warm_start=False,
+            initial_solution=None):
         """
         Solve OptStoic problem using pulp.solvers interface
 
@@ -338,9 +575,28 @@ class OptStoic(object):
             outputfile (str, optional): name of outpufile
             max_iteration (None, optional): Externally specified maximum number of pathway to be
                 found using OpStoic. If not specified, it will set to the internal max iterations.
+            backend (str or :obj:`BaseSolverBackend`, optional): If provided (e.g. 'HiGHS'),
+                the problem is loaded once into a persistent solver backend and the
+                integer cuts are appended in place, instead of re-exporting the
+                whole problem through PuLP in every iteration. The problem is
+                built with create_minflux_matrix_model.
+            pool_size (int, optional): If provided and the pulp solver supports
+                solution pools (see POOL_SOLVERS), each solve returns up to
+                pool_size solutions. The distinct pathways are taken in order of
+                objective value, skipping the solutions that use all the
+                reactions of a pathway found before (which the integer cuts
+                would exclude). Otherwise, one pathway is found per solve.
+            warm_start (bool, optional): If True, each solve starts from the
+                previous solution (MIP start). The integer cut makes it
+                infeasible, but it is a good starting point for the repair
+                heuristics of the solver.
+            initial_solution (dict, optional): A (partial) solution
+                {variable name: value} used as MIP start of the first solve,
+                e.g. the last_solution of a model at a neighbouring nATP.
 
         Returns:
-            TYPE: Description
+            TYPE: The problem (a pulp.LpProblem, or a MatrixModel if a backend is
+                used) and the dictionary of pathways found.
 
         Raises:
             ValueError: Description
@@ -352,10 +608,36 @@ class OptStoic(object):
         if max_iteration is None:
             max_iteration = self.max_iteration
 
+        if self.add_loopless_constraints:
+            self.check_lazy_loopless()
+
+        use_pool = False
+        if pool_size is not None and pool_size > 1:
+            use_pool = backend is None and supports_solution_pool(
+                self.pulp_solver)
+            if not use_pool:
+                self.logger.warning("The solver does not support solution "
+                                    "pools. One pathway is found per solve.")
+
         self.logger.info(
             "Finding multiple pathways using Optstoic %s...",
             self.objective)
-        lp_prob, v, vf, vb, yf, yb, a, G = self.create_minflux_problem()
+        if backend is None:
+            lp_prob, v, vf, vb, yf, yb, a, G = self.create_minflux_problem()
+        else:
+            backend = self.load_backend(backend)
+            indicator_constraints = (self.indicator_constraints and
+                                     backend.supports_indicator_constraints)
+            if self.indicator_constraints and not indicator_constraints:
+                self.logger.warning("%s does not support indicator "
+                                    "constraints. The big-M constraints are "
+                                    "used.", backend.name)
+            lp_prob = self.create_minflux_matrix_model(
+                indicator_constraints=indicator_constraints)
+            yf = yb = None
+
+        # The pathways of this solve are a new run of the pathway store
+        self.store_run_id = None
 
         # Create integer cut for existing pathways
         if exclude_existing_solution and bool(self.pathways):
@@ -366,10 +648,18 @@ class OptStoic(object):
                                  'before solving!')
 
             for ind, pathway in self.pathways.items():
-                rxnlist = list(set(pathway.reaction_ids_no_exchange))
-                condition = pulp.lpSum(
-                    [(1 - yf[j] - yb[j]) for j in rxnlist]) >= 1
-                lp_prob += condition, "IntegerCut_%d" % ind
+                rxnlist = self.database.compress_reaction_ids(
+                    pathway.reaction_ids_no_exchange)
+                if not set(rxnlist) <= set(self.database.reactions):
+                    # The pathway uses reactions removed from a reduced
+                    # database, so it cannot be found again
+                    continue
+                self.add_integer_cut(lp_prob, rxnlist, "IntegerCut_%d" % ind,
+                                     yf=yf, yb=yb)
+
+        if backend is not None:
+            backend.load(lp_prob)
+            v_names = ['v_%s' % lp_name(j) for j in self.database.reactions]
 
         self.logger.info("Solving problem...")
         # if self.iteration == 1:
@@ -377,18 +667,76 @@ class OptStoic(object):
         # else:
         #     result_output = open(os.path.join(self.result_filepath, outputfile), "a+")
 
+        mip_start = initial_solution
         while True and self.iteration <= max_iteration:
             self.logger.info("Iteration %s", self.iteration)
             # lp_prob.writeLP("OptStoic.lp", mip=1)  # optional
+            if mip_start is not None:
+                self.set_mip_start(lp_prob, mip_start, backend=backend)
             e1 = time.time()
-            lp_prob.solve(solver=self.pulp_solver)
+            if use_pool:
+                with solver_warm_start(self.pulp_solver,
+                                       mip_start is not None):
+                    lp_status, pool = solve_with_solution_pool(
+                        lp_prob, self.pulp_solver, pool_size,
+                        logger=self.logger)
+                solutions = [[values.get(v[j].name)
+                              for j in self.database.reactions]
+                             for _, values in pool]
+                if pool:
+                    self.last_solution = pool[0][1]
+            elif backend is None:
+                with self.command_line_scratch_directory(), \
+                        solver_warm_start(self.pulp_solver,
+                                          mip_start is not None):
+                    lp_prob.solve(solver=self.pulp_solver)
+                lp_status = pulp.LpStatus[lp_prob.status]
+                if lp_status == "Optimal":
+                    solutions = [[v[j].varValue
+                                  for j in self.database.reactions]]
+                    self.last_solution = dict(
+                        (var.name, var.varValue)
+                        for var in lp_prob.variables())
+            else:
+                lp_status = backend.solve()
+                if lp_status == "Optimal":
+                    values = backend.get_values_dict()
+                    solutions = [[values[name] for name in v_names]]
+                    self.last_solution = values
             e2 = time.time()
             self.logger.info(
                 "This iteration solved in %.3f seconds.",
                 (e2 - e1))
 
-            # The solution is printed if it was deemed "optimal
-            if pulp.LpStatus[lp_prob.status] == "Optimal":
+            # If a new optimal solution cannot be found, end the program
+            if lp_status != "Optimal":
+                break
+
+            mip_start = self.last_solution if warm_start else None
+
+            # Reactions of the pathways found in this solve
+            pool_cuts = []
+            for fluxes in solutions:
+                if self.iteration > max_iteration:
+                    break
+
+                # Cut off the infeasible cycles (the problem is solved again
+                # if no pathway is found)
+                if (self.add_loopless_constraints and self.lazy_loopless and
+                        self.add_loop_cut(
+                            lp_prob, dict(zip(self.database.reactions, fluxes)),
+                            yf=yf, yb=yb, backend=backend)):
+                    continue
+
+                active_rxns = set(
+                    j for j, flux in zip(self.database.reactions, fluxes)
+                    if flux is not None and (flux > EPS or flux < -EPS)) - set(
+                        self.database.user_defined_export_rxns)
+                if any(active_rxns >= cut for cut in pool_cuts):
+                    continue
+                pool_cuts.append(active_rxns)
+
+                # The solution is printed if it was deemed "optimal
                 self.logger.info("Writing result to output file...")
                 # result_output.write("\nIteration no.: %d\n" %self.iteration)
                 # result_output.write("\nModelstat: %s\n" %pulp.LpStatus[lp_prob.status])
@@ -399,11 +747,11 @@ class OptStoic(object):
                 res['time'] = (e2 - e1)
                 res['modelstat'] = "Optimal"
 
-                for j in self.database.reactions:
-                    if v[j].varValue is not None:
-                        if v[j].varValue > EPS or v[j].varValue < -EPS:
+                for j, flux in zip(self.database.reactions, fluxes):
+                    if flux is not None:
+                        if flux > EPS or flux < -EPS:
                             res['reaction_id'].append(j)
-                            res['flux'].append(v[j].varValue)
+                            res['flux'].append(flux)
                 #             result_output.write("%s %.8f\n" %(v[j].name, v[j].varValue))
 
                 # result_output.write("%s = %.8f\n" % (self.objective, pulp.value(lp_prob.objective)))
@@ -412,35 +760,109 @@ class OptStoic(object):
                 integer_cut_reactions = list(
                     set(res['reaction_id']) - set(self.database.user_defined_export_rxns))
 
+                # Expand the lumped reactions of a reduced database
+                pathway_rxns, pathway_fluxes = self.database.expand_fluxes(
+                    res['reaction_id'], res['flux'])
+
                 self.pathways[self.iteration] = Pathway(
                     id=self.iteration,
                     name='Pathway_{:03d}'.format(self.iteration),
-                    reaction_ids=res['reaction_id'],
-                    fluxes=res['flux'],
+                    reaction_ids=pathway_rxns,
+                    fluxes=pathway_fluxes,
                     sourceSubstrateID='C00031',
                     endSubstrateID='C00022',
                     note=res
                 )
 
-                self.write_pathways_to_json(json_filename="temp_pathways.json")
+                self.save_pathway(self.pathways[self.iteration])
 
                 # Integer cut constraint is added so that
                 # the same solution cannot be returned again
-                condition = pulp.lpSum([(1 - yf[j] - yb[j])
-                                        for j in integer_cut_reactions]) >= 1
-                lp_prob += condition, "IntegerCut_%d" % self.iteration
+                self.add_integer_cut(lp_prob, integer_cut_reactions,
+                                     "IntegerCut_%d" % self.iteration,
+                                     yf=yf, yb=yb, backend=backend)
                 self.iteration += 1
 
-            # If a new optimal solution cannot be found, end the program
-            else:
-                break
-
         # result_output.close()
 
         self.lp_prob = lp_prob
 
         return self.lp_prob, self.pathways
 
+    def set_mip_start(self, lp_prob, values, backend=None):
+        """Pass a (partial) solution to the solver as the starting point
+        (MIP start) of the next solve. The values are clipped to the bounds
+        of the variables (e.g. for a solution found at another nATP).
+
+        Args:
+            lp_prob (pulp.LpProblem or :obj:`MatrixModel`): The problem
+            values (dict): {variable name: value}. The variables that are not
+                in the problem are ignored.
+            backend (:obj:`BaseSolverBackend`, optional): The backend of the
+                problem (if lp_prob is a MatrixModel)
+        """
+        if backend is not None:
+            backend.set_solution(values)
+            return
+        for name, var in lp_prob.variablesDict().items():
+            value = values.get(name)
+            if value is None:
+                continue
+            if var.lowBound is not None:
+                value = max(value, var.lowBound)
+            if var.upBound is not None:
+                value = min(value, var.upBound)
+            var.setInitialValue(value)
+
+    def create_scratch_directory(self):
+        """Return a new ScratchDirectory for the files of a solve."""
+        return ScratchDirectory(prefix=self.lp_prob_fname + '_',
+                                root=self.scratch_root,
+                                use_shm=self.use_shm,
+                                logger=self.logger)
+
+    @contextmanager
+    def command_line_scratch_directory(self):
+        """Context manager that writes the files of a command line pulp
+        solver in a new scratch directory, removed at the end of the block.
+        No directory is created for the other solvers, which write no files.
+
+        Yields:
+            :obj:`ScratchDirectory`: The scratch directory (None if the
+                solver is not a command line solver)
+        """
+        if not is_command_line_solver(self.pulp_solver):
+            yield None
+            return
+        with self.create_scratch_directory() as scratch, \
+                solver_scratch_directory(self.pulp_solver, scratch):
+            yield scratch
+
+    @property
+    def lp_prob_filepath(self):
+        """The LP and solution files of gurobi_cl (without extension), in
+        the scratch directory of the current solve."""
+        if self.scratch is None:
+            return self.lp_prob_fname
+        return self.scratch.filepath(self.lp_prob_fname)
+
+    def load_backend(self, backend):
+        """Return a persistent solver backend instance.
+
+        Args:
+            backend (str or :obj:`BaseSolverBackend`): A backend name (e.g. 'HiGHS')
+                or a backend instance.
+
+        Returns:
+            BaseSolverBackend
+        """
+        if isinstance(backend, BaseSolverBackend):
+            return backend
+        solver_backend = load_solver_backend(backend, logger=self.logger)
+        if solver_backend is None:
+            raise ValueError("Solver backend %s is not available." % backend)
+        return solver_backend
+
     def write_pathways_to_json(self, json_filename="temp_pathways.json"):
 
         temp = {}
@@ -457,6 +879,33 @@ class OptStoic(object):
             sort_keys=True,
             indent=4)
 
+    def save_pathway(self, pathway):
+        """Keep a copy of a new pathway in case the program terminates
+        midway: append it to the pathway store (in a new run for each solve)
+        or, without a store, rewrite temp_pathways.json.
+
+        Args:
+            pathway (:obj:`Pathway`): The pathway
+        """
+        if self.pathway_store is None:
+            self.write_pathways_to_json(json_filename="temp_pathways.json")
+            return
+
+        nATP = getattr(self, 'nATP', None)
+        if self.store_run_id is None:
+            self.store_run_id = self.pathway_store.create_run(
+                name=self.lp_prob_fname,
+                objective=self.objective,
+                nATP=nATP,
+                zlb=self.zlb,
+                parameters=dict(
+                    specific_bounds=self.specific_bounds,
+                    custom_flux_constraints=self.custom_flux_constraints,
+                    add_loopless_constraints=self.add_loopless_constraints,
+                    M=self.M))
+        self.pathway_store.add_pathway(self.store_run_id, pathway,
+                                       objective=self.objective, nATP=nATP)
+
     def add_existing_pathways(self, user_defined_pathways):
         """
         Add list of existing solutions (Pathways) to be
@@ -487,7 +936,10 @@ class OptStoic(object):
                         outputfile="OptStoic_pulp_result_gcl.txt",
                         max_iteration=None,
                         cleanup=True,
-                        gurobi_options=GUROBI_OPTIONS):
+                        gurobi_options=GUROBI_OPTIONS,
+                        progress_callback=None,
+                        gap_target=None,
+                        time_target=None):
         """
         Solve OptStoic problem using Gurobi command line (gurobi_cl)
         when pulp.solvers.GUROBI_CMD failed.
@@ -500,16 +952,155 @@ class OptStoic(object):
             max_iteration (None, optional): Externally specified maximum number of pathway
                 to be found using OpStoic. If not specified,
                 it will set to the internal max iterations.
-            cleanup (bool, optional): If True, delete the temporary .lp and .sol file. Set as
-                False for debugging.
+            cleanup (bool, optional): If True, delete the scratch directory with the
+                .lp, .sol and gurobi.log files. Set as False for debugging.
             gurobi_options (TYPE, optional): Description
+            progress_callback (callable, optional): Called with each
+                ProgressEvent (incumbent, bound, gap) of the gurobi_cl log
+            gap_target (float, optional): Interrupt each solve once the
+                relative gap is at most gap_target (e.g. 0.05). The best
+                solution found is used (status 'Interrupted').
+            time_target (float, optional): Interrupt each solve after
+                time_target seconds if a solution was found
 
         Returns:
-            TYPE: Description
+            TYPE: The problem (a MatrixModel, written to the LP file once and
+                updated with the integer cuts in place) and the dictionary of
+                pathways found.
 
         Raises:
             ValueError: Description
         """
+        lp_prob, lp_writer, max_iteration = self._prepare_gurobi_cl(
+            exclude_existing_solution, max_iteration)
+
+        # if self.iteration == 1:
+        #     result_output = open(os.path.join(
+        #         self.result_filepath, outputfile), "w+")
+        # else:
+        #     result_output = open(os.path.join(
+        #         self.result_filepath, outputfile), "a+")
+
+        while True and self.iteration <= max_iteration:
+            self.logger.info("Iteration %s", self.iteration)
+            e1 = time.time()
+            lp_status, solver_message = solve_with_gurobi_cl_debug(
+                self.lp_prob_filepath, options=gurobi_options,
+                cwd=self.scratch.path,
+                progress_callback=progress_callback,
+                gap_target=gap_target,
+                time_target=time_target)
+            e2 = time.time()
+            self.logger.info(
+                "This iteration solved in %.3f seconds.",
+                (e2 - e1))
+
+            # If a new optimal solution cannot be found, end the program
+            if not self._add_gurobi_cl_solution(
+                    lp_prob, lp_writer, lp_status, solver_message, e2 - e1):
+                break
+
+        # result_output.close()
+        self._cleanup_gurobi_cl(cleanup)
+        self.lp_prob = lp_prob
+
+        return self.lp_prob, self.pathways
+
+    async def solve_async(self,
+                          exclude_existing_solution=False,
+                          max_iteration=None,
+                          cleanup=True,
+                          gurobi_options=GUROBI_OPTIONS,
+                          limiter=None,
+                          threads=None,
+                          line_callback=None,
+                          progress_callback=None,
+                          gap_target=None,
+                          time_target=None,
+                          use_gurobi_cl=True,
+                          backend=None):
+        """
+        Solve OptStoic problem without blocking the event loop, so that
+        several problems can be solved concurrently in one process.
+
+        With use_gurobi_cl=True, this is the asynchronous version of
+        solve_gurobi_cl: gurobi_cl is started with
+        asyncio.create_subprocess_exec and its output is streamed (see
+        solve_with_gurobi_cl_async). Otherwise, solve() runs in a thread of
+        the default executor.
+
+        Args:
+            exclude_existing_solution (bool, optional): See solve_gurobi_cl
+            max_iteration (None, optional): See solve_gurobi_cl
+            cleanup (bool, optional): See solve_gurobi_cl
+            gurobi_options (str, optional): gurobi_cl parameters
+            limiter (:obj:`SolverLimiter`, optional): Caps the number of
+                concurrent solves and solver threads. A slot is held during
+                each gurobi_cl run (or during the whole solve() call).
+            threads (int, optional): Number of solver threads of each run
+                (overrides the Threads parameter of gurobi_options)
+            line_callback (callable, optional): Called with ('stdout' or
+                'stderr', line) for each line of the gurobi_cl output
+            progress_callback (callable, optional): See solve_gurobi_cl
+            gap_target (float, optional): See solve_gurobi_cl
+            time_target (float, optional): See solve_gurobi_cl
+            use_gurobi_cl (bool, optional): If False, use solve() with
+                self.pulp_solver (or backend) instead of gurobi_cl
+            backend (str or :obj:`BaseSolverBackend`, optional): See solve
+                (only used if use_gurobi_cl is False)
+
+        Returns:
+            TYPE: The problem and the dictionary of pathways found.
+        """
+        if not use_gurobi_cl:
+            loop = asyncio.get_event_loop()
+            solve = functools.partial(
+                self.solve,
+                exclude_existing_solution=exclude_existing_solution,
+                max_iteration=max_iteration,
+                backend=backend)
+            if limiter is None:
+                return await loop.run_in_executor(None, solve)
+            async with limiter.slot(threads or 1):
+                return await loop.run_in_executor(None, solve)
+
+        lp_prob, lp_writer, max_iteration = self._prepare_gurobi_cl(
+            exclude_existing_solution, max_iteration)
+
+        while self.iteration <= max_iteration:
+            self.logger.info("Iteration %s", self.iteration)
+            e1 = time.time()
+            lp_status, solver_message = await solve_with_gurobi_cl_async(
+                self.lp_prob_filepath,
+                cwd=self.scratch.path,
+                options=gurobi_options,
+                limiter=limiter,
+                threads=threads,
+                line_callback=line_callback,
+                progress_callback=progress_callback,
+                gap_target=gap_target,
+                time_target=time_target,
+                logger=self.logger)
+            e2 = time.time()
+            self.logger.info(
+                "This iteration solved in %.3f seconds.",
+                (e2 - e1))
+
+            if not self._add_gurobi_cl_solution(
+                    lp_prob, lp_writer, lp_status, solver_message, e2 - e1):
+                break
+
+        self._cleanup_gurobi_cl(cleanup)
+        self.lp_prob = lp_prob
+
+        return self.lp_prob, self.pathways
+
+    def _prepare_gurobi_cl(self, exclude_existing_solution, max_iteration):
+        """Build the problem and write the LP file for gurobi_cl.
+
+        Returns:
+            tuple: (the MatrixModel, its LPWriter, max_iteration)
+        """
         if self.objective not in ['MinFlux', 'MinRxn']:
             raise ValueError("The objective for OptStoic is not correctly "
                              "defined. Please use either 'MinFlux' or "
@@ -518,11 +1109,16 @@ class OptStoic(object):
         if max_iteration is None:
             max_iteration = self.max_iteration
 
-        t1 = time.time()
+        if self.add_loopless_constraints:
+            self.check_lazy_loopless()
 
         self.logger.info("Finding multiple pathways using"
                          " Optstoic %s and Gurobi CL...", self.objective)
-        lp_prob, v, vf, vb, yf, yb, a, G = self.create_minflux_problem()
+        lp_prob = self.create_minflux_matrix_model(
+            indicator_constraints=self.indicator_constraints)
+
+        # The pathways of this solve are a new run of the pathway store
+        self.store_run_id = None
 
         # Create integer cut for existing pathways
         if exclude_existing_solution and bool(self.pathways):
@@ -533,96 +1129,110 @@ class OptStoic(object):
                                  'before solving!')
 
             for ind, pathway in self.pathways.items():
-                rxnlist = list(set(pathway.reaction_ids_no_exchange))
-                condition = pulp.lpSum(
-                    [(1 - yf[j] - yb[j]) for j in rxnlist]) >= 1
-                lp_prob += condition, "IntegerCut_%d" % ind
+                rxnlist = self.database.compress_reaction_ids(
+                    pathway.reaction_ids_no_exchange)
+                if not set(rxnlist) <= set(self.database.reactions):
+                    # The pathway uses reactions removed from a reduced
+                    # database, so it cannot be found again
+                    continue
+                self.add_integer_cut(lp_prob, rxnlist, "IntegerCut_%d" % ind)
+
+        # The LP file is written once, integer cuts are appended to it
+        # The LP, solution and log files are written in a scratch directory
+        self.scratch = self.create_scratch_directory()
+        lp_writer = LPWriter(lp_prob, self.lp_prob_filepath + ".lp",
+                             logger=self.logger)
+        lp_writer.write()
 
         # Solve problem
         self.logger.info("Solving problem...")
+        return lp_prob, lp_writer, max_iteration
 
-        # if self.iteration == 1:
-        #     result_output = open(os.path.join(
-        #         self.result_filepath, outputfile), "w+")
-        # else:
-        #     result_output = open(os.path.join(
-        #         self.result_filepath, outputfile), "a+")
-
-        while True and self.iteration <= max_iteration:
-            self.logger.info("Iteration %s", self.iteration)
-            lp_prob.writeLP(self.lp_prob_fname + ".lp", mip=1)
-            e1 = time.time()
-            lp_status, solver_message = solve_with_gurobi_cl_debug(
-                self.lp_prob_fname, options=gurobi_options)
-            e2 = time.time()
-            self.logger.info(
-                "This iteration solved in %.3f seconds.",
-                (e2 - e1))
-
-            # The solution is printed if it was deemed "optimal
-            if lp_status in ["Optimal", "Time_limit"]:
-                objective_function, varValue = parse_gurobi_sol(
-                    self.lp_prob_fname)
+    def _add_gurobi_cl_solution(self, lp_prob, lp_writer, lp_status,
+                                solver_message, solve_time):
+        """Read the solution of a gurobi_cl run, add the pathway and its
+        integer cut (or a loop cut with lazy loopless constraints).
 
-                res = {}
-                res['reaction_id'] = []
-                res['flux'] = []
-                res['iteration'] = self.iteration
-                res['time'] = (e2 - e1)
-                res['modelstat'] = lp_status
-                res['solvestat'] = solver_message
-
-                # result_output.write("\nIteration no.: %d\n" %self.iteration)
-                # result_output.write("\nModelstat: %s\n" %lp_status)
-
-                for j in self.database.reactions:
-                    if 'v_' + j in varValue:
-                        v = varValue['v_' + j]
-                        if v > EPS or v < -EPS:
-                            res['reaction_id'].append(j)
-                            res['flux'].append(v)
-                            #result_output.write("%s %.8f\n" %(j, v))
-
-                # result_output.write("%s = %.8f\n" %(self.objective, objective_function))
-                # result_output.write("----------------------------------\n\n")
-
-                integer_cut_reactions = list(
-                    set(res['reaction_id']) - set(self.database.user_defined_export_rxns))
-
-                self.pathways[self.iteration] = Pathway(
-                    id=self.iteration,
-                    name='Pathway_{:03d}'.format(self.iteration),
-                    reaction_ids=res['reaction_id'],
-                    fluxes=res['flux'],
-                    sourceSubstrateID='C00031',
-                    endSubstrateID='C00022',
-                    note=res
-                )
-                # Keep a copy of pathways in case program terminate midway
-                self.write_pathways_to_json(json_filename="temp_pathways.json")
-
-                # Integer cut constraint is added so that
-                # the same solution cannot be returned again
-                condition = pulp.lpSum([(1 - yf[j] - yb[j])
-                                        for j in integer_cut_reactions]) >= 1
-                lp_prob += condition, "IntegerCut_%d" % self.iteration
-                self.iteration += 1
-
-            # If a new optimal solution cannot be found, end the program
-            else:
-                break
+        Returns:
+            bool: False if no solution was found (the enumeration ends).
+        """
+        # The solution is printed if it was deemed "optimal
+        if lp_status not in ["Optimal", "Time_limit", "Interrupted"]:
+            return False
+
+        solution = parse_gurobi_sol(self.lp_prob_filepath)
+        if solution is None:
+            # Stopped before a solution was found
+            return False
+        objective_function, varValue = solution
+
+        # Cut off the infeasible cycles and solve again
+        if (self.add_loopless_constraints and self.lazy_loopless and
+                self.add_loop_cut(
+                    lp_prob,
+                    dict((j, varValue.get('v_' + lp_name(j), 0))
+                         for j in self.database.reactions),
+                    backend=lp_writer)):
+            return True
+
+        res = {}
+        res['reaction_id'] = []
+        res['flux'] = []
+        res['iteration'] = self.iteration
+        res['time'] = solve_time
+        res['modelstat'] = lp_status
+        res['solvestat'] = solver_message
+
+        # result_output.write("\nIteration no.: %d\n" %self.iteration)
+        # result_output.write("\nModelstat: %s\n" %lp_status)
 
-        # result_output.close()
+        for j in self.database.reactions:
+            if 'v_' + lp_name(j) in varValue:
+                v = varValue['v_' + lp_name(j)]
+                if v > EPS or v < -EPS:
+                    res['reaction_id'].append(j)
+                    res['flux'].append(v)
+                    #result_output.write("%s %.8f\n" %(j, v))
+
+        # result_output.write("%s = %.8f\n" %(self.objective, objective_function))
+        # result_output.write("----------------------------------\n\n")
+
+        integer_cut_reactions = list(
+            set(res['reaction_id']) - set(self.database.user_defined_export_rxns))
+
+        # Expand the lumped reactions of a reduced database
+        pathway_rxns, pathway_fluxes = self.database.expand_fluxes(
+            res['reaction_id'], res['flux'])
+
+        self.pathways[self.iteration] = Pathway(
+            id=self.iteration,
+            name='Pathway_{:03d}'.format(self.iteration),
+            reaction_ids=pathway_rxns,
+            fluxes=pathway_fluxes,
+            sourceSubstrateID='C00031',
+            endSubstrateID='C00022',
+            note=res
+        )
+        # Keep a copy of pathways in case program terminate midway
+        self.save_pathway(self.pathways[self.iteration])
+
+        # Integer cut constraint is added so that
+        # the same solution cannot be returned again
+        self.add_integer_cut(lp_prob, integer_cut_reactions,
+                             "IntegerCut_%d" % self.iteration,
+                             backend=lp_writer)
+        self.iteration += 1
+        return True
+
+    def _cleanup_gurobi_cl(self, cleanup):
         # Clean up directory
         if cleanup:
             self.logger.debug("Cleaning up directory...")
-            os.remove("./" + self.lp_prob_fname + ".lp")
-            os.remove("./" + self.lp_prob_fname + ".sol")
-            os.remove("./gurobi.log")
-
-        self.lp_prob = lp_prob
-
-        return self.lp_prob, self.pathways
+            self.scratch.cleanup()
+        else:
+            self.logger.info("The gurobi_cl files are in %s.",
+                             self.scratch.path)
+        self.scratch = None
 
     def __repr__(self):
         return "<OptStoic(objective='%s')>" % (self.objective)
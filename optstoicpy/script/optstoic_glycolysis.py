@@ -21,7 +21,7 @@ import pulp
 from . import gams_parser
 import json
 #import pdb
-from optstoicpy.core import database
+from optstoicpy.core.database import load_db_v3
 from optstoicpy.script.utils import create_logger
 from optstoicpy.script.solver import load_pulp_solver
 from optstoicpy.script.optstoic import OptStoic
@@ -83,6 +83,12 @@ class OptStoicGlycolysis(OptStoic):
                  pulp_solver=None,
                  result_filepath=None,
                  M=1000,
+                 database=None,
+                 scratch_root=None,
+                 use_shm=False,
+                 flux_bounds=None,
+                 indicator_constraints=False,
+                 pathway_store=None,
                  logger=None):
         """An example of the optStoic model for identifying glycolytic pathways
             generating n ATP.
@@ -96,25 +102,37 @@ class OptStoicGlycolysis(OptStoic):
             pulp_solver (None, optional): Description
             result_filepath (None, optional): Description
             M (int, optional): Description
+            database (:obj:`Database`, optional): A database loaded with
+                load_db_v3 and EXPORT_RXNS_SJI, shared between instances (it is
+                not modified). If not provided, the database is loaded.
+            scratch_root (str, optional): See OptStoic
+            use_shm (bool, optional): See OptStoic
+            flux_bounds (dict, optional): See OptStoic
+            indicator_constraints (bool, optional): See OptStoic
+            pathway_store (str or :obj:`PathwayStore`, optional): See OptStoic
             logger (None, optional): Description
         """
-
-        self.DBV3 = database.load_db_v3(
-            reduce_model_size=True,
-            user_defined_export_rxns_Sji=self.EXPORT_RXNS_SJI
-        )
+        if database is None:
+            database = load_glycolysis_database()
+        self.DBV3 = database
 
         super(OptStoicGlycolysis, self).__init__(
             database=self.DBV3,
-            objective='MinFlux',
+            objective=objective,
             zlb=zlb,
-            specific_bounds=self.GLYCOLYSIS_BOUNDS,
+            # The nATP setter modifies the bounds of this instance
+            specific_bounds=copy.deepcopy(self.GLYCOLYSIS_BOUNDS),
             custom_flux_constraints=self.CUSTOM_REDOX_CONSTRAINTS,
             add_loopless_constraints=add_loopless_constraints,
             max_iteration=max_iteration,
             pulp_solver=pulp_solver,
             result_filepath=result_filepath,
-            M=1000,
+            M=M,
+            scratch_root=scratch_root,
+            use_shm=use_shm,
+            flux_bounds=flux_bounds,
+            indicator_constraints=indicator_constraints,
+            pathway_store=pathway_store,
             logger=logger)
 
         self.nATP = nATP
@@ -144,6 +162,14 @@ class OptStoicGlycolysis(OptStoic):
             self.nATP, self.objective)
 
 
+def load_glycolysis_database():
+    """Load the database v3 with the export reactions of the glycolysis
+    study (OptStoicGlycolysis.EXPORT_RXNS_SJI)."""
+    return load_db_v3(
+        reduce_model_size=True,
+        user_defined_export_rxns_Sji=OptStoicGlycolysis.EXPORT_RXNS_SJI)
+
+
 def test_optstoic_glycolysis():
     logger = create_logger(name='optstoicpy.script.optstoic_glycolysis.main')
     #logger.debug('Testing optstoic output filepath: %s', res_dir)
@@ -0,0 +1,319 @@
+"""
+Run OptStoicGlycolysis for a grid of (nATP, zlb, objective) points.
+
+The database is loaded once in the main process. With the 'fork' start
+method (Linux/macOS), the worker processes inherit it as a module global
+(copy-on-write), so it is neither reloaded nor pickled for each point.
+Otherwise (or with use_shared_memory=True), it is exported to shared memory
+and each worker attaches to it (see Database.to_shared_memory).
+
+The pathways of every point are collected in a SweepResult, indexed by
+(nATP, zlb, objective).
+
+Usage:
+    points = create_sweep_grid(nATP=[0, 0.5, 1, 2], zlb=[8, 10])
+    result = run_parameter_sweep(points, processes=4, max_iteration=10,
+                                 result_filepath='./sweep/')
+    result.pathways[(1, 10, 'MinFlux')]  # {iteration: Pathway}
+    df = result.to_dataframe()
+"""
+from builtins import object
+import itertools
+import json
+import multiprocessing
+import os
+import time
+import pandas as pd
+from optstoicpy.core.database import Database
+from optstoicpy.script.utils import create_logger
+from optstoicpy.script.pathway_store import PathwayStore
+from optstoicpy.script.optstoic_glycolysis import (
+    OptStoicGlycolysis,
+    load_glycolysis_database)
+
+# The database shared by the worker processes (see _init_sweep_worker)
+_SWEEP_DATABASE = None
+
+
+def create_sweep_grid(nATP, zlb, objective=('MinFlux',)):
+    """Return the list of points of the grid nATP x zlb x objective.
+
+    Args:
+        nATP (list): The numbers of ATP (may be fractional)
+        zlb (list): The lower bounds on the objective value (None for no bound)
+        objective (list, optional): The objectives ('MinFlux' or 'MinRxn')
+
+    Returns:
+        list: The points as dicts {'nATP': ..., 'zlb': ..., 'objective': ...}
+    """
+    return [dict(nATP=n, zlb=z, objective=obj)
+            for n, z, obj in itertools.product(nATP, zlb, objective)]
+
+
+def point_key(point):
+    """Return the index (nATP, zlb, objective) of a point."""
+    return (point['nATP'], point['zlb'], point.get('objective', 'MinFlux'))
+
+
+def point_dirname(point):
+    """Return the name of the result directory of a point."""
+    return 'nATP_%s_zlb_%s_%s' % point_key(point)
+
+
+def _init_sweep_worker(shared_memory_name):
+    global _SWEEP_DATABASE
+    if shared_memory_name is not None:
+        _SWEEP_DATABASE = Database.attach_shared_memory(shared_memory_name)
+
+
+def sweep_chains(points):
+    """Group the points by (zlb, objective), sorted by nATP, so that each
+    point can start from the solution of the previous one (warm start)."""
+    chains = {}
+    for point in points:
+        key = point_key(point)
+        chains.setdefault((key[1], key[2]), []).append(point)
+    return [sorted(chains[key], key=lambda point: point['nATP'])
+            for key in sorted(chains, key=str)]
+
+
+def _solve_sweep_point(point, options, initial_solution=None):
+    """Solve one point of the sweep (in a worker process).
+
+    Returns:
+        tuple: ((point, pathways, status, solve time), last solution)
+    """
+    options = dict(options)
+    result_filepath = os.path.join(options.pop('result_filepath'),
+                                   point_dirname(point))
+    backend = options.pop('backend')
+    warm_start = options.pop('warm_start')
+    model_class = options.pop('model_class')
+
+    model = model_class(objective=point.get('objective', 'MinFlux'),
+                        zlb=point['zlb'],
+                        nATP=point['nATP'],
+                        result_filepath=result_filepath,
+                        database=_SWEEP_DATABASE,
+                        **options)
+    start = time.time()
+    try:
+        _, pathways = model.solve(backend=backend,
+                                  warm_start=warm_start,
+                                  initial_solution=initial_solution)
+    except Exception as e:
+        model.logger.error("Point %s failed: %s", point_key(point), e)
+        return (point, {}, 'Error: %s' % e, time.time() - start), None
+    finally:
+        if model.pathway_store is not None:
+            model.pathway_store.close()
+    return (point, pathways, 'Done', time.time() - start), model.last_solution
+
+
+def _run_sweep_chain(args):
+    """Solve a list of points in order (in a worker process). With warm
+    start, each point starts from the last solution of the previous one."""
+    points, options = args
+    results = []
+    solution = None
+    for point in points:
+        result, last_solution = _solve_sweep_point(
+            point, options,
+            initial_solution=solution if options['warm_start'] else None)
+        if last_solution is not None:
+            solution = last_solution
+        results.append(result)
+    return results
+
+
+class SweepResult(object):
+    """The pathways found for each point of a parameter sweep."""
+
+    def __init__(self):
+        # {(nATP, zlb, objective): {iteration: Pathway}}
+        self.pathways = {}
+        # {(nATP, zlb, objective): 'Done' or the error message}
+        self.status = {}
+        # {(nATP, zlb, objective): solve time (seconds)}
+        self.time = {}
+
+    def add(self, point, pathways, status='Done', solve_time=None):
+        key = point_key(point)
+        self.pathways[key] = pathways
+        self.status[key] = status
+        self.time[key] = solve_time
+
+    def to_dataframe(self):
+        """Return one row per pathway, indexed by (nATP, zlb, objective,
+        iteration)."""
+        rows = []
+        for key in sorted(self.pathways, key=str):
+            for iteration, pathway in sorted(self.pathways[key].items()):
+                rows.append(dict(
+                    nATP=key[0],
+                    zlb=key[1],
+                    objective=key[2],
+                    iteration=iteration,
+                    name=pathway.name,
+                    num_reaction=len(pathway.reaction_ids_no_exchange),
+                    total_flux_no_exchange=pathway.total_flux_no_exchange,
+                    reaction_ids=pathway.reaction_ids,
+                    fluxes=pathway.fluxes))
+        columns = ['nATP', 'zlb', 'objective', 'iteration', 'name',
+                   'num_reaction', 'total_flux_no_exchange', 'reaction_ids',
+                   'fluxes']
+        return pd.DataFrame(rows, columns=columns).set_index(
+            ['nATP', 'zlb', 'objective', 'iteration'])
+
+    def to_json(self, filepath):
+        """Write the pathways of all the points to a json file."""
+        output = []
+        for key in sorted(self.pathways, key=str):
+            output.append(dict(
+                nATP=key[0], zlb=key[1], objective=key[2],
+                status=self.status[key], time=self.time[key],
+                pathways=dict((str(k), p.to_dict())
+                              for k, p in self.pathways[key].items())))
+        with open(filepath, 'w') as f:
+            json.dump(output, f, sort_keys=True, indent=4)
+
+    def __len__(self):
+        return len(self.pathways)
+
+    def __repr__(self):
+        return "<SweepResult(points='%s', pathways='%s')>" % (
+            len(self.pathways),
+            sum(len(p) for p in self.pathways.values()))
+
+
+def run_parameter_sweep(points,
+                        database=None,
+                        processes=1,
+                        max_iteration=1,
+                        add_loopless_constraints=True,
+                        pulp_solver=None,
+                        backend=None,
+                        result_filepath=None,
+                        M=1000,
+                        use_shared_memory=False,
+                        use_shm=False,
+                        warm_start=False,
+                        pathway_store=None,
+                        model_class=OptStoicGlycolysis,
+                        logger=None):
+    """Run OptStoicGlycolysis for each point of a sweep.
+
+    Args:
+        points (list): The points {'nATP': ..., 'zlb': ..., 'objective': ...}
+            (see create_sweep_grid). The objective defaults to MinFlux.
+        database (:obj:`Database`, optional): The database (see
+            load_glycolysis_database). Loaded once if not provided (for
+            OptStoicGlycolysis only).
+        processes (int, optional): Number of worker processes
+        max_iteration (int, optional): Maximum number of pathways per point
+        add_loopless_constraints (bool, optional): See OptStoic
+        pulp_solver (optional): A pulp.solvers object
+        backend (str, optional): Name of a persistent solver backend (see
+            OptStoic.solve)
+        result_filepath (str, optional): The results of each point are written
+            in the subdirectory point_dirname(point). Default to './result'.
+        M (int, optional): The maximum flux bound
+        use_shared_memory (bool, optional): If True, the workers attach to a
+            shared memory copy of the database even if they can inherit it
+            (the default without the 'fork' start method).
+        use_shm (bool, optional): If True, the solver files of each point are
+            written in a scratch directory in /dev/shm (see OptStoic)
+        warm_start (bool, optional): If True, the points with the same zlb
+            and objective are solved in order of nATP by the same worker, and
+            each one starts from the last solution of the previous one (MIP
+            start). The iterations of a point are warm started too (see
+            OptStoic.solve).
+        pathway_store (str, optional): Path of an SQLite pathway store (see
+            PathwayStore). Each worker appends the pathways of its points to
+            it, one run per point.
+        model_class (type, optional): The OptStoic subclass solved at each
+            point, instantiated with the objective, zlb and nATP of the point,
+            the database, the result_filepath and the options above. It must
+            be importable by the worker processes. Default to
+            OptStoicGlycolysis.
+        logger (:obj:`logging.logger`, optional): The logging instance
+
+    Returns:
+        :obj:`SweepResult`: The pathways of each point
+    """
+    global _SWEEP_DATABASE
+
+    if logger is None:
+        logger = create_logger(
+            name="optstoicpy.script.parameter_sweep.run_parameter_sweep")
+
+    keys = [point_key(point) for point in points]
+    if len(set(keys)) != len(keys):
+        raise ValueError("The points of the sweep must be unique.")
+
+    if database is None:
+        if model_class is not OptStoicGlycolysis:
+            raise ValueError("A database is required with model_class %s." %
+                             model_class.__name__)
+        database = load_glycolysis_database()
+    if result_filepath is None:
+        result_filepath = './result'
+
+    options = dict(max_iteration=max_iteration,
+                   add_loopless_constraints=add_loopless_constraints,
+                   pulp_solver=pulp_solver,
+                   backend=backend,
+                   result_filepath=result_filepath,
+                   M=M,
+                   use_shm=use_shm,
+                   warm_start=warm_start,
+                   pathway_store=pathway_store,
+                   model_class=model_class)
+    if warm_start:
+        tasks = [(chain, options) for chain in sweep_chains(points)]
+    else:
+        tasks = [([point], options) for point in points]
+
+    if pathway_store is not None:
+        # Create the tables before the workers open the file
+        PathwayStore(pathway_store).close()
+
+    result = SweepResult()
+    logger.info("Running %d points with %d processes...",
+                len(points), processes)
+    _SWEEP_DATABASE = database
+    shared_db = None
+    try:
+        if processes > 1:
+            if ('fork' in multiprocessing.get_all_start_methods() and
+                    not use_shared_memory):
+                # The workers inherit _SWEEP_DATABASE
+                context = multiprocessing.get_context('fork')
+                initargs = (None,)
+            else:
+                context = multiprocessing
+                shared_db = database.to_shared_memory()
+                initargs = (shared_db.name,)
+            pool = context.Pool(processes,
+                                initializer=_init_sweep_worker,
+                                initargs=initargs)
+            try:
+                for results in pool.imap_unordered(_run_sweep_chain, tasks):
+                    for res in results:
+                        result.add(*res)
+                        logger.info("Point %s: %s (%d pathways).",
+                                    point_key(res[0]), res[2], len(res[1]))
+            finally:
+                pool.terminate()
+        else:
+            for task in tasks:
+                for res in _run_sweep_chain(task):
+                    result.add(*res)
+                    logger.info("Point %s: %s (%d pathways).",
+                                point_key(res[0]), res[2], len(res[1]))
+    finally:
+        _SWEEP_DATABASE = None
+        if shared_db is not None:
+            shared_db.unlink()
+
+    return result
@@ -0,0 +1,275 @@
+"""
+Store the pathways found by OptStoic in an SQLite database.
+
+OptStoic.write_pathways_to_json rewrites every pathway found so far after
+each iteration. A PathwayStore appends the new pathway only, in one
+transaction per iteration, and can be queried across runs:
+
+    runs               one row per solve (objective, nATP, zlb, parameters)
+    pathways           one row per pathway (run, iteration, nATP, objective,
+                       number of reactions, total flux, solver status)
+    pathway_reactions  one row per (pathway, reaction, flux)
+
+The pathways are indexed by nATP, objective and number of reactions, and
+pathway_reactions by reaction ID, so queries such as "all the pathways using
+R01061 with nATP = 2" stay fast with millions of rows. The database uses
+write-ahead logging, so several processes (e.g. the workers of a parameter
+sweep) can write to the same file. A PathwayStore can be pickled (e.g. with
+an OptStoic sent to a SolverScheduler): the connection is reopened from the
+file path when it is unpickled.
+
+Usage:
+    store = PathwayStore('pathways.sqlite')
+    model = OptStoic(..., pathway_store=store)
+    model.solve()
+    pathways = store.load_pathways(reaction_id='R01061', nATP=2)
+"""
+from builtins import object
+import json
+import sqlite3
+import time
+from optstoicpy.core.pathway import Pathway
+from optstoicpy.script.utils import create_logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    name TEXT,
+    objective TEXT,
+    nATP REAL,
+    zlb REAL,
+    parameters TEXT,
+    start_time REAL
+);
+CREATE TABLE IF NOT EXISTS pathways (
+    pathway_id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    iteration INTEGER,
+    name TEXT,
+    objective TEXT,
+    nATP REAL,
+    num_reaction INTEGER,
+    total_flux_no_exchange REAL,
+    modelstat TEXT,
+    solvestat TEXT,
+    time REAL
+);
+CREATE TABLE IF NOT EXISTS pathway_reactions (
+    pathway_id INTEGER NOT NULL REFERENCES pathways (pathway_id),
+    reaction_id TEXT NOT NULL,
+    flux REAL NOT NULL,
+    PRIMARY KEY (pathway_id, reaction_id)
+);
+CREATE INDEX IF NOT EXISTS pathways_nATP
+    ON pathways (nATP, objective);
+CREATE INDEX IF NOT EXISTS pathways_objective
+    ON pathways (objective);
+CREATE INDEX IF NOT EXISTS pathways_num_reaction
+    ON pathways (num_reaction);
+CREATE INDEX IF NOT EXISTS pathways_run
+    ON pathways (run_id, iteration);
+CREATE INDEX IF NOT EXISTS pathway_reactions_reaction
+    ON pathway_reactions (reaction_id, pathway_id);
+"""
+
+PATHWAY_COLUMNS = ['pathway_id', 'run_id', 'iteration', 'name', 'objective',
+                   'nATP', 'num_reaction', 'total_flux_no_exchange',
+                   'modelstat', 'solvestat', 'time']
+
+
+class PathwayStore(object):
+    """An SQLite database of OptStoic pathways (see the module docstring)."""
+
+    def __init__(self, filepath, timeout=60, logger=None):
+        """
+        Args:
+            filepath (str): Path of the database file (':memory:' for an
+                in-memory database, which is not shared with the copies made
+                by pickling)
+            timeout (float, optional): Seconds to wait for the lock of the
+                database when another process is writing to it
+            logger (:obj:`logging.logger`, optional): The logging instance
+        """
+        if logger is None:
+            self.logger = create_logger('optstoic.PathwayStore')
+        else:
+            self.logger = logger
+        self.filepath = filepath
+        self.timeout = timeout
+        self._connect()
+
+    def _connect(self):
+        self.connection = sqlite3.connect(self.filepath, timeout=self.timeout)
+        if self.filepath != ':memory:':
+            self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def __getstate__(self):
+        # An sqlite3.Connection cannot be pickled
+        state = self.__dict__.copy()
+        del state['connection']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._connect()
+
+    def create_run(self, name=None, objective=None, nATP=None, zlb=None,
+                   parameters=None):
+        """Add a run (e.g. one OptStoic.solve) and return its run_id.
+
+        Args:
+            name (str, optional): Name of the run
+            objective (str, optional): 'MinFlux' or 'MinRxn'
+            nATP (float, optional): The number of ATP of the design equation
+            zlb (float, optional): The lower bound on the objective value
+            parameters (dict, optional): Other parameters (stored as json)
+
+        Returns:
+            int
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (name, objective, nATP, zlb, parameters, '
+                'start_time) VALUES (?, ?, ?, ?, ?, ?)',
+                (name, objective, nATP, zlb,
+                 json.dumps(parameters, sort_keys=True, default=str),
+                 time.time()))
+        return cursor.lastrowid
+
+    def add_pathway(self, run_id, pathway, objective=None, nATP=None):
+        """Append a pathway and its reactions in one transaction.
+
+        Args:
+            run_id (int): The run (see create_run)
+            pathway (:obj:`Pathway`): The pathway. Its id is stored as the
+                iteration.
+            objective (str, optional): The objective of the run
+            nATP (float, optional): The number of ATP of the run, used if the
+                pathway has no EX_atp flux
+
+        Returns:
+            int: The pathway_id
+        """
+        if pathway.nATP is not None:
+            nATP = pathway.nATP
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO pathways (run_id, iteration, name, objective, '
+                'nATP, num_reaction, total_flux_no_exchange, modelstat, '
+                'solvestat, time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (run_id, pathway.id, pathway.name, objective, nATP,
+                 len(pathway.reaction_ids),
+                 pathway.get_total_flux_no_exchange(),
+                 pathway.get_modelstat(), pathway.get_solvestat(),
+                 pathway.get_time()))
+            pathway_id = cursor.lastrowid
+            self.connection.executemany(
+                'INSERT INTO pathway_reactions (pathway_id, reaction_id, '
+                'flux) VALUES (?, ?, ?)',
+                [(pathway_id, j, float(flux))
+                 for j, flux in zip(pathway.reaction_ids, pathway.fluxes)])
+        self.logger.debug("Pathway %s of run %d stored.", pathway.name, run_id)
+        return pathway_id
+
+    def find_pathways(self, reaction_id=None, nATP=None, objective=None,
+                      num_reaction=None, max_num_reaction=None, run_id=None):
+        """Return the pathway_ids of the pathways that match all the given
+        filters, in the order they were stored.
+
+        Args:
+            reaction_id (str or list, optional): A reaction ID, or a list of
+                reaction IDs that the pathways all use
+            nATP (float, optional): The number of ATP
+            objective (str, optional): 'MinFlux' or 'MinRxn'
+            num_reaction (int, optional): The number of reactions (including
+                the exchange reactions, see Pathway.to_dict)
+            max_num_reaction (int, optional): The maximum number of reactions
+            run_id (int, optional): The run
+
+        Returns:
+            list
+        """
+        conditions = []
+        values = []
+        for column, operator, value in [('nATP', '=', nATP),
+                                        ('objective', '=', objective),
+                                        ('num_reaction', '=', num_reaction),
+                                        ('num_reaction', '<=',
+                                         max_num_reaction),
+                                        ('run_id', '=', run_id)]:
+            if value is not None:
+                conditions.append('%s %s ?' % (column, operator))
+                values.append(value)
+
+        if reaction_id is not None:
+            if isinstance(reaction_id, str):
+                reaction_id = [reaction_id]
+            for j in reaction_id:
+                conditions.append('pathway_id IN (SELECT pathway_id FROM '
+                                  'pathway_reactions WHERE reaction_id = ?)')
+                values.append(j)
+
+        query = 'SELECT pathway_id FROM pathways'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY pathway_id'
+        return [row[0] for row in self.connection.execute(query, values)]
+
+    def get_pathway(self, pathway_id):
+        """Return a stored pathway as a Pathway (None if it does not exist).
+
+        Args:
+            pathway_id (int): The pathway_id
+
+        Returns:
+            :obj:`Pathway`
+        """
+        row = self.connection.execute(
+            'SELECT %s FROM pathways WHERE pathway_id = ?' %
+            ', '.join(PATHWAY_COLUMNS), (pathway_id,)).fetchone()
+        if row is None:
+            return None
+        record = dict(zip(PATHWAY_COLUMNS, row))
+        reactions = self.connection.execute(
+            'SELECT reaction_id, flux FROM pathway_reactions '
+            'WHERE pathway_id = ? ORDER BY rowid', (pathway_id,)).fetchall()
+        note = dict((key, record[key])
+                    for key in ['iteration', 'modelstat', 'solvestat', 'time']
+                    if record[key] is not None)
+        return Pathway(id=record['iteration'],
+                       name=record['name'],
+                       reaction_ids=[j for j, _ in reactions],
+                       fluxes=[flux for _, flux in reactions],
+                       total_flux_no_exchange=record['total_flux_no_exchange'],
+                       note=note)
+
+    def load_pathways(self, **filters):
+        """Return {pathway_id: Pathway} of the pathways that match the
+        filters (see find_pathways)."""
+        return dict((pathway_id, self.get_pathway(pathway_id))
+                    for pathway_id in self.find_pathways(**filters))
+
+    def run_pathways(self, run_id):
+        """Return {iteration: Pathway} of a run."""
+        pathways = self.load_pathways(run_id=run_id)
+        return dict((pathway.id, pathway) for pathway in pathways.values())
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM pathways').fetchone()[0]
+
+    def __repr__(self):
+        return "<PathwayStore(filepath='%s', pathways='%s')>" % (
+            self.filepath, len(self))
@@ -0,0 +1,96 @@
+"""
+Per-job scratch directories for the command line solvers.
+
+The command line solvers write their problem, solution, log and parameter
+files to a directory. When several OptStoic jobs run at the same time in the
+same working directory, these files clobber each other (e.g. gurobi.log and
+scip_parameters.set). A ScratchDirectory is a new directory per solve,
+optionally on /dev/shm (in memory), which is removed atomically: it is first
+renamed, so that its path never points to a partially deleted directory.
+
+Usage:
+    with ScratchDirectory(use_shm=True) as scratch:
+        lp_filepath = scratch.filepath('OptStoic.lp')
+        ...
+"""
+from builtins import object
+import os
+import shutil
+import tempfile
+from optstoicpy.script.utils import create_logger
+
+SHM_ROOT = '/dev/shm'
+
+
+def scratch_root(root=None, use_shm=False, logger=None):
+    """Return the directory where the scratch directories are created.
+
+    Args:
+        root (str, optional): The directory. Default to /dev/shm if use_shm is
+            True (and available), or to the temporary directory of the system.
+        use_shm (bool, optional): If True, use /dev/shm
+        logger (:obj:`logging.logger`, optional): The logging instance
+    """
+    if root is not None:
+        return root
+    if use_shm:
+        if os.path.isdir(SHM_ROOT) and os.access(SHM_ROOT, os.W_OK):
+            return SHM_ROOT
+        if logger is None:
+            logger = create_logger('optstoic.scratch_root')
+        logger.warning("%s is not available. The scratch directories are "
+                       "created in %s.", SHM_ROOT, tempfile.gettempdir())
+    return tempfile.gettempdir()
+
+
+class ScratchDirectory(object):
+    """A directory for the files of one solve (see the module docstring)."""
+
+    def __init__(self, prefix='optstoic_', root=None, use_shm=False,
+                 logger=None):
+        """
+        Args:
+            prefix (str, optional): Prefix of the directory name
+            root (str, optional): See scratch_root
+            use_shm (bool, optional): See scratch_root
+            logger (:obj:`logging.logger`, optional): The logging instance
+        """
+        if logger is None:
+            self.logger = create_logger('optstoic.ScratchDirectory')
+        else:
+            self.logger = logger
+        root = scratch_root(root, use_shm, logger=self.logger)
+        if not os.path.exists(root):
+            os.makedirs(root)
+        self.path = tempfile.mkdtemp(prefix=prefix, dir=root)
+        self.logger.debug("Scratch directory %s created.", self.path)
+
+    def filepath(self, filename):
+        """Return the path of a file in the scratch directory."""
+        return os.path.join(self.path, filename)
+
+    @property
+    def exists(self):
+        return self.path is not None and os.path.isdir(self.path)
+
+    def cleanup(self):
+        """Remove the directory and its files."""
+        if not self.exists:
+            return
+        # The rename is atomic, the removal of the files is not
+        trash = self.path + '.trash'
+        try:
+            os.rename(self.path, trash)
+        except OSError:
+            trash = self.path
+        shutil.rmtree(trash, ignore_errors=True)
+        self.logger.debug("Scratch directory %s removed.", self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+
+    def __repr__(self):
+        return "<ScratchDirectory(path='%s')>" % self.path
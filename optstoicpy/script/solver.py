@@ -1,9 +1,22 @@
 import os
+import copy
+import shutil
+import time
+import weakref
+import concurrent.futures
+from contextlib import contextmanager
 import pulp
 from optstoicpy.script.utils import create_logger
+from optstoicpy.script.scratch import ScratchDirectory
+from optstoicpy.script.solver_backend import (
+    HIGHS_OPTIONS,
+    SOLVER_BACKENDS)
 
 ORDERED_SOLVERS = ['GUROBI', 'GUROBI_CMD', 'CPLEX_CMD', 'SCIP_CMD', 'GLPK_CMD']
 
+# Pulp solvers that can return a pool of solutions (see solve_with_solution_pool)
+POOL_SOLVERS = ['GUROBI']
+
 # TODO: Solver parameters need to be updated
 SCIP_CMD_PARAMETERS = [
     "limits/gap = 1e-6",
@@ -56,18 +69,83 @@ SOLVER_KWARGS = {
         keepFiles=False,
         msg=1,
         mip=1,
-        options=GLPK_CMD_OPTIONS)
+        options=GLPK_CMD_OPTIONS),
+    'PULP_CBC_CMD': dict(
+        solver='PULP_CBC_CMD',
+        keepFiles=False,
+        mip=True,
+        msg=False,
+        gapRel=1e-6,
+        gapAbs=1e-6)
 }
 
+# Solvers that cannot use more than one thread
+SINGLE_THREAD_SOLVERS = ['GLPK_CMD']
+
+
+def available_cores():
+    """Return the number of cores this process can run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def get_solver_kwargs(solver_name, threads=None):
+    """Return the pulp.get_solver arguments of a solver (SOLVER_KWARGS)
+    using the given number of threads.
+
+    Args:
+        solver_name (str): A key of SOLVER_KWARGS
+        threads (int, optional): Number of threads. If None, use the default
+            options.
+
+    Returns:
+        dict
+    """
+    kwargs = copy.deepcopy(SOLVER_KWARGS[solver_name])
+    if threads is None or solver_name in SINGLE_THREAD_SOLVERS:
+        return kwargs
+    if solver_name == 'GUROBI':
+        kwargs['Threads'] = threads
+    elif solver_name == 'GUROBI_CMD':
+        kwargs['options'] = [option for option in kwargs['options']
+                             if option[0] != 'Threads']
+        kwargs['options'].append(('Threads', threads))
+    elif solver_name == 'SCIP_CMD':
+        # Set in the SCIP parameter file (see load_pulp_solver)
+        pass
+    else:
+        kwargs['threads'] = threads
+    return kwargs
+
+
+def get_scip_parameters(threads=None):
+    """Return SCIP_CMD_PARAMETERS with lp/threads set to threads."""
+    if threads is None:
+        return list(SCIP_CMD_PARAMETERS)
+    return ["lp/threads = %d" % threads if p.startswith("lp/threads") else p
+            for p in SCIP_CMD_PARAMETERS]
+
 
 def load_pulp_solver(
         solver_names=ORDERED_SOLVERS,
+        threads=None,
+        tmp_dir=None,
+        use_shm=False,
         logger=None):
     """Load a pulp solver based on what is available.
 
     Args:
         solver_name (`list` of `str`, optional): A list of solver names in the order of
             loading preferences.
+        threads (int, optional): Number of threads used by the solver. If None,
+            use the default options (e.g. Threads=2 for Gurobi).
+        tmp_dir (str, optional): The directory of the solver files (and of
+            the SCIP parameter file). By default, a new ScratchDirectory is
+            created for the solver and removed with it.
+        use_shm (bool, optional): If True, create the ScratchDirectory in
+            /dev/shm
         logger (None, optional): A logging.Logger object
 
     Returns:
@@ -84,18 +162,27 @@ def load_pulp_solver(
 
     # Load solvers in the order of preferences
     for solver_name in solver_names:
-        kwargs = SOLVER_KWARGS.get(solver_name, None)
+        if solver_name not in SOLVER_KWARGS:
+            continue
+        kwargs = get_solver_kwargs(solver_name, threads=threads)
         pulp_solver = pulp.get_solver(**kwargs)
 
         if pulp_solver.available():
             logger.warning("Pulp solver set to %s." % solver_name)
 
             if hasattr(pulp_solver, 'tmpDir'):
-                pulp_solver.tmpDir = './'
+                if tmp_dir is None:
+                    scratch = ScratchDirectory(prefix='optstoic_solver_',
+                                               use_shm=use_shm,
+                                               logger=logger)
+                    weakref.finalize(pulp_solver, scratch.cleanup)
+                    tmp_dir = scratch.path
+                pulp_solver.tmpDir = tmp_dir
 
             if solver_name == 'SCIP_CMD':
                 scip_parameter_filepath = create_scip_parameter_file(
-                    parameters=SCIP_CMD_PARAMETERS, filepath=pulp_solver.tmpDir)
+                    parameters=get_scip_parameters(threads),
+                    filepath=pulp_solver.tmpDir)
                 pulp_solver.options = [
                     "-s", "{}".format(scip_parameter_filepath)]
 
@@ -124,3 +211,456 @@ def create_scip_parameter_file(parameters=SCIP_CMD_PARAMETERS, filepath="./"):
     with open(fullfilepath, "w+") as parameter_file:
         parameter_file.write("\n".join(parameters))
     return fullfilepath
+
+
+def is_command_line_solver(pulp_solver):
+    """Return True if pulp_solver is a command line solver, which writes
+    its problem and solution files to pulp_solver.tmpDir."""
+    return pulp_solver is not None and hasattr(pulp_solver, 'tmpDir')
+
+
+@contextmanager
+def solver_scratch_directory(pulp_solver, scratch):
+    """Context manager that writes the files of a command line pulp solver
+    (and its SCIP parameter file) in a scratch directory.
+
+    Args:
+        pulp_solver (pulp.apis.core.LpSolver): The solver (unchanged if it
+            is not a command line solver)
+        scratch (:obj:`ScratchDirectory`): The scratch directory
+    """
+    if not is_command_line_solver(pulp_solver):
+        yield pulp_solver
+        return
+    tmp_dir, options = pulp_solver.tmpDir, pulp_solver.options
+    pulp_solver.tmpDir = scratch.path
+    if (pulp_solver.name == 'SCIP_CMD' and len(options) == 2 and
+            options[0] == '-s' and os.path.exists(options[1])):
+        pulp_solver.options = [
+            '-s', shutil.copy(options[1], scratch.filepath(
+                os.path.basename(options[1])))]
+    try:
+        yield pulp_solver
+    finally:
+        pulp_solver.tmpDir, pulp_solver.options = tmp_dir, options
+
+
+@contextmanager
+def solver_warm_start(pulp_solver, warm_start=True):
+    """Context manager that turns on the warmStart option of a pulp solver
+    (the initial values of the variables are passed to the solver as a MIP
+    start). The solvers without MIP start support ignore it.
+
+    Args:
+        pulp_solver (pulp.apis.core.LpSolver): The solver
+        warm_start (bool, optional): If False, the solver is unchanged
+    """
+    if pulp_solver is None or not warm_start:
+        yield pulp_solver
+        return
+    previous = pulp_solver.optionsDict.get('warmStart')
+    pulp_solver.optionsDict['warmStart'] = True
+    try:
+        yield pulp_solver
+    finally:
+        if previous is None:
+            del pulp_solver.optionsDict['warmStart']
+        else:
+            pulp_solver.optionsDict['warmStart'] = previous
+
+
+def supports_solution_pool(pulp_solver):
+    """Return True if the pulp solver can return a pool of solutions."""
+    return pulp_solver is not None and pulp_solver.name in POOL_SOLVERS
+
+
+def solve_with_solution_pool(lp_prob, pulp_solver, pool_size, logger=None):
+    """Solve a MILP and return the best pool_size solutions found by the
+    solver in one solve (Gurobi PoolSearchMode=2).
+
+    Args:
+        lp_prob (pulp.LpProblem): The problem
+        pulp_solver (pulp.apis.core.LpSolver): A pulp solver that supports
+            solution pools (see POOL_SOLVERS)
+        pool_size (int): The maximum number of solutions
+        logger (None, optional): A logging.Logger object
+
+    Returns:
+        tuple: (status, solutions) where status is a pulp.LpStatus string
+            and solutions is a list of (objective value, {variable name: value})
+            sorted from the best objective value. The pulp variables hold the
+            values of the best solution.
+
+    Raises:
+        ValueError: If the solver does not support solution pools.
+    """
+    if logger is None:
+        logger = create_logger('optstoic.solve_with_solution_pool')
+
+    if not supports_solution_pool(pulp_solver):
+        raise ValueError("Solver %s does not support solution pools."
+                         % getattr(pulp_solver, 'name', pulp_solver))
+
+    # Same steps as pulp_solver.actualSolve, with the pool parameters
+    pulp_solver.buildSolverModel(lp_prob)
+    model = lp_prob.solverModel
+    model.setParam('PoolSearchMode', 2)
+    model.setParam('PoolSolutions', pool_size)
+    pulp_solver.callSolver(lp_prob)
+    status = pulp.LpStatus[pulp_solver.findSolutionValues(lp_prob)]
+
+    solutions = []
+    if status == 'Optimal':
+        solver_vars = model.getVars()
+        for k in range(model.SolCount):
+            model.setParam('SolutionNumber', k)
+            values = model.getAttr('Xn', solver_vars)
+            solutions.append(
+                (model.PoolObjVal,
+                 dict((var.name, value)
+                      for var, value in zip(lp_prob.variables(), values))))
+        solutions.sort(key=lambda solution: solution[0] * lp_prob.sense)
+        logger.debug("%d solutions in the solution pool.", len(solutions))
+    return status, solutions
+
+
+def solver_available(solver_name):
+    """Return True if a pulp solver (SOLVER_KWARGS) or a persistent solver
+    backend (SOLVER_BACKENDS) is available."""
+    if solver_name in SOLVER_BACKENDS:
+        return SOLVER_BACKENDS[solver_name].available()
+    if solver_name not in SOLVER_KWARGS:
+        return False
+    return pulp.get_solver(**SOLVER_KWARGS[solver_name]).available()
+
+
+def _run_solver_job(model, solver_name, threads, solve_kwargs):
+    """Solve an OptStoic problem with a solver and a number of threads
+    (in a worker process of SolverScheduler)."""
+    solve_kwargs = dict(solve_kwargs)
+    if solver_name in SOLVER_BACKENDS:
+        options = None
+        if solver_name == 'HiGHS':
+            options = dict(HIGHS_OPTIONS, threads=threads)
+        solve_kwargs['backend'] = SOLVER_BACKENDS[solver_name](
+            options=options, logger=model.logger)
+    else:
+        model.pulp_solver = load_pulp_solver(
+            solver_names=[solver_name], threads=threads, logger=model.logger)
+    _, pathways = model.solve(**solve_kwargs)
+    return pathways
+
+
+class SolverJob(object):
+    """An OptStoic problem queued in a SolverScheduler."""
+
+    def __init__(self, job_id, model, solve_kwargs=None, solver_names=None,
+                 min_threads=1, max_threads=None, name=None):
+        """
+        Args:
+            job_id (int): Index of the job in the scheduler
+            model (:obj:`OptStoic`): The problem
+            solve_kwargs (dict, optional): Arguments of model.solve()
+            solver_names (list, optional): The solvers that can be used, in
+                the order of preference (pulp solver names or backend names,
+                e.g. 'HiGHS')
+            min_threads (int, optional): Minimum number of threads
+            max_threads (int, optional): Maximum number of threads
+            name (str, optional): Name of the job
+        """
+        self.id = job_id
+        self.name = name or 'job_%d' % job_id
+        self.model = model
+        self.solve_kwargs = solve_kwargs or {}
+        self.solver_names = solver_names
+        self.min_threads = min_threads
+        self.max_threads = max_threads
+
+        self.status = 'queued'
+        self.solver_name = None
+        self.threads = None
+        self.submit_time = time.time()
+        self.start_time = None
+        self.end_time = None
+        self.pathways = None
+        self.error = None
+
+    @property
+    def queue_time(self):
+        if self.start_time is None:
+            return time.time() - self.submit_time
+        return self.start_time - self.submit_time
+
+    @property
+    def run_time(self):
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.time()) - self.start_time
+
+    def __repr__(self):
+        return "<SolverJob(name='%s', status='%s', solver='%s', threads='%s')>" % (
+            self.name, self.status, self.solver_name, self.threads)
+
+
+class SolverScheduler(object):
+    """Run queued OptStoic problems in a pool of solver processes.
+
+    Each job is started with the first solver of its list that is available
+    and has a free license, and with a share of the free cores: the free
+    cores are divided among the jobs that can start now, so that the
+    machine is neither oversubscribed (the threads of the running jobs never
+    exceed num_cores) nor idle when only a few jobs are left.
+
+    Usage:
+        scheduler = SolverScheduler(licenses={'GUROBI': 4})
+        for model in models:
+            scheduler.submit(model, solver_names=['GUROBI', 'HiGHS'])
+        jobs = scheduler.run()
+        scheduler.metrics()
+    """
+
+    def __init__(self,
+                 num_cores=None,
+                 licenses=None,
+                 max_workers=None,
+                 min_threads=1,
+                 max_threads=None,
+                 solver_names=ORDERED_SOLVERS,
+                 logger=None):
+        """
+        Args:
+            num_cores (int, optional): Number of cores used by the solvers.
+                Default to the number of cores of the machine.
+            licenses (dict, optional): {solver name: number of licenses}. The
+                solvers that are not listed are not limited.
+            max_workers (int, optional): Maximum number of concurrent jobs
+                (default to num_cores // min_threads)
+            min_threads (int, optional): Default minimum number of threads
+                per job
+            max_threads (int, optional): Default maximum number of threads
+                per job
+            solver_names (list, optional): Default solvers of the jobs
+            logger (:obj:`logging.logger`, optional): The logging instance
+        """
+        if logger is None:
+            self.logger = create_logger('optstoic.SolverScheduler')
+        else:
+            self.logger = logger
+
+        self.num_cores = num_cores or available_cores()
+        self.licenses = dict(licenses or {})
+        self.min_threads = min_threads
+        self.max_threads = max_threads
+        self.max_workers = max_workers or max(1, self.num_cores // min_threads)
+        self.solver_names = solver_names
+
+        self.jobs = []
+        self.queue = []
+        self.running = {}
+        self._available = {}
+        self._start_time = None
+        self._end_time = None
+        self._max_queue_length = 0
+
+    def submit(self, model, solve_kwargs=None, solver_names=None,
+               min_threads=None, max_threads=None, name=None):
+        """Queue an OptStoic problem.
+
+        Args:
+            model (:obj:`OptStoic`): The problem
+            solve_kwargs (dict, optional): Arguments of model.solve()
+            solver_names (list, optional): See SolverJob
+            min_threads (int, optional): See SolverJob
+            max_threads (int, optional): See SolverJob
+            name (str, optional): Name of the job
+
+        Returns:
+            :obj:`SolverJob`
+        """
+        job = SolverJob(len(self.jobs), model,
+                        solve_kwargs=solve_kwargs,
+                        solver_names=solver_names or self.solver_names,
+                        min_threads=min_threads or self.min_threads,
+                        max_threads=max_threads or self.max_threads,
+                        name=name)
+        self.jobs.append(job)
+        self.queue.append(job)
+        self._max_queue_length = max(self._max_queue_length, len(self.queue))
+        return job
+
+    @property
+    def used_threads(self):
+        return sum(job.threads for job in self.running.values())
+
+    def _is_available(self, solver_name):
+        if solver_name not in self._available:
+            self._available[solver_name] = solver_available(solver_name)
+            if not self._available[solver_name]:
+                self.logger.warning("Solver %s is not available.", solver_name)
+        return self._available[solver_name]
+
+    def _free_licenses(self):
+        """Return {solver name: number of free licenses} of the limited
+        solvers."""
+        free = dict(self.licenses)
+        for job in self.running.values():
+            if job.solver_name in free:
+                free[job.solver_name] -= 1
+        return free
+
+    def _select_solver(self, job, free_licenses):
+        """Return the first available solver of the job with a free license
+        (None if there is none)."""
+        for solver_name in job.solver_names:
+            if not self._is_available(solver_name):
+                continue
+            if free_licenses.get(solver_name, 1) > 0:
+                return solver_name
+        return None
+
+    def _num_startable(self):
+        """Return the number of queued jobs that can start now, given the
+        free licenses and max_workers."""
+        free_licenses = self._free_licenses()
+        count = 0
+        for job in self.queue:
+            if len(self.running) + count >= self.max_workers:
+                break
+            solver_name = self._select_solver(job, free_licenses)
+            if solver_name is None:
+                continue
+            if solver_name in free_licenses:
+                free_licenses[solver_name] -= 1
+            count += 1
+        return count
+
+    def allocate_threads(self, job, solver_name, num_candidates):
+        """Return the number of threads of a job that starts now, or None if
+        there are not enough free cores.
+
+        Args:
+            job (:obj:`SolverJob`): The job
+            solver_name (str): The solver of the job
+            num_candidates (int): Number of jobs that can start now (the free
+                cores are divided among them)
+        """
+        if solver_name in SINGLE_THREAD_SOLVERS:
+            threads = 1
+        else:
+            free_cores = self.num_cores - self.used_threads
+            threads = free_cores // max(1, num_candidates)
+            if job.max_threads is not None:
+                threads = min(threads, job.max_threads)
+            threads = max(threads, job.min_threads)
+        if not self.running:
+            # Always start a job when nothing is running
+            return max(1, min(threads, self.num_cores))
+        if self.used_threads + threads > self.num_cores:
+            return None
+        return threads
+
+    def _start_jobs(self, executor):
+        for job in list(self.queue):
+            if len(self.running) >= self.max_workers:
+                break
+            solver_name = self._select_solver(job, self._free_licenses())
+            if solver_name is None:
+                continue
+            threads = self.allocate_threads(job, solver_name,
+                                            self._num_startable())
+            if threads is None:
+                break
+
+            job.solver_name = solver_name
+            job.threads = threads
+            job.status = 'running'
+            job.start_time = time.time()
+            self.queue.remove(job)
+            future = executor.submit(_run_solver_job, job.model, solver_name,
+                                     threads, job.solve_kwargs)
+            self.running[future] = job
+            self.logger.info("Started %s with %s (%d threads); %d queued.",
+                             job.name, solver_name, threads, len(self.queue))
+
+        if self.queue and not self.running:
+            # No solver is available for the remaining jobs
+            for job in self.queue:
+                job.status = 'failed'
+                job.error = 'No solver is available.'
+                self.logger.error("%s: no solver is available.", job.name)
+            self.queue = []
+
+    def run(self):
+        """Run the queued jobs and wait until they are done.
+
+        Returns:
+            list: All the jobs (SolverJob) submitted to the scheduler
+        """
+        self._start_time = time.time()
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.max_workers)
+        try:
+            self._start_jobs(executor)
+            while self.running:
+                done, _ = concurrent.futures.wait(
+                    list(self.running),
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    job = self.running.pop(future)
+                    job.end_time = time.time()
+                    try:
+                        job.pathways = future.result()
+                        job.status = 'done'
+                    except Exception as e:
+                        job.status = 'failed'
+                        job.error = str(e)
+                        self.logger.error("%s failed: %s", job.name, e)
+                    self.logger.info("Finished %s in %.3f seconds.",
+                                     job.name, job.run_time)
+                self._start_jobs(executor)
+        finally:
+            executor.shutdown(wait=True)
+            self._end_time = time.time()
+        self.logger.info("Scheduler metrics: %s", self.metrics())
+        return self.jobs
+
+    def metrics(self):
+        """Return the queue and utilization metrics.
+
+        Returns:
+            dict: The number of jobs by status, the wall time, the core-seconds
+                used by the solvers, the utilization of the cores (core-seconds
+                / (num_cores * wall time)), the mean and maximum queue times,
+                the maximum queue length and the number of jobs by solver.
+        """
+        if self._start_time is None:
+            wall_time = 0.0
+        else:
+            wall_time = (self._end_time or time.time()) - self._start_time
+        started = [job for job in self.jobs if job.start_time is not None]
+        core_seconds = sum(job.threads * job.run_time for job in started)
+        queue_times = [job.queue_time for job in self.jobs]
+        solver_jobs = {}
+        for job in started:
+            solver_jobs[job.solver_name] = solver_jobs.get(
+                job.solver_name, 0) + 1
+        return dict(
+            queued=len(self.queue),
+            running=len(self.running),
+            done=sum(1 for job in self.jobs if job.status == 'done'),
+            failed=sum(1 for job in self.jobs if job.status == 'failed'),
+            num_cores=self.num_cores,
+            used_threads=self.used_threads,
+            wall_time=wall_time,
+            core_seconds=core_seconds,
+            utilization=(core_seconds / (self.num_cores * wall_time)
+                         if wall_time > 0 else 0.0),
+            mean_queue_time=(sum(queue_times) / len(queue_times)
+                             if queue_times else 0.0),
+            max_queue_time=max(queue_times) if queue_times else 0.0,
+            max_queue_length=self._max_queue_length,
+            solver_jobs=solver_jobs)
+
+    def __repr__(self):
+        return "<SolverScheduler(cores='%s', queued='%s', running='%s')>" % (
+            self.num_cores, len(self.queue), len(self.running))
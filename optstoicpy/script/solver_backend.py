@@ -0,0 +1,292 @@
+"""
+Persistent solver backends.
+
+PuLP re-exports the whole problem every time lp_prob.solve() is called.
+A solver backend keeps the problem in the solver's native API instead, so
+that OptStoic can build the model once and append integer cuts in place
+between iterations.
+
+Usage:
+    backend = load_solver_backend(['HiGHS'])
+    backend.load(MatrixModel.from_pulp(lp_prob))
+    status = backend.solve()
+    values = backend.get_values()
+    backend.add_row('IntegerCut_1', {'yf_R00200': -1.0, ...}, lower=0)
+"""
+from builtins import object
+import os
+import threading
+import numpy as np
+from optstoicpy.script.utils import create_logger
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+ORDERED_BACKENDS = ['HiGHS']
+
+HIGHS_OPTIONS = {
+    'threads': 2,
+    'time_limit': 1800.0,
+    'mip_rel_gap': 1e-6,
+    'mip_abs_gap': 1e-6,
+    'output_flag': False}
+
+
+class _HighsScheduler(object):
+    """Track the thread pool (scheduler) of HiGHS, which is shared by all
+    the Highs instances of a process.
+
+    The scheduler keeps the number of threads of the run that started it, and
+    a run with another number of threads fails. A run with a new number of
+    threads waits until no other run is active, then resets the scheduler.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.threads = None
+        self.num_active = 0
+
+    def acquire(self, threads):
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.num_active == 0 or self.threads == threads)
+            if self.threads != threads:
+                highspy.Highs.resetGlobalScheduler(True)
+                self.threads = threads
+            self.num_active += 1
+
+    def release(self):
+        with self.condition:
+            self.num_active -= 1
+            self.condition.notify_all()
+
+    def reset_after_fork(self):
+        # A forked process has no copy of the threads of the scheduler (a run
+        # would hang): the next run resets it
+        self.condition = threading.Condition()
+        self.threads = None
+        self.num_active = 0
+
+
+_HIGHS_SCHEDULER = _HighsScheduler()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_HIGHS_SCHEDULER.reset_after_fork)
+
+
+class BaseSolverBackend(object):
+    """The interface of a persistent solver backend.
+
+    The status returned by solve() uses the same strings as pulp.LpStatus
+    ('Optimal', 'Infeasible', 'Unbounded', 'Not Solved', 'Undefined').
+    """
+    name = 'Base'
+    # True if load() accepts a MatrixModel with indicator constraints
+    supports_indicator_constraints = False
+
+    def __init__(self, options=None, logger=None):
+        if logger is None:
+            self.logger = create_logger('optstoic.SolverBackend')
+        else:
+            self.logger = logger
+        self.options = options
+        self.model = None
+
+    @classmethod
+    def available(cls):
+        return False
+
+    def load(self, model):
+        """Load a MatrixModel into the solver.
+
+        Args:
+            model (:obj:`MatrixModel`): The problem in matrix form
+        """
+        raise NotImplementedError
+
+    def add_row(self, name, coefficients, lower, upper):
+        """Append a constraint to the loaded problem without rebuilding it.
+
+        Args:
+            name (str): Name of the constraint
+            coefficients (dict): {variable name: coefficient}
+            lower (float): Lower bound of the constraint (-inf if none)
+            upper (float): Upper bound of the constraint (inf if none)
+        """
+        raise NotImplementedError
+
+    def set_objective(self, coefficients, sense):
+        """Replace the objective function of the loaded problem.
+
+        Args:
+            coefficients (dict): {variable name: coefficient}
+            sense (int): pulp.LpMinimize (1) or pulp.LpMaximize (-1)
+        """
+        raise NotImplementedError
+
+    def solve(self):
+        """Solve the loaded problem and return the status."""
+        raise NotImplementedError
+
+    def set_solution(self, values):
+        """Set a (partial) starting solution for the next solve (MIP start).
+
+        Args:
+            values (dict): {variable name: value}. The variables that are not
+                in the model are ignored.
+        """
+        self.logger.warning("%s does not support MIP starts.", self.name)
+
+    def get_values(self):
+        """Return the variable values (numpy.ndarray in column order)."""
+        raise NotImplementedError
+
+    def get_objective_value(self):
+        raise NotImplementedError
+
+    def get_values_dict(self):
+        """Return the variable values as {variable name: value}."""
+        return self.model.values_to_dict(self.get_values())
+
+    def __repr__(self):
+        return "<%s>" % self.__class__.__name__
+
+
+class HighsBackend(BaseSolverBackend):
+    """Persistent backend using the HiGHS Python bindings (highspy)."""
+    name = 'HiGHS'
+
+    STATUS = {
+        'kOptimal': 'Optimal',
+        'kInfeasible': 'Infeasible',
+        'kUnbounded': 'Unbounded',
+        'kUnboundedOrInfeasible': 'Infeasible'}
+
+    def __init__(self, options=None, logger=None):
+        if options is None:
+            options = dict(HIGHS_OPTIONS)
+        super(HighsBackend, self).__init__(options=options, logger=logger)
+        self._highs = None
+
+    @classmethod
+    def available(cls):
+        return highspy is not None
+
+    def load(self, model):
+        if model.indicators:
+            raise ValueError("HiGHS does not support indicator constraints.")
+        h = highspy.Highs()
+        for key, value in self.options.items():
+            h.setOptionValue(key, value)
+
+        inf = highspy.kHighsInf
+        lp = highspy.HighsLp()
+        lp.num_col_ = model.num_cols
+        lp.num_row_ = model.num_rows
+        lp.col_cost_ = model.col_cost
+        lp.col_lower_ = np.clip(model.col_lower, -inf, inf)
+        lp.col_upper_ = np.clip(model.col_upper, -inf, inf)
+        lp.row_lower_ = np.clip(model.row_lower, -inf, inf)
+        lp.row_upper_ = np.clip(model.row_upper, -inf, inf)
+        lp.sense_ = (highspy.ObjSense.kMinimize if model.sense == 1
+                     else highspy.ObjSense.kMaximize)
+        lp.integrality_ = [highspy.HighsVarType.kInteger if is_int
+                           else highspy.HighsVarType.kContinuous
+                           for is_int in model.col_integer]
+        A = model.A.tocsc()
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.start_ = A.indptr
+        lp.a_matrix_.index_ = A.indices
+        lp.a_matrix_.value_ = A.data
+        h.passModel(lp)
+
+        self._highs = h
+        self.model = model
+        self.logger.debug("%s backend loaded with %d rows and %d columns.",
+                          self.name, model.num_rows, model.num_cols)
+
+    def add_row(self, name, coefficients, lower, upper):
+        inf = highspy.kHighsInf
+        cols, vals = self.model.add_row(name, coefficients, lower, upper)
+        self._highs.addRow(max(lower, -inf), min(upper, inf),
+                           len(cols), cols, vals)
+
+    def set_objective(self, coefficients, sense):
+        self.model.set_objective(coefficients, sense)
+        num_cols = self.model.num_cols
+        self._highs.changeColsCost(num_cols,
+                                   np.arange(num_cols, dtype=np.int32),
+                                   self.model.col_cost)
+        self._highs.changeObjectiveSense(
+            highspy.ObjSense.kMinimize if sense == 1
+            else highspy.ObjSense.kMaximize)
+
+    def solve(self):
+        # 0 is the default of HiGHS (half of the cores)
+        threads = self.options.get('threads', 0)
+        _HIGHS_SCHEDULER.acquire(threads)
+        try:
+            run_status = self._highs.run()
+        finally:
+            _HIGHS_SCHEDULER.release()
+        if run_status == highspy.HighsStatus.kError:
+            self.logger.error("%s failed to solve the problem.", self.name)
+        status = self._highs.getModelStatus()
+        return self.STATUS.get(status.name, 'Not Solved')
+
+    def set_solution(self, values):
+        col_index = self.model.col_index
+        entries = sorted((col_index[name], value)
+                         for name, value in values.items()
+                         if name in col_index and value is not None)
+        if not entries:
+            return
+        index, value = zip(*entries)
+        self._highs.setSolution(len(index),
+                                np.array(index, dtype=np.int32),
+                                np.array(value, dtype=np.float64))
+
+    def get_values(self):
+        return np.array(self._highs.getSolution().col_value)
+
+    def get_objective_value(self):
+        return self._highs.getInfo().objective_function_value
+
+
+SOLVER_BACKENDS = {
+    'HiGHS': HighsBackend}
+
+
+def load_solver_backend(
+        backend_names=ORDERED_BACKENDS,
+        options=None,
+        logger=None):
+    """Load a persistent solver backend based on what is available.
+
+    Args:
+        backend_names (`list` of `str`, optional): A list of backend names in the
+            order of loading preferences.
+        options (dict, optional): Solver options passed to the backend.
+        logger (None, optional): A logging.Logger object
+
+    Returns:
+        BaseSolverBackend: A solver backend instance (None if not available).
+    """
+    if logger is None:
+        logger = create_logger('optstoic.load_solver_backend')
+
+    if isinstance(backend_names, str):
+        backend_names = [backend_names]
+
+    elif not isinstance(backend_names, list):
+        raise Exception("Argument backend_names must be a list!")
+
+    for backend_name in backend_names:
+        backend_class = SOLVER_BACKENDS.get(backend_name, None)
+        if backend_class is not None and backend_class.available():
+            logger.warning("Solver backend set to %s." % backend_name)
+            return backend_class(options=options, logger=logger)
+
+    logger.warning("No solver backend is available!")
+    return None
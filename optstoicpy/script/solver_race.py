@@ -0,0 +1,289 @@
+"""
+Race several solver configurations on the same MILP.
+
+The solve times of the OptStoic MILPs vary a lot between solvers (and
+between the parameter settings of a solver). A SolverRace starts the
+problem on several configurations in parallel processes, takes the first
+proven answer (optimal, infeasible or unbounded) and kills the other
+processes (with the solver subprocesses they started). The winning
+configuration is recorded for each kind of problem (see problem_key), so
+later runs can use it directly.
+
+SolverRace is a pulp solver, so it can be used anywhere a pulp_solver is
+expected:
+
+Usage:
+    race = SolverRace(configs=[
+        dict(name='CBC', solver='PULP_CBC_CMD'),
+        dict(name='CBC_no_cuts', solver='PULP_CBC_CMD',
+             kwargs=dict(options=['cuts off'])),
+        dict(name='SCIP', solver='SCIP_CMD')],
+        history_filepath='race_history.json')
+    model = OptStoic(..., pulp_solver=race)
+    model.solve()
+    race.best_config(race.last_key)  # e.g. 'CBC'
+"""
+from builtins import object
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import time
+import pulp
+from optstoicpy.script.utils import create_logger
+from optstoicpy.script.scratch import ScratchDirectory
+from optstoicpy.script.solver import (
+    ORDERED_SOLVERS,
+    SOLVER_KWARGS,
+    create_scip_parameter_file,
+    get_scip_parameters,
+    get_solver_kwargs)
+
+# pulp statuses that are proven by the solver
+PROVEN_STATUSES = [pulp.LpStatusInfeasible, pulp.LpStatusUnbounded]
+
+
+def default_race_configs(solver_names=ORDERED_SOLVERS + ['PULP_CBC_CMD']):
+    """Return one configuration (with the default options) per available
+    solver."""
+    configs = []
+    for solver_name in solver_names:
+        if solver_name not in SOLVER_KWARGS:
+            continue
+        if pulp.get_solver(**SOLVER_KWARGS[solver_name]).available():
+            configs.append(dict(name=solver_name, solver=solver_name))
+    return configs
+
+
+def problem_key(lp_prob):
+    """Return the key of a problem in the race history: its name and number
+    of variables (the cuts added between the iterations of OptStoic do not
+    change it)."""
+    return '%s_%d' % (lp_prob.name, len(lp_prob.variables()))
+
+
+def create_race_solver(config, tmpdir=None):
+    """Return the pulp solver of a race configuration.
+
+    Args:
+        config (dict): The configuration: {'name': ..., 'solver': a key of
+            SOLVER_KWARGS, 'threads': number of threads (optional), 'kwargs':
+            arguments of pulp.get_solver that replace the defaults (optional)}
+        tmpdir (str, optional): The directory of the solver files
+
+    Returns:
+        pulp.apis.core.LpSolver
+    """
+    kwargs = get_solver_kwargs(config['solver'], threads=config.get('threads'))
+    kwargs.update(config.get('kwargs', {}))
+    pulp_solver = pulp.get_solver(**kwargs)
+    if tmpdir is not None and hasattr(pulp_solver, 'tmpDir'):
+        pulp_solver.tmpDir = tmpdir
+    if config['solver'] == 'SCIP_CMD':
+        scip_parameter_filepath = create_scip_parameter_file(
+            parameters=get_scip_parameters(config.get('threads')),
+            filepath=tmpdir or './')
+        pulp_solver.options = ["-s", scip_parameter_filepath]
+    return pulp_solver
+
+
+def _race_worker(config, problem, tmpdir, result_queue):
+    """Solve the problem with one configuration (in a child process)."""
+    if hasattr(os, 'setsid'):
+        # Own process group, so that the solver subprocesses are killed with
+        # the worker
+        os.setsid()
+    start = time.time()
+    try:
+        _, lp_prob = pulp.LpProblem.fromDict(problem)
+        lp_prob.solve(create_race_solver(config, tmpdir))
+        values = dict((var.name, var.varValue)
+                      for var in lp_prob.variables())
+        result_queue.put((config['name'], lp_prob.status, lp_prob.sol_status,
+                          values, time.time() - start, None))
+    except Exception as e:
+        result_queue.put((config['name'], pulp.LpStatusUndefined,
+                          pulp.LpSolutionNoSolutionFound, None,
+                          time.time() - start, str(e)))
+
+
+def _kill(process):
+    if process.is_alive():
+        if hasattr(os, 'killpg'):
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                process.kill()
+        else:
+            process.kill()
+    process.join()
+
+
+class SolverRace(pulp.LpSolver):
+    """A pulp solver that races several solver configurations (see the
+    module docstring)."""
+
+    name = 'SolverRace'
+
+    def __init__(self,
+                 configs=None,
+                 time_limit=None,
+                 history_filepath=None,
+                 use_history=False,
+                 min_wins=3,
+                 use_shm=False,
+                 logger=None,
+                 **kwargs):
+        """
+        Args:
+            configs (list, optional): The configurations (see
+                create_race_solver). Default to default_race_configs().
+            time_limit (float, optional): Maximum time of a race (seconds)
+            history_filepath (str, optional): A json file where the number of
+                wins of each configuration is stored for each problem key
+            use_history (bool, optional): If True, a configuration that won
+                at least min_wins races of a problem key solves the next
+                problems with this key alone.
+            min_wins (int, optional): See use_history
+            use_shm (bool, optional): If True, the solver files of each
+                configuration are written in a scratch directory in /dev/shm
+            logger (:obj:`logging.logger`, optional): The logging instance
+            **kwargs: Arguments of pulp.LpSolver
+        """
+        super(SolverRace, self).__init__(**kwargs)
+        if logger is None:
+            self.logger = create_logger('optstoic.SolverRace')
+        else:
+            self.logger = logger
+
+        if configs is None:
+            configs = default_race_configs()
+        names = [config['name'] for config in configs]
+        if len(set(names)) != len(names):
+            raise ValueError("The names of the configurations must be unique.")
+        self.configs = configs
+        self.time_limit = time_limit
+        self.history_filepath = history_filepath
+        self.use_history = use_history
+        self.min_wins = min_wins
+        self.use_shm = use_shm
+
+        # {problem key: {configuration name: {'wins': ..., 'time': [...]}}}
+        self.history = {}
+        if history_filepath is not None and os.path.exists(history_filepath):
+            with open(history_filepath, 'r') as f:
+                self.history = json.load(f)
+        self.last_key = None
+        # {configuration name: (status, solve time)} of the last race
+        self.last_race = {}
+
+    def available(self):
+        return any(pulp.get_solver(**SOLVER_KWARGS[config['solver']])
+                   .available() for config in self.configs
+                   if config['solver'] in SOLVER_KWARGS)
+
+    def best_config(self, key):
+        """Return the name of the configuration with the most wins for a
+        problem key (None if no race was run)."""
+        records = self.history.get(key)
+        if not records:
+            return None
+        return max(sorted(records), key=lambda name: records[name]['wins'])
+
+    def record(self, key, name, solve_time):
+        records = self.history.setdefault(key, {})
+        record = records.setdefault(name, dict(wins=0, time=[]))
+        record['wins'] += 1
+        record['time'].append(solve_time)
+        if self.history_filepath is not None:
+            with open(self.history_filepath, 'w') as f:
+                json.dump(self.history, f, sort_keys=True, indent=4)
+
+    def actualSolve(self, lp):
+        """Solve the problem with the first configuration that proves
+        its answer."""
+        key = problem_key(lp)
+        self.last_key = key
+        configs = self.configs
+        best = self.best_config(key)
+        if (self.use_history and best is not None and
+                self.history[key][best]['wins'] >= self.min_wins):
+            self.logger.info("Using %s (won %d races).",
+                             best, self.history[key][best]['wins'])
+            configs = [config for config in self.configs
+                       if config['name'] == best] or configs
+
+        result_queue = multiprocessing.Queue()
+        problem = lp.toDict()
+        processes = {}
+        scratches = []
+        for config in configs:
+            scratch = ScratchDirectory(prefix='optstoic_race_',
+                                       use_shm=self.use_shm,
+                                       logger=self.logger)
+            scratches.append(scratch)
+            process = multiprocessing.Process(
+                target=_race_worker,
+                args=(config, problem, scratch.path, result_queue))
+            process.start()
+            processes[config['name']] = process
+
+        self.last_race = {}
+        winner = None
+        fallback = None
+        start = time.time()
+        try:
+            while len(self.last_race) < len(processes):
+                if (self.time_limit is not None and
+                        time.time() - start > self.time_limit):
+                    self.logger.warning("Time limit of the race reached.")
+                    break
+                try:
+                    result = result_queue.get(timeout=0.1)
+                except queue.Empty:
+                    for name, process in processes.items():
+                        if (name not in self.last_race and
+                                not process.is_alive() and
+                                result_queue.empty()):
+                            # Died without a result
+                            self.last_race[name] = ('Error', None)
+                    continue
+                name, status, sol_status, values, solve_time, error = result
+                self.last_race[name] = (pulp.LpStatus[status], solve_time)
+                if error is not None:
+                    self.logger.warning("%s failed: %s", name, error)
+                    continue
+                self.logger.debug("%s: %s in %.3f seconds.", name,
+                                  pulp.LpStatus[status], solve_time)
+                if (sol_status == pulp.LpSolutionOptimal or
+                        status in PROVEN_STATUSES):
+                    winner = result
+                    break
+                if fallback is None and values is not None:
+                    fallback = result
+        finally:
+            for process in processes.values():
+                _kill(process)
+            result_queue.close()
+            for scratch in scratches:
+                scratch.cleanup()
+
+        if winner is None:
+            if fallback is None:
+                lp.assignStatus(pulp.LpStatusNotSolved)
+                return lp.status
+            winner = fallback
+        else:
+            self.logger.info("%s won the race in %.3f seconds.",
+                             winner[0], winner[4])
+            self.record(key, winner[0], winner[4])
+
+        name, status, sol_status, values, _, _ = winner
+        lp.assignVarsVals(values)
+        lp.assignStatus(status, sol_status)
+        return status
+
+    def __repr__(self):
+        return "<SolverRace(configs='%s')>" % (
+            [config['name'] for config in self.configs])
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import shutil
+import sys
+import pulp
+from optstoicpy.script.async_solver import (
+    GurobiClRun,
+    SolverLimiter,
+    gurobi_cl_status,
+    run_solver_command,
+    set_gurobi_option)
+from optstoicpy.test.fixtures import (
+    create_fake_gurobi_cl,
+    ToyTestCase)
+
+
+class TestAsyncSolver(ToyTestCase):
+    def test_run_solver_command(self):
+        lines = []
+        command = [sys.executable, '-c',
+                   'import sys; print("a"); print("b", file=sys.stderr); '
+                   'print("c"); sys.exit(3)']
+        returncode, stdout, stderr = asyncio.run(run_solver_command(
+            command, line_callback=lambda stream, line:
+                lines.append((stream, line))))
+        self.assertEqual(returncode, 3)
+        self.assertEqual(stdout, ['a', 'c'])
+        self.assertEqual(stderr, ['b'])
+        self.assertIn(('stderr', 'b'), lines)
+
+    def test_stop_event(self):
+        command = [sys.executable, '-c',
+                   'import time\n'
+                   'for i in range(100):\n'
+                   '    print(i, flush=True)\n'
+                   '    time.sleep(0.05)']
+
+        async def main():
+            stop_event = asyncio.Event()
+
+            def line_callback(stream, line):
+                if line == '3':
+                    stop_event.set()
+
+            return await run_solver_command(
+                command, line_callback=line_callback, stop_event=stop_event)
+
+        returncode, stdout, _ = asyncio.run(main())
+        self.assertNotEqual(returncode, 0)
+        self.assertLess(len(stdout), 10)
+
+    def test_gurobi_cl_progress(self):
+        create_fake_gurobi_cl(self.tmpdir, delay=0.1)
+        path = os.environ['PATH']
+        os.environ['PATH'] = self.tmpdir + os.pathsep + path
+        try:
+            async def main(**kwargs):
+                run = GurobiClRun(os.path.join(self.tmpdir, 'OptStoic'),
+                                  **kwargs)
+                events = [event async for event in run]
+                return run.result, events
+
+            result, events = asyncio.run(main())
+            self.assertEqual(result, ('Optimal', None))
+            self.assertEqual(len(events), 7)
+
+            result, events = asyncio.run(main(gap_target=0.2))
+            self.assertEqual(result[0], 'Interrupted')
+            self.assertEqual([event.incumbent for event in events],
+                             [40, 40, 20, 12, 12])
+
+            result, events = asyncio.run(main(time_target=0.3))
+            self.assertEqual(result[0], 'Interrupted')
+            self.assertLess(len(events), 7)
+        finally:
+            os.environ['PATH'] = path
+
+    def test_solver_limiter(self):
+        limiter = SolverLimiter(max_solves=3, max_threads=4)
+        running = []
+        peak = {'solves': 0, 'threads': 0}
+
+        async def job(threads):
+            async with limiter.slot(threads):
+                running.append(threads)
+                peak['solves'] = max(peak['solves'], len(running))
+                peak['threads'] = max(peak['threads'], sum(running))
+                await asyncio.sleep(0.01)
+                running.remove(threads)
+
+        async def main():
+            await asyncio.gather(*[job(threads)
+                                   for threads in [2, 2, 1, 1, 1, 3, 8]])
+
+        asyncio.run(main())
+        self.assertLessEqual(peak['solves'], 3)
+        # The job with 8 threads runs alone
+        self.assertEqual(peak['threads'], 8)
+        self.assertEqual(limiter.num_solves, 0)
+        self.assertEqual(limiter.num_threads, 0)
+
+    def test_gurobi_options(self):
+        self.assertEqual(set_gurobi_option('Threads=2 TimeLimit=10',
+                                           'Threads', 8),
+                         'TimeLimit=10 Threads=8')
+        self.assertEqual(gurobi_cl_status('...\nOptimal solution found '
+                                          '(tolerance 1.00e-06)\n'),
+                         ('Optimal', None))
+        self.assertEqual(gurobi_cl_status('Time limit reached\n'
+                                          'Best objective 8, gap 5%'),
+                         ('Time_limit', 'Best objective 8, gap 5%'))
+        self.assertEqual(gurobi_cl_status('Model is infeasible'),
+                         ('Not_optimal', None))
+
+    def create_models(self, num_models):
+        return [self.make_toy_optstoic(max_iteration=3,
+                                       pulp_solver=pulp.PULP_CBC_CMD(msg=0))
+                for _ in range(num_models)]
+
+    def test_solve_async_pulp(self):
+        models = self.create_models(2)
+        limiter = SolverLimiter(max_solves=1)
+
+        async def main():
+            return await asyncio.gather(*[
+                model.solve_async(use_gurobi_cl=False, limiter=limiter)
+                for model in models])
+
+        results = asyncio.run(main())
+        _, expected = self.create_models(1)[0].solve()
+        for _, pathways in results:
+            self.assertEqual(
+                [p.reaction_ids for _, p in sorted(pathways.items())],
+                [p.reaction_ids for _, p in sorted(expected.items())])
+
+    def test_solve_async_gurobi_cl(self):
+        if shutil.which('gurobi_cl') is None:
+            self.skipTest("gurobi_cl is not available.")
+        model = self.create_models(1)[0]
+        _, pathways = asyncio.run(model.solve_async(threads=1))
+        self.assertEqual(len(pathways), 2)
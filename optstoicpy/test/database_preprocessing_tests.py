@@ -1,15 +1,25 @@
-import unittest
+import json
+import os
+import pulp
 from optstoicpy.core.database import (
     load_custom_reactions_to_be_excluded,
     load_base_reaction_db
 )
-from optstoicpy.script.database_preprocessing import blocked_reactions_analysis
+from optstoicpy.script.database_preprocessing import (
+    blocked_reactions_analysis,
+    bound_tightening_analysis,
+    flux_bounds_from_fva,
+    read_fva_checkpoint)
 from optstoicpy.script.solver import (
     load_pulp_solver,
     ORDERED_SOLVERS)
+from optstoicpy.script.solver_backend import HighsBackend
+from optstoicpy.test.fixtures import (
+    ToyTestCase,
+    TOY_BOUNDS)
 
 
-class TestDatabasePreprocessing(unittest.TestCase):
+class TestDatabasePreprocessing(ToyTestCase):
     def test_blocked_reactions_analysis(self):
         """Test blocked reactions analysis.
         A Pulp solver must be loaded for this test to complete.
@@ -79,7 +89,141 @@ class TestDatabasePreprocessing(unittest.TestCase):
             specific_bounds=specific_bounds,
             custom_flux_constraints=custom_flux_constraints,
             excluded_reactions=exclude_reactions,
-            target_reactions_list=['R01266', 'R07882', 'R00658', 'R01059'])
+            target_reactions_list=['R01266', 'R07882', 'R00658', 'R01059'],
+            checkpoint_filepath=os.path.join(self.tmpdir,
+                                             'FVA_result.jsonl'))
 
         self.assertEqual(set(blocked_reactions_list),
                          set(['R01266', 'R07882']))
+
+    def test_blocked_reactions_analysis_toy(self):
+        """Test that the blocked reactions and the FVA results are the same
+        with pulp, with a persistent solver backend and with a process pool.
+        """
+        pulp_solver = pulp.PULP_CBC_CMD(msg=0)
+        if not pulp_solver.available():
+            self.skipTest("CBC is not available.")
+
+        # C5 is a dead-end metabolite, so R00330 is blocked
+        self.db.update_S({'C2': {'R00330': -1.0}, 'C5': {'R00330': 1.0}},
+                         default_reactiontype=0)
+
+        expected = {'R00200': {'min': 0, 'max': 1},
+                    'R00300': {'min': 0, 'max': 1},
+                    'R00330': {'min': 0, 'max': 0},
+                    'R00658': {'min': 0, 'max': 1},
+                    'R01059': {'min': 1, 'max': 1}}
+
+        kwargs_list = [dict(pulp_solver=pulp_solver),
+                       dict(pulp_solver=pulp_solver, processes=2)]
+        if HighsBackend.available():
+            kwargs_list.append(dict(pulp_solver=None, backend='HiGHS'))
+
+        for kwargs in kwargs_list:
+            blocked_reactions_list, FVA_res = blocked_reactions_analysis(
+                database=self.db,
+                specific_bounds=dict(TOY_BOUNDS),
+                custom_flux_constraints=None,
+                target_reactions_list=sorted(expected.keys()),
+                checkpoint_filepath=None,
+                **kwargs)
+            self.assertEqual(blocked_reactions_list, ['R00330'])
+            self.assertEqual(list(FVA_res.keys()), sorted(expected.keys()))
+            for rxn, res in expected.items():
+                self.assertAlmostEqual(FVA_res[rxn]['min'], res['min'])
+                self.assertAlmostEqual(FVA_res[rxn]['max'], res['max'])
+
+    def test_flux_bounds(self):
+        """Test the flux ranges of the FVA and of the bound tightening, and
+        that OptStoic finds the same pathways with them."""
+        pulp_solver = pulp.PULP_CBC_CMD(msg=0)
+        if not pulp_solver.available():
+            self.skipTest("CBC is not available.")
+
+
+        expected = {'EX_c1': (-1, -1), 'EX_c4': (1, 1), 'R00200': (0, 1),
+                    'R00300': (0, 1), 'R00658': (0, 1), 'R01059': (1, 1)}
+        flux_bounds = bound_tightening_analysis(self.db, dict(TOY_BOUNDS))
+        self.assertEqual(flux_bounds, expected)
+
+        _, FVA_res = blocked_reactions_analysis(
+            database=self.db,
+            pulp_solver=pulp_solver,
+            specific_bounds=dict(TOY_BOUNDS),
+            custom_flux_constraints=None,
+            checkpoint_filepath=None)
+        self.assertEqual(flux_bounds_from_fva(FVA_res), expected)
+        self.assertEqual(
+            flux_bounds_from_fva({'R1': {'min': None, 'max': 2.9999999,
+                                         'flux': 1}}),
+            {'R1': (None, 3)})
+
+        pathways = []
+        for bounds in [None, flux_bounds]:
+            model = self.make_toy_optstoic(flux_bounds=bounds,
+                                           max_iteration=3,
+                                           pulp_solver=pulp_solver)
+            _, res = model.solve()
+            pathways.append(dict((k, p.reaction_ids) for k, p in res.items()))
+        self.assertEqual(len(pathways[0]), 2)
+        self.assertEqual(pathways[0], pathways[1])
+
+    def test_blocked_reactions_analysis_skip_ahead(self):
+        """Test that skipping the LPs of the reactions that carry flux in
+        a previous solution gives the same blocked reactions.
+        """
+        pulp_solver = pulp.PULP_CBC_CMD(msg=0)
+        if not pulp_solver.available():
+            self.skipTest("CBC is not available.")
+
+        self.db.update_S({'C2': {'R00330': -1.0}, 'C5': {'R00330': 1.0}},
+                         default_reactiontype=0)
+        target_reactions = ['R00200', 'R00300', 'R00330', 'R00658', 'R01059']
+
+        for kwargs in [dict(), dict(num_random_objectives=3),
+                       dict(num_random_objectives=3, processes=2)]:
+            blocked_reactions_list, FVA_res = blocked_reactions_analysis(
+                database=self.db,
+                pulp_solver=pulp_solver,
+                specific_bounds=dict(TOY_BOUNDS),
+                custom_flux_constraints=None,
+                target_reactions_list=target_reactions,
+                skip_ahead=True,
+                checkpoint_filepath=None,
+                **kwargs)
+            self.assertEqual(blocked_reactions_list, ['R00330'])
+            self.assertAlmostEqual(FVA_res['R00330']['min'], 0)
+            self.assertAlmostEqual(FVA_res['R00330']['max'], 0)
+            for rxn in ['R00200', 'R00300', 'R00658', 'R01059']:
+                self.assertGreater(abs(FVA_res[rxn]['flux']), 1e-8)
+
+    def test_blocked_reactions_analysis_resume(self):
+        """Test that a run resumed from a checkpoint does not solve the
+        reactions in the checkpoint again and ignores an incomplete line.
+        """
+        pulp_solver = pulp.PULP_CBC_CMD(msg=0)
+        if not pulp_solver.available():
+            self.skipTest("CBC is not available.")
+
+        target_reactions = ['R00200', 'R00300', 'R00658', 'R01059']
+        checkpoint_filepath = os.path.join(self.tmpdir, 'FVA_result.jsonl')
+
+        # A job killed while writing the result of the second reaction
+        with open(checkpoint_filepath, 'w') as f:
+            f.write(json.dumps({'reaction': 'R00200', 'min': 0, 'max': 5}))
+            f.write('\n{"reaction": "R00300", "mi')
+
+        blocked_reactions_list, FVA_res = blocked_reactions_analysis(
+            database=self.db,
+            pulp_solver=pulp_solver,
+            specific_bounds=dict(TOY_BOUNDS),
+            custom_flux_constraints=None,
+            target_reactions_list=target_reactions,
+            checkpoint_filepath=checkpoint_filepath,
+            resume_from=checkpoint_filepath)
+
+        self.assertEqual(blocked_reactions_list, [])
+        self.assertEqual(list(FVA_res.keys()), target_reactions)
+        self.assertEqual(FVA_res['R00200'], {'min': 0, 'max': 5})
+        self.assertAlmostEqual(FVA_res['R00300']['max'], 1)
+        self.assertEqual(read_fva_checkpoint(checkpoint_filepath), FVA_res)
@@ -0,0 +1,161 @@
+import os
+import sys
+import subprocess
+import time
+import numpy as np
+from optstoicpy.core.database import Database
+from optstoicpy.test.fixtures import (
+    ToyTestCase,
+    TOY_SJI)
+
+
+class TestDatabase(ToyTestCase):
+    def test_sparse_views(self):
+        self.assertEqual(self.db.Sji.to_dict(), TOY_SJI)
+        self.assertEqual(self.db.S['C3'],
+                         {'R00300': 1.0, 'R00658': 1.0, 'R01059': -1.0})
+        self.assertEqual(self.db.S_matrix.shape,
+                         (len(self.db.metabolites), len(self.db.reactions)))
+        self.assertEqual(self.db.S_df.shape, self.db.S_matrix.shape)
+        with self.assertRaises(TypeError):
+            self.db.S['C3']['R00300'] = 2.0
+
+    def test_rxntype_array(self):
+        rxntype = self.db.rxntype_array
+        self.assertEqual(rxntype.dtype, np.int8)
+        self.assertEqual(rxntype[self.db.reaction_index['EX_c1']], 4)
+        self.assertEqual(rxntype[self.db.reaction_index['R00200']], 0)
+
+    def test_update_S(self):
+        _, new_rxns = self.db.update_S(
+            {'C2': {'EX_c2': -1.0}, 'C5': {'EX_c2': 1.0}},
+            default_reactiontype=4)
+        self.assertEqual(new_rxns, ['EX_c2'])
+        self.assertIn('C5', self.db.metabolites)
+        self.assertEqual(self.db.Sji['EX_c2'], {'C2': -1.0, 'C5': 1.0})
+        self.assertEqual(self.db.rxntype['EX_c2'], 4)
+        self.assertEqual(self.db.metabolites, sorted(self.db.metabolites))
+        self.assertEqual(self.db.reactions, sorted(self.db.reactions))
+
+    def test_remove_reaction(self):
+        self.db.remove_reaction('R00200', refresh_database=False)
+        self.db.remove_reaction('R00300', refresh_database=False)
+        self.assertNotIn('R00200', self.db.Sji)
+        self.db.refresh_database()
+
+        self.assertNotIn('R00200', self.db.reactions)
+        # C2 is only involved in the removed reactions
+        self.assertNotIn('C2', self.db.metabolites)
+        self.assertNotIn('C2', self.db.S)
+        self.assertEqual(self.db.S['C1'], {'R00658': -1.0, 'EX_c1': -1.0})
+
+    def test_remove_and_add_reaction(self):
+        S_matrix = self.db.S_matrix.toarray()
+        self.db.remove_reaction('R01059', refresh_database=False)
+        self.db.update_S({'C3': {'R01059': -1.0}, 'C4': {'R01059': 1.0}},
+                         default_reactiontype=0)
+
+        self.assertIn('R01059', self.db.reactions)
+        self.assertEqual(self.db.Sji['R01059'], {'C3': -1.0, 'C4': 1.0})
+        self.assertEqual(self.db.rxntype['R01059'], 0)
+        self.assertEqual(self.db.S_matrix.toarray().tolist(),
+                         S_matrix.tolist())
+        self.assertIn('R01059', self.db.S_df.columns)
+
+    def test_snapshot_roundtrip(self):
+        self.db.Ninternal = {'L1': {'R00200': 1.0, 'R00300': 1.0,
+                                    'R00658': -1.0}}
+        self.db.loops = ['L1']
+        snapshot_path = os.path.join(self.tmpdir, 'snapshot')
+        self.db.save_snapshot(snapshot_path)
+
+        db = Database.load_snapshot(snapshot_path)
+        self.assertEqual(db.Sji.to_dict(), self.db.Sji.to_dict())
+        self.assertEqual(db.reactions, self.db.reactions)
+        self.assertEqual(db.metabolites, self.db.metabolites)
+        self.assertEqual(db.rxntype, self.db.rxntype)
+        self.assertEqual(db.Ninternal, self.db.Ninternal)
+        self.assertEqual(db.loops, ['L1'])
+        self.assertEqual(db.user_defined_export_rxns,
+                         self.db.user_defined_export_rxns)
+
+    def test_shared_memory_roundtrip(self):
+        self.db.Ninternal = {'L1': {'R00200': 1.0, 'R00300': 1.0,
+                                    'R00658': -1.0}}
+        self.db.loops = ['L1']
+        with self.db.to_shared_memory() as shared_db:
+            db = Database.attach_shared_memory(shared_db.name)
+            self.assertEqual(db.Sji.to_dict(), self.db.Sji.to_dict())
+            self.assertEqual(db.reactions, self.db.reactions)
+            self.assertEqual(db.rxntype, self.db.rxntype)
+            self.assertEqual(db.Ninternal, self.db.Ninternal)
+            self.assertFalse(db.S_matrix.data.flags.writeable)
+
+            # Changes create private arrays
+            db.update_S({'C5': {'EX_c5': -1.0}}, default_reactiontype=4)
+            self.assertIn('EX_c5', db.reactions)
+            self.assertNotIn('EX_c5', shared_db.attach().reactions)
+            del db
+
+    def test_shared_memory_other_process(self):
+        # A process that is not a multiprocessing child of the owner has its
+        # own resource tracker, which must not unlink the block at exit
+        package_root = os.path.dirname(os.path.dirname(
+            os.path.dirname(os.path.abspath(__file__))))
+        env = dict(os.environ, PYTHONPATH=package_root)
+        with self.db.to_shared_memory() as shared_db:
+            subprocess.check_call(
+                [sys.executable, '-c',
+                 'from optstoicpy.core.database import Database; '
+                 'Database.attach_shared_memory(%r)' % shared_db.name],
+                env=env)
+            # The resource tracker of the other process exits after it
+            time.sleep(0.5)
+            db = shared_db.attach()
+            self.assertEqual(db.reactions, self.db.reactions)
+            del db
+
+    def test_batch(self):
+        with self.db.batch():
+            self.db.remove_reaction('R00200')
+            self.db.update_S({'C2': {'EX_c2': -1.0}}, default_reactiontype=4)
+            self.db.update_S({'C5': {'EX_c5': -1.0}}, default_reactiontype=4)
+            # The views are only updated at the end of the batch
+            self.assertNotIn('EX_c2', self.db.Sji)
+
+        self.assertEqual(self.db.Sji['EX_c2'], {'C2': -1.0})
+        self.assertEqual(self.db.S['C5'], {'EX_c5': -1.0})
+        self.assertEqual(self.db.S['C2'], {'R00300': -1.0, 'EX_c2': -1.0})
+        self.assertNotIn('R00200', self.db.reactions)
+        self.assertEqual(self.db.reactions, sorted(self.db.Sji.keys()))
+
+    def test_batch_remove_new_reaction(self):
+        reactions = list(self.db.reactions)
+        with self.db.batch():
+            self.db.update_S({'C1': {'RNEW': -1.0}, 'C5': {'RNEW': 1.0}},
+                             default_reactiontype=0)
+            self.db.update_S({'C2': {'EX_c2': -1.0}}, default_reactiontype=4)
+            self.db.remove_reaction('RNEW')
+
+        self.assertNotIn('RNEW', self.db.Sji)
+        self.assertNotIn('RNEW', self.db.rxntype)
+        self.assertNotIn('C5', self.db.metabolites)
+        self.assertEqual(self.db.Sji['EX_c2'], {'C2': -1.0})
+        self.assertEqual(self.db.reactions, sorted(reactions + ['EX_c2']))
+        self.assertEqual(self.db.S_matrix.shape,
+                         (len(self.db.metabolites), len(self.db.reactions)))
+
+    def test_batch_rollback(self):
+        reactions = list(self.db.reactions)
+        with self.assertRaises(RuntimeError):
+            with self.db.batch():
+                self.db.remove_reaction('R00200')
+                self.db.update_S({'C2': {'EX_c2': -1.0}},
+                                 default_reactiontype=4)
+                raise RuntimeError("Abort the batch")
+
+        self.assertEqual(self.db.reactions, reactions)
+        self.assertIn('R00200', self.db.Sji)
+        self.assertNotIn('EX_c2', self.db.rxntype)
+        self.db.refresh_database()
+        self.assertEqual(self.db.reactions, reactions)
@@ -0,0 +1,145 @@
+"""Small test fixtures shared by the test modules."""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from optstoicpy.core.database import Database
+from optstoicpy.script.optstoic import OptStoic
+from optstoicpy.script.utils import create_logger
+
+# A toy network with two alternative routes from C1 to C4:
+# R00658 -> R01059 (total flux 2) and R00200 -> R00300 -> R01059
+# (total flux 3). The reaction IDs are borrowed from KEGG so that
+# Pathway can look up the reactions, but the stoichiometry is made up.
+TOY_SJI = {
+    'R00200': {'C1': -1.0, 'C2': 1.0},
+    'R00300': {'C2': -1.0, 'C3': 1.0},
+    'R00658': {'C1': -1.0, 'C3': 1.0},
+    'R01059': {'C3': -1.0, 'C4': 1.0},
+    'EX_c1': {'C1': -1.0},
+    'EX_c4': {'C4': -1.0}}
+
+TOY_RXNTYPE = {'R00200': 0, 'R00300': 0, 'R00658': 0, 'R01059': 0,
+               'EX_c1': 4, 'EX_c4': 4}
+
+# R00200 + R00300 - R00658 is an internal loop
+TOY_NINT = {'L1': {'R00200': 1.0, 'R00300': 1.0, 'R00658': -1.0}}
+
+TOY_BOUNDS = {'EX_c1': {'LB': -1, 'UB': -1},
+              'EX_c4': {'LB': 1, 'UB': 1}}
+
+
+def create_toy_database(data_filepath):
+    """Write the toy network to JSON files and load it as a Database."""
+    dbdict_json = {
+        'Sji': 'toy_Sji.json',
+        'reactiontype': 'toy_reactiontype.json',
+        'Nint': 'toy_Nint.json'}
+    for key, data in [('Sji', TOY_SJI),
+                      ('reactiontype', TOY_RXNTYPE),
+                      ('Nint', TOY_NINT)]:
+        with open(os.path.join(data_filepath, dbdict_json[key]), 'w') as fp:
+            json.dump(data, fp)
+
+    db = Database(description='toy',
+                  data_filepath=data_filepath,
+                  dbdict_json=dbdict_json,
+                  blocked_rxns=[],
+                  reduce_model_size=False)
+    db.load()
+    db.user_defined_export_rxns = ['EX_c1', 'EX_c4']
+    return db
+
+
+class ToyTestCase(unittest.TestCase):
+    """A TestCase with the toy database (self.db) in a temporary directory
+    (self.tmpdir) that is removed after each test."""
+
+    def setUp(self):
+        self.logger = create_logger(name=type(self).__name__)
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.db = create_toy_database(self.tmpdir)
+
+    def make_toy_optstoic(self, **kwargs):
+        """Return a MinFlux OptStoic of the toy network with the design
+        equation TOY_BOUNDS (C1 -> C4) and its results in self.tmpdir. The
+        keyword arguments are passed to OptStoic and override these
+        defaults."""
+        options = dict(database=self.db,
+                       objective='MinFlux',
+                       specific_bounds=dict(TOY_BOUNDS),
+                       result_filepath=self.tmpdir,
+                       logger=self.logger)
+        options.update(kwargs)
+        return OptStoic(**options)
+
+
+class ToyOptStoic(OptStoic):
+    """OptStoic on the toy network with the design equation
+    nATP C1 -> nATP C4, so that it can be swept like OptStoicGlycolysis (see
+    run_parameter_sweep). nATP must be an integer."""
+
+    def __init__(self, database, nATP=1, **kwargs):
+        specific_bounds = {'EX_c1': {'LB': -nATP, 'UB': -nATP},
+                           'EX_c4': {'LB': nATP, 'UB': nATP}}
+        super(ToyOptStoic, self).__init__(database=database,
+                                          specific_bounds=specific_bounds,
+                                          **kwargs)
+        self.nATP = nATP
+
+
+# The log of a MIP solve of gurobi_cl (the gap decreases at every line)
+GUROBI_CL_LOG = [
+    "Optimize a model with 1200 rows, 3000 columns and 9000 nonzeros",
+    "Found heuristic solution: objective 40.0000000",
+    "",
+    "    Nodes    |    Current Node    |     Objective Bounds      |     Work",
+    " Expl Unexpl |  Obj  Depth IntInf | Incumbent    BestBd   Gap | It/Node Time",
+    "",
+    "     0     0   10.00000    0   45   40.00000   10.00000  75.0%     -    0s",
+    "H    0     0                      20.0000000   10.00000  50.0%     -    0s",
+    "*   12     8              5      12.0000000   10.00000  16.7%  12.3    1s",
+    "   120    40   10.50000   12   10   12.00000   10.40000  13.3%  11.0    2s",
+    "   480    60   10.90000   14    8   11.00000   10.90000  0.91%  10.2    3s",
+    "",
+    "Explored 512 nodes (6000 simplex iterations) in 3.50 seconds",
+    "",
+    "Optimal solution found (tolerance 1.00e-06)",
+    "Best objective 1.100000000000e+01, best bound 1.100000000000e+01, "
+    "gap 0.0000%"]
+
+_FAKE_GUROBI_CL = '''#!%(python)s
+# A fake gurobi_cl that writes GUROBI_CL_LOG slowly
+import signal
+import sys
+import time
+
+def interrupt(*args):
+    print("Interrupt request received")
+    print("Solve interrupted")
+    print("Best objective 1.200000000000e+01, best bound "
+          "1.000000000000e+01, gap 16.6667%%")
+    sys.stdout.flush()
+    sys.exit(0)
+
+signal.signal(signal.SIGINT, interrupt)
+print("warning", file=sys.stderr)
+for line in %(log)r:
+    print(line)
+    sys.stdout.flush()
+    time.sleep(%(delay)r)
+'''
+
+
+def create_fake_gurobi_cl(dirpath, delay=0.3):
+    """Write an executable gurobi_cl in dirpath that writes GUROBI_CL_LOG
+    (one line every delay seconds) and handles Ctrl-C like gurobi_cl."""
+    filepath = os.path.join(dirpath, 'gurobi_cl')
+    with open(filepath, 'w') as f:
+        f.write(_FAKE_GUROBI_CL % dict(python=sys.executable,
+                                       log=GUROBI_CL_LOG, delay=delay))
+    os.chmod(filepath, 0o755)
+    return filepath
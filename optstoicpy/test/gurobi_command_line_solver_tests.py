@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from optstoicpy.script.gurobi_command_line_solver import (
+    GurobiLogParser,
+    gurobi_cl_status,
+    parse_gurobi_sol,
+    solve_with_gurobi_cl,
+    solve_with_gurobi_cl_debug)
+from optstoicpy.test.fixtures import (
+    GUROBI_CL_LOG,
+    create_fake_gurobi_cl)
+
+
+class TestGurobiLogParser(unittest.TestCase):
+    def test_parse_log(self):
+        parser = GurobiLogParser()
+        events = [event for event in map(parser.parse_line, GUROBI_CL_LOG)
+                  if event is not None]
+        self.assertEqual([event.kind for event in events],
+                         ['heuristic'] + ['node'] * 5 + ['summary'])
+        self.assertEqual(events[0].incumbent, 40)
+        self.assertIsNone(events[0].gap)
+        self.assertEqual(events[1][1:4], (40, 10, 0.75))
+        self.assertEqual(events[3][1:3], (12, 10))
+        self.assertAlmostEqual(events[3].gap, 0.167)
+        self.assertEqual(events[3].time, 1)
+        self.assertEqual(events[-1][1:4], (11, 11, 0))
+
+    def test_target_reached(self):
+        parser = GurobiLogParser()
+        self.assertIsNone(parser.target_reached(gap_target=1,
+                                                time_target=0))
+        parser.parse_line(GUROBI_CL_LOG[6])
+        self.assertIsNone(parser.target_reached(gap_target=0.5))
+        self.assertEqual(parser.target_reached(gap_target=0.8), 'gap')
+        self.assertEqual(parser.target_reached(time_target=0), 'time')
+
+    def test_status(self):
+        self.assertEqual(gurobi_cl_status('\n'.join(GUROBI_CL_LOG)),
+                         ('Optimal', None))
+        self.assertEqual(
+            gurobi_cl_status('Solve interrupted\n'
+                             'Best objective 12, best bound 10, gap 16.7%'),
+            ('Interrupted', 'Best objective 12, best bound 10, gap 16.7%'))
+
+
+class TestGurobiCommandLineSolver(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        create_fake_gurobi_cl(self.tmpdir, delay=0.1)
+        self.path = os.environ['PATH']
+        os.environ['PATH'] = self.tmpdir + os.pathsep + self.path
+        self.lp_filename = os.path.join(self.tmpdir, 'OptStoic')
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_solve(self):
+        self.assertEqual(solve_with_gurobi_cl(self.lp_filename, verbose=False),
+                         ('Optimal', None))
+        events = []
+        self.assertEqual(
+            solve_with_gurobi_cl_debug(self.lp_filename, verbose=False,
+                                       progress_callback=events.append),
+            ('Optimal', None))
+        self.assertEqual(len(events), 7)
+
+    def test_gap_target(self):
+        events = []
+        status, message = solve_with_gurobi_cl_debug(
+            self.lp_filename, verbose=False, progress_callback=events.append,
+            gap_target=0.2)
+        self.assertEqual(status, 'Interrupted')
+        self.assertTrue(message.startswith('Best objective'))
+        # Interrupted after the line with a 16.7% gap
+        self.assertEqual([event.incumbent for event in events[:-1]],
+                         [40, 40, 20, 12])
+        self.assertEqual(events[-1].kind, 'summary')
+
+    def test_time_target(self):
+        start = time.time()
+        status, _ = solve_with_gurobi_cl_debug(
+            self.lp_filename, verbose=False, time_target=0.3)
+        self.assertEqual(status, 'Interrupted')
+        self.assertLess(time.time() - start, 0.1 * len(GUROBI_CL_LOG))
+
+    def test_parse_gurobi_sol(self):
+        self.assertIsNone(parse_gurobi_sol(self.lp_filename))
+        with open(self.lp_filename + '.sol', 'w') as f:
+            f.write('# Objective value = 11\nv_R1 1\nv_R2 -2.5\n')
+        self.assertEqual(parse_gurobi_sol(self.lp_filename),
+                         (11, {'v_R1': 1, 'v_R2': -2.5}))
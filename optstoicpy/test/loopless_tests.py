@@ -0,0 +1,64 @@
+import pulp
+from optstoicpy.script.loopless import LoopDetector
+from optstoicpy.script.solver_backend import HighsBackend
+from optstoicpy.test.fixtures import ToyTestCase
+
+
+class TestLoopless(ToyTestCase):
+    def setUp(self):
+        super(TestLoopless, self).setUp()
+        # With a reversible R00658, the third best pathway
+        # (R00200 = R00300 = 2, R00658 = -1) contains the loop L1
+        self.db.rxntype['R00658'] = 1
+
+    def test_find_cycle(self):
+        detector = LoopDetector(self.db)
+        self.assertIsNone(detector.find_cycle(
+            {'R00200': 1, 'R00300': 1, 'R01059': 1}))
+        self.assertIsNone(detector.find_cycle(
+            {'R00200': 2, 'R00300': 2, 'R00658': 1, 'R01059': 1}))
+        self.assertEqual(
+            detector.find_cycle(
+                {'R00200': 2, 'R00300': 2, 'R00658': -1, 'R01059': 1}),
+            {'R00200': 1, 'R00300': 1, 'R00658': -1})
+
+    def solve(self, **kwargs):
+        pulp_solver = pulp.PULP_CBC_CMD(msg=0)
+        if not pulp_solver.available():
+            self.skipTest("CBC is not available.")
+        backend = kwargs.pop('backend', None)
+        model = self.make_toy_optstoic(max_iteration=3,
+                                       pulp_solver=pulp_solver,
+                                       **kwargs)
+        _, pathways = model.solve(backend=backend)
+        return model, [sorted(p.reaction_ids_no_exchange)
+                       for _, p in sorted(pathways.items())]
+
+    def test_lazy_loopless(self):
+        _, loopless = self.solve(add_loopless_constraints=True)
+        model, lazy = self.solve(add_loopless_constraints=True,
+                                 lazy_loopless=True)
+        self.assertEqual(len(loopless), 2)
+        self.assertEqual(lazy, loopless)
+        self.assertEqual(model.num_loop_cuts, 0)
+
+    def test_lazy_loopless_cut(self):
+        # The only solution with a total flux of 6 is
+        # R00200 = R00300 = 2, R00658 = -1, R01059 = 1, which has a loop
+        _, with_loops = self.solve(add_loopless_constraints=False, zlb=6)
+        _, loopless = self.solve(add_loopless_constraints=True, zlb=6)
+        model, lazy = self.solve(add_loopless_constraints=True, zlb=6,
+                                 lazy_loopless=True)
+
+        self.assertEqual(with_loops, [['R00200', 'R00300', 'R00658', 'R01059']])
+        self.assertEqual(loopless, [])
+        self.assertEqual(lazy, [])
+        self.assertEqual(model.num_loop_cuts, 1)
+
+        if HighsBackend.available():
+            model, lazy_backend = self.solve(add_loopless_constraints=True,
+                                             zlb=6,
+                                             lazy_loopless=True,
+                                             backend='HiGHS')
+            self.assertEqual(lazy_backend, [])
+            self.assertEqual(model.num_loop_cuts, 1)
@@ -0,0 +1,78 @@
+import os
+import unittest
+from optstoicpy.script.lp_writer import LPWriter, format_row
+from optstoicpy.script.solver_backend import highspy
+from optstoicpy.test.fixtures import ToyTestCase
+
+
+class TestLPWriter(ToyTestCase):
+    def setUp(self):
+        super(TestLPWriter, self).setUp()
+        self.optstoic = self.make_toy_optstoic()
+        self.filepath = os.path.join(self.tmpdir, 'OptStoic.lp')
+
+    def read(self, filepath):
+        with open(filepath, 'r') as f:
+            return f.read()
+
+    def test_append_row_in_place(self):
+        model = self.optstoic.create_minflux_matrix_model()
+        writer = LPWriter(model, self.filepath, logger=self.logger)
+        writer.write()
+        self.optstoic.add_integer_cut(model, ['R00658', 'R01059'],
+                                      'IntegerCut_1', backend=writer)
+        # The cut is written without stacking it onto the matrix
+        self.assertEqual(len(model._new_rows), 1)
+
+        # The file is the same as writing the updated model from scratch
+        filepath2 = os.path.join(self.tmpdir, 'OptStoic2.lp')
+        LPWriter(model, filepath2, logger=self.logger).write()
+        self.assertEqual(self.read(self.filepath), self.read(filepath2))
+
+        content = self.read(self.filepath)
+        self.assertIn("IntegerCut_1: -1 yf_R00658 -1 yf_R01059 "
+                      "-1 yb_R00658 -1 yb_R01059 >= -1\nBounds\n", content)
+        self.assertTrue(content.endswith('End\n'))
+
+    def test_format_row(self):
+        self.assertEqual(
+            format_row('c1', ['x', 'y'], [1, -0.5], 0, float('inf'), 'x'),
+            'c1: +1 x -0.5 y >= 0\n')
+        self.assertEqual(
+            format_row('c2', [], [], 1, 1, 'x'), 'c2: 0 x = 1\n')
+        with self.assertRaises(ValueError):
+            format_row('c3', ['x'], [1], 0, 1, 'x')
+
+    def test_indicator_constraints(self):
+        model = self.optstoic.create_minflux_matrix_model(
+            indicator_constraints=True)
+        writer = LPWriter(model, self.filepath, logger=self.logger)
+        writer.write()
+        self.optstoic.add_integer_cut(model, ['R00658', 'R01059'],
+                                      'IntegerCut_1', backend=writer)
+
+        content = self.read(self.filepath)
+        self.assertIn("cons2_R00658: yf_R00658 = 0 -> +1 vf_R00658 <= 0\n",
+                      content)
+        self.assertIn("llcons1_R00658: a_R00658 = 0 -> +1 G_R00658 >= 1\n",
+                      content)
+        self.assertIn("IntegerCut_1:", content)
+        self.assertTrue(content.endswith('End\n'))
+
+    @unittest.skipIf(highspy is None, "highspy is not installed.")
+    def test_read_and_solve(self):
+        model = self.optstoic.create_minflux_matrix_model()
+        writer = LPWriter(model, self.filepath, logger=self.logger)
+        writer.write()
+
+        objective_values = []
+        for ind in range(2):
+            h = highspy.Highs()
+            h.setOptionValue('output_flag', False)
+            h.readModel(self.filepath)
+            h.run()
+            objective_values.append(h.getInfo().objective_function_value)
+            self.optstoic.add_integer_cut(model, ['R00658', 'R01059'],
+                                          'IntegerCut_1', backend=writer)
+
+        self.assertEqual(objective_values, [2, 3])
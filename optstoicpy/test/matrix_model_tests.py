@@ -0,0 +1,155 @@
+import numpy as np
+from optstoicpy.script.matrix_model import (
+    INF,
+    MatrixModel,
+    apply_flux_bounds,
+    create_minflux_matrix_model,
+    propagate_bounds)
+from optstoicpy.test.fixtures import (
+    ToyTestCase,
+    TOY_BOUNDS)
+
+
+class TestMatrixModel(ToyTestCase):
+    def assert_equivalent(self, ref, model):
+        """Check that model has the same variables and constraints as ref
+        (ignoring the order and the variables that are never used)."""
+        col_index = model.col_index
+        cols = np.array([col_index[name] for name in ref.col_names])
+        for attr in ['col_lower', 'col_upper', 'col_integer', 'col_cost']:
+            np.testing.assert_array_equal(getattr(ref, attr),
+                                          getattr(model, attr)[cols])
+
+        unused = np.setdiff1d(np.arange(model.num_cols), cols)
+        self.assertEqual(model.A[:, unused].nnz, 0)
+        self.assertFalse(model.col_cost[unused].any())
+
+        self.assertEqual(sorted(ref.row_names), sorted(model.row_names))
+        row_index = dict((name, ind) for ind, name in enumerate(model.row_names))
+        rows = np.array([row_index[name] for name in ref.row_names])
+        np.testing.assert_array_equal(ref.row_lower, model.row_lower[rows])
+        np.testing.assert_array_equal(ref.row_upper, model.row_upper[rows])
+        np.testing.assert_array_equal(ref.A.toarray(),
+                                      model.A[rows][:, cols].toarray())
+
+    def test_minflux_matrix_model_matches_pulp(self):
+        custom_flux_constraints = [{'constraint_name': 'c1c4',
+                                    'reactions': ['EX_c1', 'EX_c4'],
+                                    'LB': 0,
+                                    'UB': 0}]
+        for objective, zlb, loopless in [('MinFlux', None, True),
+                                         ('MinFlux', 3, False),
+                                         ('MinRxn', None, True)]:
+            model = self.make_toy_optstoic(
+                objective=objective,
+                zlb=zlb,
+                custom_flux_constraints=custom_flux_constraints,
+                add_loopless_constraints=loopless)
+            ref = MatrixModel.from_pulp(model.create_minflux_problem()[0])
+            self.assert_equivalent(ref, model.create_minflux_matrix_model())
+
+    def test_excluded_reactions(self):
+        self.db.all_excluded_reactions = ['R00658']
+        model = create_minflux_matrix_model(self.db, TOY_BOUNDS)
+        for var in ['v', 'vf', 'yf', 'yb']:
+            ind = model.col_index['%s_R00658' % var]
+            self.assertEqual(model.col_lower[ind], 0)
+            self.assertEqual(model.col_upper[ind], 0)
+        self.assertEqual(model.col_upper[model.col_index['vb_R00658']], 1000)
+
+    def test_flux_bounds(self):
+        flux_bounds = {'R00200': (0, 1), 'R00300': (0, 1),
+                       'R00658': (0, 1), 'R01059': (1, 1),
+                       # The specific bounds are kept
+                       'EX_c1': (-5, 5)}
+        for loopless in [True, False]:
+            model = self.make_toy_optstoic(
+                add_loopless_constraints=loopless,
+                flux_bounds=flux_bounds)
+            ref = MatrixModel.from_pulp(model.create_minflux_problem()[0])
+            matrix_model = model.create_minflux_matrix_model()
+            self.assert_equivalent(ref, matrix_model)
+
+        def coefficient(row, col):
+            return matrix_model.A[matrix_model.row_names.index(row),
+                                  matrix_model.col_index[col]]
+
+        self.assertEqual(coefficient('cons2_R00200', 'yf_R00200'), -1)
+        self.assertEqual(coefficient('cons4_R00200', 'yb_R00200'), 0)
+        self.assertEqual(coefficient('cons2_R00658', 'yf_R00658'), -1)
+        ind = matrix_model.col_index['v_EX_c1']
+        self.assertEqual(matrix_model.col_lower[ind], TOY_BOUNDS['EX_c1']['LB'])
+        self.assertEqual(matrix_model.col_upper[ind], TOY_BOUNDS['EX_c1']['UB'])
+        self.assertEqual(
+            matrix_model.col_upper[matrix_model.col_index['vf_R00300']], 1)
+
+        with self.assertRaises(ValueError):
+            apply_flux_bounds(['R1'], [0], [10], {'R1': (-2, -1)})
+
+    def test_fixed_flux_variables(self):
+        model = create_minflux_matrix_model(self.db, TOY_BOUNDS)
+        for rxn, values in [('EX_c1', dict(vf=0, vb=1, yf=0, yb=1)),
+                            ('EX_c4', dict(vf=1, vb=0, yf=1, yb=0))]:
+            for var, value in values.items():
+                ind = model.col_index['%s_%s' % (var, rxn)]
+                self.assertEqual(model.col_lower[ind], value)
+                self.assertEqual(model.col_upper[ind], value)
+        # The reactions without fixed fluxes are not fixed
+        ind = model.col_index['yf_R00658']
+        self.assertEqual((model.col_lower[ind], model.col_upper[ind]), (0, 1))
+
+    def test_indicator_constraints(self):
+        model = create_minflux_matrix_model(self.db, TOY_BOUNDS,
+                                            indicator_constraints=True)
+        names = [indicator.name for indicator in model.indicators]
+        for prefix in ['cons2_', 'cons4_', 'llcons1_', 'llcons4_']:
+            self.assertIn(prefix + 'R00658', names)
+            self.assertNotIn(prefix + 'R00658', model.row_names)
+        self.assertIn('cons1_R00658', model.row_names)
+
+        indicator = model.indicators[names.index('cons2_R00658')]
+        self.assertEqual(model.col_names[indicator.binary], 'yf_R00658')
+        self.assertEqual(indicator.value, 0)
+        with self.assertRaises(ValueError):
+            model.to_pulp()
+
+    def test_add_row(self):
+        model = create_minflux_matrix_model(self.db,
+                                            specific_bounds=TOY_BOUNDS)
+        A = model.A
+        num_rows = model.num_rows
+        model.add_row('IntegerCut_1', {'yf_R00658': -1.0, 'yf_R01059': -1.0},
+                      lower=-1.0)
+        cols, vals = model.add_row('LoopCut_1', {'yb_R00200': 1.0},
+                                   upper=0.0)
+        self.assertEqual(model.num_rows, num_rows + 2)
+        np.testing.assert_array_equal(cols, [model.col_index['yb_R00200']])
+        # The rows are stacked onto A when it is read
+        self.assertIs(model._A, A)
+        self.assertEqual(model.A.shape, (num_rows + 2, model.num_cols))
+        self.assertEqual(model.A[num_rows, model.col_index['yf_R01059']], -1)
+        self.assertEqual(model.A[num_rows + 1].nnz, 1)
+        np.testing.assert_array_equal(model.row_lower[-2:], [-1, -INF])
+        np.testing.assert_array_equal(model.row_upper[-2:], [INF, 0])
+
+    def test_propagate_bounds(self):
+        # x + y = 2, x - z = 0, 0 <= x, y <= 10, z <= 1
+        model = MatrixModel(col_names=['x', 'y', 'z'],
+                            col_lower=[0, 0, -INF],
+                            col_upper=[10, 10, 1],
+                            col_cost=[0, 0, 0],
+                            col_integer=[False, False, False],
+                            row_names=['c1', 'c2'],
+                            row_lower=[2, 0],
+                            row_upper=[2, 0],
+                            A=np.array([[1, 1, 0], [1, 0, -1]]))
+        lower, upper = propagate_bounds(model)
+        np.testing.assert_allclose(lower, [0, 1, 0])
+        np.testing.assert_allclose(upper, [1, 2, 1])
+
+        # x + y = 3, x, y >= 2 is infeasible
+        model.col_lower = np.array([2., 2., -INF])
+        model.row_lower = np.array([3., 0.])
+        model.row_upper = np.array([3., 0.])
+        with self.assertRaises(ValueError):
+            propagate_bounds(model)
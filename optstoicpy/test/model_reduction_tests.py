@@ -0,0 +1,94 @@
+import pulp
+from optstoicpy.script.matrix_model import MatrixModel
+from optstoicpy.script.model_reduction import reduce_database
+from optstoicpy.script.solver_backend import HighsBackend
+from optstoicpy.test.fixtures import (
+    ToyTestCase,
+    TOY_BOUNDS)
+
+
+class TestModelReduction(ToyTestCase):
+    def setUp(self):
+        super(TestModelReduction, self).setUp()
+        # C5 is a dead-end metabolite
+        self.db.update_S({'C2': {'R00330': -1.0}, 'C5': {'R00330': 1.0}},
+                         default_reactiontype=0)
+        self.reduced_db = reduce_database(self.db, dict(TOY_BOUNDS),
+                                          logger=self.logger)
+
+    def test_reduce_database(self):
+        self.assertEqual(sorted(self.reduced_db.reactions),
+                         ['EX_c1', 'EX_c4', 'LUMP_R00200', 'R00658',
+                          'R01059'])
+        self.assertEqual(self.reduced_db.lumped_reactions,
+                         {'LUMP_R00200': {'R00200': 1.0, 'R00300': 1.0}})
+        self.assertEqual(self.reduced_db.loops, ['L1'])
+        self.assertEqual(self.reduced_db.Ninternal['L1'],
+                         {'R00658': -1.0, 'LUMP_R00200': 1.0})
+        self.assertIn('LUMP_R00200', self.reduced_db.internal_rxns)
+        # The original database is not modified
+        self.assertIn('R00330', self.db.reactions)
+        self.assertEqual(self.db.lumped_reactions, {})
+
+    def test_expand_and_compress(self):
+        reaction_ids, fluxes = self.reduced_db.expand_fluxes(
+            ['EX_c1', 'LUMP_R00200', 'R01059'], [-1.0, 2.0, 1.0])
+        self.assertEqual(dict(zip(reaction_ids, fluxes)),
+                         {'EX_c1': -1.0, 'R00200': 2.0, 'R00300': 2.0,
+                          'R01059': 1.0})
+        self.assertEqual(
+            self.reduced_db.compress_reaction_ids(
+                ['R00200', 'R00300', 'R01059']),
+            ['LUMP_R00200', 'R01059'])
+        self.assertEqual(
+            self.reduced_db.get_objective_weights('MinFlux')['LUMP_R00200'],
+            2.0)
+
+    def test_lumped_flux_bounds(self):
+        # v(R00200) = v(R00300) = v(LUMP_R00200)
+        self.assertEqual(self.reduced_db.get_flux_bounds(10),
+                         {'LUMP_R00200': (-10, 10)})
+        self.assertEqual(
+            self.reduced_db.get_flux_bounds(10, {'R00300': (0, 4)}),
+            {'R00300': (0, 4), 'LUMP_R00200': (0, 4)})
+        self.assertIsNone(self.db.get_flux_bounds(10))
+
+        # v(R00200) = 2 * v(LUMP), v(R00300) = 3 * v(LUMP)
+        self.reduced_db.lumped_reactions['LUMP_R00200'] = {'R00200': 2.0,
+                                                           'R00300': 3.0}
+        self.assertEqual(self.reduced_db.get_flux_bounds(12),
+                         {'LUMP_R00200': (-4, 4)})
+        self.assertEqual(
+            self.reduced_db.get_flux_bounds(12, {'R00200': (-2, 6)}),
+            {'R00200': (-2, 6), 'LUMP_R00200': (-1, 3)})
+
+        model = self.make_toy_optstoic(database=self.reduced_db, M=12)
+        matrix_model = model.create_minflux_matrix_model()
+        for var, bounds in [('v', (0, 4)), ('vf', (0, 4)), ('vb', (0, 0))]:
+            ind = matrix_model.col_index['%s_LUMP_R00200' % var]
+            self.assertEqual((matrix_model.col_lower[ind],
+                              matrix_model.col_upper[ind]), bounds)
+        ref = MatrixModel.from_pulp(model.create_minflux_problem()[0])
+        ind = ref.col_names.index('v_LUMP_R00200')
+        self.assertEqual((ref.col_lower[ind], ref.col_upper[ind]), (0, 4))
+
+    def solve(self, database, backend=None):
+        pulp_solver = pulp.PULP_CBC_CMD(msg=0)
+        if not pulp_solver.available():
+            self.skipTest("CBC is not available.")
+        model = self.make_toy_optstoic(database=database,
+                                       max_iteration=3,
+                                       pulp_solver=pulp_solver)
+        _, pathways = model.solve(backend=backend)
+        return [(sorted(zip(p.reaction_ids, p.fluxes)),
+                 p.total_flux_no_exchange)
+                for _, p in sorted(pathways.items())]
+
+    def test_same_pathways(self):
+        self.assertEqual(self.solve(self.reduced_db), self.solve(self.db))
+
+    def test_same_pathways_backend(self):
+        if not HighsBackend.available():
+            self.skipTest("highspy is not available.")
+        self.assertEqual(self.solve(self.reduced_db, backend='HiGHS'),
+                         self.solve(self.db, backend='HiGHS'))
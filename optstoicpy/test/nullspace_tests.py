@@ -0,0 +1,61 @@
+import unittest
+from fractions import Fraction
+import numpy as np
+import pandas as pd
+from optstoicpy.script.nullspace import (
+    sparse_rref,
+    connected_components,
+    rational_null_space)
+from optstoicpy.script.database_preprocessing import internal_loop_analysis
+
+
+class TestNullSpace(unittest.TestCase):
+    def setUp(self):
+        # null(A, 'r') in MATLAB = [-1 -2; 1 0; 0 -1; 0 1]
+        self.A = np.array([[1, 1, 0, 0],
+                           [0, 0, 2, 2],
+                           [1, 1, 1, 1]], dtype=float)
+
+    def test_sparse_rref(self):
+        rows, pivots = sparse_rref(self.A)
+        self.assertEqual(pivots, [0, 2])
+        self.assertEqual(rows, [{0: 1, 1: 1}, {2: 1, 3: 1}])
+
+    def test_rational_null_space(self):
+        basis = rational_null_space(self.A)
+        self.assertEqual(basis, [{0: -1, 1: 1}, {2: -1, 3: 1}])
+
+        A = np.array([[1, 0.5, -1]])
+        basis = rational_null_space(A)
+        self.assertEqual(basis, [{0: Fraction(-1, 2), 1: 1}, {0: 1, 2: 1}])
+
+    def test_internal_loop_analysis(self):
+        # R1: A -> B, R2: B -> C, R3: A -> C, R4: A <-> A (no metabolite)
+        S_df = pd.DataFrame([[-1, 0, -1, 0],
+                             [1, -1, 0, 0],
+                             [0, 1, 1, 0]],
+                            index=['A', 'B', 'C'],
+                            columns=['R1', 'R2', 'R3', 'R4'])
+        Ninternal, loops = internal_loop_analysis(S_df)
+        self.assertEqual(loops, ['L1'])
+        self.assertEqual(Ninternal, {'L1': {'R1': -1.0, 'R2': -1.0, 'R3': 1.0}})
+
+    def test_connected_components(self):
+        components = connected_components(self.A[:2])
+        self.assertEqual([(list(rows), list(cols)) for rows, cols in components],
+                         [([0], [0, 1]), ([1], [2, 3])])
+
+    def test_rational_null_space_processes(self):
+        A = np.zeros((4, 7))
+        A[0, [0, 3]] = [1, -1]
+        A[1, [3, 6]] = [1, -1]
+        A[2, [1, 4]] = [2, 1]
+        A[3, [1, 4, 5]] = [1, 1, -1]
+        expected = rational_null_space(A)
+        self.assertEqual(len(expected), 3)
+        self.assertEqual(rational_null_space(A, processes=2), expected)
+        for vector in expected:
+            x = np.zeros(7)
+            for col, value in vector.items():
+                x[col] = value
+            self.assertTrue(np.allclose(A.dot(x), 0))
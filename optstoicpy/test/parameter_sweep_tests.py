@@ -0,0 +1,122 @@
+import os
+from unittest import mock
+from optstoicpy.script.solver_backend import HighsBackend
+from optstoicpy.script.pathway_store import PathwayStore
+from optstoicpy.test.fixtures import ToyOptStoic, ToyTestCase
+from optstoicpy.script import parameter_sweep
+from optstoicpy.script.parameter_sweep import (
+    create_sweep_grid,
+    point_key,
+    run_parameter_sweep,
+    sweep_chains)
+
+
+class TestParameterSweep(ToyTestCase):
+    def test_create_sweep_grid(self):
+        points = create_sweep_grid(nATP=[1, 1.5], zlb=[None, 8])
+        self.assertEqual(len(points), 4)
+        self.assertEqual(point_key(points[1]), (1, 8, 'MinFlux'))
+        with self.assertRaises(ValueError):
+            run_parameter_sweep(points + points[:1], database=object())
+        with self.assertRaises(ValueError):
+            run_parameter_sweep(points, model_class=ToyOptStoic)
+
+    def test_sweep_chains(self):
+        points = create_sweep_grid(nATP=[2, 1, 1.5], zlb=[None, 8])
+        chains = sweep_chains(points)
+        self.assertEqual(len(chains), 2)
+        for chain in chains:
+            self.assertEqual([point['nATP'] for point in chain], [1, 1.5, 2])
+            self.assertEqual(len(set(point['zlb'] for point in chain)), 1)
+
+    def test_run_parameter_sweep(self):
+        if not HighsBackend.available():
+            self.skipTest("highspy is not installed.")
+        points = create_sweep_grid(nATP=[1, 2], zlb=[None])
+        store_filepath = os.path.join(self.tmpdir, 'pathways.sqlite')
+        result = run_parameter_sweep(points,
+                                     database=self.db,
+                                     processes=2,
+                                     add_loopless_constraints=False,
+                                     backend='HiGHS',
+                                     result_filepath=self.tmpdir,
+                                     use_shared_memory=True,
+                                     pathway_store=store_filepath,
+                                     model_class=ToyOptStoic,
+                                     logger=self.logger)
+        self.assertEqual(len(result), 2)
+        for point in points:
+            key = point_key(point)
+            self.assertEqual(result.status[key], 'Done')
+            pathway = result.pathways[key][1]
+            self.assertEqual(pathway.note['modelstat'], 'Optimal')
+            self.assertEqual(pathway.rxn_flux_dict,
+                             {'R00658': point['nATP'],
+                              'R01059': point['nATP'],
+                              'EX_c1': -point['nATP'],
+                              'EX_c4': point['nATP']})
+        df = result.to_dataframe()
+        self.assertEqual(list(df.index.names),
+                         ['nATP', 'zlb', 'objective', 'iteration'])
+        self.assertEqual(len(df), 2)
+
+        with PathwayStore(store_filepath) as store:
+            self.assertEqual(len(store), 2)
+            pathway_ids = store.find_pathways(nATP=2, objective='MinFlux')
+            self.assertEqual(len(pathway_ids), 1)
+            pathway = store.get_pathway(pathway_ids[0])
+            self.assertEqual(pathway.rxn_flux_dict,
+                             result.pathways[(2, None, 'MinFlux')][1]
+                             .rxn_flux_dict)
+
+    def test_warm_start_sweep(self):
+        if not HighsBackend.available():
+            self.skipTest("highspy is not installed.")
+        # Record the solution passed to each point and the MIP start set
+        # in its model
+        solve_sweep_point = parameter_sweep._solve_sweep_point
+        set_mip_start = ToyOptStoic.set_mip_start
+        solved = []
+        mip_starts = []
+
+        def record_solve(point, options, initial_solution=None):
+            res, last_solution = solve_sweep_point(point, options,
+                                                   initial_solution)
+            solved.append((point['nATP'], initial_solution, last_solution))
+            return res, last_solution
+
+        def record_mip_start(model, lp_prob, values, backend=None):
+            mip_starts.append((model.nATP, values))
+            return set_mip_start(model, lp_prob, values, backend=backend)
+
+        points = create_sweep_grid(nATP=[2, 1], zlb=[None])
+        with mock.patch.object(parameter_sweep, '_solve_sweep_point',
+                               record_solve), \
+                mock.patch.object(ToyOptStoic, 'set_mip_start',
+                                  record_mip_start):
+            result = run_parameter_sweep(
+                points,
+                database=self.db,
+                add_loopless_constraints=False,
+                backend='HiGHS',
+                result_filepath=self.tmpdir,
+                warm_start=True,
+                model_class=ToyOptStoic,
+                logger=self.logger)
+        for point in points:
+            key = point_key(point)
+            self.assertEqual(result.status[key], 'Done')
+            self.assertEqual(
+                result.pathways[key][1].rxn_flux_dict['EX_c4'],
+                point['nATP'])
+
+        # The points are solved in order of nATP, and the second one starts
+        # from the last solution of the first one
+        self.assertEqual([nATP for nATP, _, _ in solved], [1, 2])
+        self.assertIsNone(solved[0][1])
+        first_solution = solved[0][2]
+        self.assertEqual(first_solution['v_R00658'], 1)
+        self.assertIs(solved[1][1], first_solution)
+        self.assertEqual(len(mip_starts), 1)
+        self.assertEqual(mip_starts[0][0], 2)
+        self.assertIs(mip_starts[0][1], first_solution)
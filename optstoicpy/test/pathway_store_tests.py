@@ -0,0 +1,107 @@
+import os
+import pickle
+import pulp
+from optstoicpy.core.pathway import Pathway
+from optstoicpy.script.pathway_store import PathwayStore
+from optstoicpy.script.solver import SolverScheduler
+from optstoicpy.test.fixtures import ToyTestCase
+
+
+def create_pathway(iteration, reaction_ids, fluxes):
+    return Pathway(id=iteration,
+                   name='Pathway_{:03d}'.format(iteration),
+                   reaction_ids=reaction_ids,
+                   fluxes=fluxes,
+                   note=dict(modelstat='Optimal', time=0.5))
+
+
+class TestPathwayStore(ToyTestCase):
+    def setUp(self):
+        super(TestPathwayStore, self).setUp()
+        self.filepath = os.path.join(self.tmpdir, 'pathways.sqlite')
+
+    def test_add_and_find_pathways(self):
+        with PathwayStore(self.filepath, logger=self.logger) as store:
+            run1 = store.create_run(objective='MinFlux', nATP=1, zlb=8,
+                                    parameters={'M': 1000})
+            run2 = store.create_run(objective='MinRxn', nATP=2)
+            store.add_pathway(run1, create_pathway(
+                1, ['R01061', 'R00200', 'EX_atp'], [2, 1, 1]),
+                objective='MinFlux', nATP=1)
+            store.add_pathway(run1, create_pathway(
+                2, ['R00200', 'EX_atp'], [1, 1]), objective='MinFlux')
+            # nATP from the run (no EX_atp flux)
+            store.add_pathway(run2, create_pathway(
+                1, ['R01061', 'R00658'], [1, -1]),
+                objective='MinRxn', nATP=2)
+            self.assertEqual(len(store), 3)
+
+            self.assertEqual(len(store.find_pathways(reaction_id='R01061')),
+                             2)
+            self.assertEqual(
+                len(store.find_pathways(reaction_id='R01061', nATP=2)), 1)
+            self.assertEqual(
+                len(store.find_pathways(reaction_id=['R01061', 'R00200'])), 1)
+            self.assertEqual(len(store.find_pathways(objective='MinFlux',
+                                                     max_num_reaction=2)), 1)
+            self.assertEqual(store.find_pathways(reaction_id='R99999'), [])
+
+            pathways = store.run_pathways(run1)
+            self.assertEqual(sorted(pathways), [1, 2])
+            pathway = pathways[1]
+            self.assertEqual(pathway.reaction_ids,
+                             ['R01061', 'R00200', 'EX_atp'])
+            self.assertEqual(pathway.fluxes, [2, 1, 1])
+            self.assertEqual(pathway.nATP, 1)
+            self.assertEqual(pathway.get_modelstat(), 'Optimal')
+            self.assertIsNone(store.get_pathway(100))
+
+        # The pathways are on disk
+        with PathwayStore(self.filepath) as store:
+            self.assertEqual(len(store), 3)
+
+    def test_optstoic_pathway_store(self):
+        pulp_solver = pulp.PULP_CBC_CMD(msg=0)
+        if not pulp_solver.available():
+            self.skipTest("CBC is not available.")
+        store = PathwayStore(self.filepath)
+        self.addCleanup(store.close)
+        model = self.make_toy_optstoic(max_iteration=3,
+                                       pulp_solver=pulp_solver,
+                                       pathway_store=store)
+        _, pathways = model.solve()
+        self.assertEqual(len(pathways), 2)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.tmpdir, 'temp_pathways.json')))
+
+        stored = store.run_pathways(model.store_run_id)
+        self.assertEqual(sorted(stored), sorted(pathways))
+        for k, pathway in pathways.items():
+            self.assertEqual(stored[k].rxn_flux_dict, pathway.rxn_flux_dict)
+        # Only the first pathway uses R00658
+        self.assertEqual(
+            len(store.find_pathways(reaction_id='R00658',
+                                    objective='MinFlux')), 1)
+
+    def test_pickle_with_scheduler(self):
+        pulp_solver = pulp.PULP_CBC_CMD(msg=0)
+        if not pulp_solver.available():
+            self.skipTest("CBC is not available.")
+        model = self.make_toy_optstoic(max_iteration=3,
+                                       pulp_solver=pulp_solver,
+                                       pathway_store=self.filepath)
+        copy = pickle.loads(pickle.dumps(model))
+        self.assertEqual(len(copy.pathway_store), 0)
+        copy.pathway_store.close()
+
+        # The worker process appends the pathways to the same file
+        scheduler = SolverScheduler(num_cores=1,
+                                    solver_names=['PULP_CBC_CMD'])
+        job = scheduler.submit(model)
+        scheduler.run()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(len(job.pathways), 2)
+        self.assertEqual(len(model.pathway_store), 2)
+        self.assertEqual(
+            len(model.pathway_store.find_pathways(reaction_id='R00658')), 1)
+        model.pathway_store.close()
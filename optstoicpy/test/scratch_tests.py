@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pulp
+from optstoicpy.script.scratch import (
+    ScratchDirectory,
+    scratch_root)
+from optstoicpy.script.solver import (
+    load_pulp_solver,
+    solver_scratch_directory)
+from optstoicpy.test.fixtures import ToyTestCase
+
+
+class TestScratchDirectory(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_scratch_directory(self):
+        with ScratchDirectory(root=self.tmpdir) as scratch:
+            other = ScratchDirectory(root=self.tmpdir)
+            self.assertNotEqual(scratch.path, other.path)
+            self.assertEqual(os.path.dirname(scratch.path), self.tmpdir)
+            with open(scratch.filepath('gurobi.log'), 'w') as f:
+                f.write('log')
+        self.assertFalse(scratch.exists)
+        self.assertTrue(other.exists)
+        other.cleanup()
+        other.cleanup()
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_scratch_root(self):
+        self.assertEqual(scratch_root(self.tmpdir, use_shm=True), self.tmpdir)
+        self.assertEqual(scratch_root(), tempfile.gettempdir())
+        if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+            self.assertEqual(scratch_root(use_shm=True), '/dev/shm')
+
+    def test_solver_scratch_directory(self):
+        pulp_solver = load_pulp_solver(['PULP_CBC_CMD'])
+        if pulp_solver is None:
+            self.skipTest("CBC is not available.")
+        self.assertNotEqual(pulp_solver.tmpDir, './')
+        self.assertTrue(os.path.isdir(pulp_solver.tmpDir))
+        tmp_dir = pulp_solver.tmpDir
+        with ScratchDirectory(root=self.tmpdir) as scratch:
+            with solver_scratch_directory(pulp_solver, scratch):
+                self.assertEqual(pulp_solver.tmpDir, scratch.path)
+        self.assertEqual(pulp_solver.tmpDir, tmp_dir)
+
+        del pulp_solver
+        self.assertFalse(os.path.exists(tmp_dir))
+
+
+class TestOptStoicScratch(ToyTestCase):
+    def test_optstoic_scratch(self):
+        scratch_dir = os.path.join(self.tmpdir, 'scratch')
+        model = self.make_toy_optstoic(max_iteration=2,
+                                       pulp_solver=pulp.PULP_CBC_CMD(msg=0),
+                                       scratch_root=scratch_dir)
+        cwd = os.listdir('.')
+        _, pathways = model.solve()
+        self.assertEqual(len(pathways), 2)
+        self.assertEqual(os.listdir(scratch_dir), [])
+        self.assertEqual(os.listdir('.'), cwd)
+
+    def test_command_line_scratch_directory(self):
+        scratch_dir = os.path.join(self.tmpdir, 'scratch')
+        # The API solvers write no files
+        model = self.make_toy_optstoic(pulp_solver=pulp.GUROBI(msg=0),
+                                       scratch_root=scratch_dir)
+        with model.command_line_scratch_directory() as scratch:
+            self.assertIsNone(scratch)
+        self.assertFalse(os.path.exists(scratch_dir))
+
+        model.pulp_solver = pulp.PULP_CBC_CMD(msg=0)
+        with model.command_line_scratch_directory() as scratch:
+            self.assertEqual(model.pulp_solver.tmpDir, scratch.path)
+        self.assertFalse(scratch.exists)
+        self.assertEqual(os.listdir(scratch_dir), [])
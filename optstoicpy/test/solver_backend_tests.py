@@ -0,0 +1,95 @@
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import pulp
+from optstoicpy.script.matrix_model import MatrixModel
+from optstoicpy.script.solver_backend import (
+    HIGHS_OPTIONS,
+    HighsBackend)
+from optstoicpy.test.fixtures import ToyTestCase
+
+
+def _count_pathways(model):
+    _, pathways = model.solve(backend='HiGHS')
+    return len(pathways)
+
+
+class TestSolverBackend(ToyTestCase):
+    def setUp(self):
+        if not HighsBackend.available():
+            self.skipTest("highspy is not installed.")
+        super(TestSolverBackend, self).setUp()
+
+    def create_model(self, add_loopless_constraints=False):
+        return self.make_toy_optstoic(
+            add_loopless_constraints=add_loopless_constraints,
+            max_iteration=3,
+            pulp_solver=pulp.PULP_CBC_CMD(msg=0))
+
+    def test_matrix_model_from_pulp(self):
+        lp_prob = self.create_model().create_minflux_problem()[0]
+        model = MatrixModel.from_pulp(lp_prob)
+        self.assertEqual(model.num_rows, len(lp_prob.constraints))
+        self.assertEqual(model.num_cols, len(lp_prob.variables()))
+        self.assertIn('v_R00200', model.col_index)
+
+    def test_persistent_backend_integer_cuts(self):
+        model = self.create_model()
+        _, pathways = model.solve(backend='HiGHS')
+
+        self.assertEqual(len(pathways), 2)
+        self.assertEqual(set(pathways[1].reaction_ids_no_exchange),
+                         set(['R00658', 'R01059']))
+        self.assertEqual(set(pathways[2].reaction_ids_no_exchange),
+                         set(['R00200', 'R00300', 'R01059']))
+
+    def test_persistent_backend_matches_pulp(self):
+        _, pulp_pathways = self.create_model().solve()
+        _, backend_pathways = self.create_model().solve(backend='HiGHS')
+
+        self.assertEqual(len(pulp_pathways), len(backend_pathways))
+        for ind, pathway in pulp_pathways.items():
+            self.assertEqual(
+                set(pathway.reaction_ids_no_exchange),
+                set(backend_pathways[ind].reaction_ids_no_exchange))
+
+    def test_warm_start(self):
+        model = self.create_model()
+        _, expected = model.solve()
+        self.assertIn('v_R01059', model.last_solution)
+
+        for backend in [None, 'HiGHS']:
+            _, pathways = self.create_model().solve(
+                backend=backend, warm_start=True,
+                initial_solution=model.last_solution)
+            self.assertEqual(
+                [p.reaction_ids for _, p in sorted(pathways.items())],
+                [p.reaction_ids for _, p in sorted(expected.items())])
+
+    def test_concurrent_solves_with_different_threads(self):
+        """The HiGHS runs of one process share a thread pool. Runs with
+        different numbers of threads must not fail, even in parallel."""
+        def solve(threads):
+            backend = HighsBackend(
+                options=dict(HIGHS_OPTIONS, threads=threads),
+                logger=self.logger)
+            _, pathways = self.create_model().solve(backend=backend)
+            return len(pathways)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(solve, [1, 2, 1, 2, 3, 1]))
+        self.assertEqual(results, [2] * 6)
+
+    def test_solve_after_fork(self):
+        """A forked process does not inherit the thread pool of HiGHS (a run
+        would hang)."""
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            self.skipTest("The fork start method is not available.")
+        # The loopless constraints make HiGHS start its thread pool
+        self.assertEqual(_count_pathways(self.create_model(True)), 2)
+        pool = multiprocessing.get_context('fork').Pool(1)
+        try:
+            result = pool.apply_async(_count_pathways,
+                                      (self.create_model(True),))
+            self.assertEqual(result.get(timeout=60), 2)
+        finally:
+            pool.terminate()
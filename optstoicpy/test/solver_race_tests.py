@@ -0,0 +1,75 @@
+import json
+import multiprocessing
+import os
+import pulp
+from optstoicpy.script.solver_race import (
+    SolverRace,
+    problem_key)
+from optstoicpy.test.fixtures import ToyTestCase
+
+CONFIGS = [
+    dict(name='CBC', solver='PULP_CBC_CMD'),
+    dict(name='CBC_no_presolve', solver='PULP_CBC_CMD',
+         kwargs=dict(presolve=False)),
+    dict(name='broken', solver='PULP_CBC_CMD',
+         kwargs=dict(path='/nonexistent/cbc'))]
+
+
+class TestSolverRace(ToyTestCase):
+    def setUp(self):
+        if not pulp.PULP_CBC_CMD(msg=0).available():
+            self.skipTest("CBC is not available.")
+        super(TestSolverRace, self).setUp()
+
+    def solve(self, pulp_solver):
+        model = self.make_toy_optstoic(max_iteration=3,
+                                       pulp_solver=pulp_solver)
+        _, pathways = model.solve()
+        return [(p.reaction_ids, p.total_flux_no_exchange)
+                for _, p in sorted(pathways.items())]
+
+    def test_race(self):
+        history_filepath = os.path.join(self.tmpdir, 'race_history.json')
+        race = SolverRace(configs=CONFIGS, history_filepath=history_filepath)
+        self.assertTrue(race.available())
+        pathways = self.solve(race)
+        self.assertEqual(pathways, self.solve(pulp.PULP_CBC_CMD(msg=0)))
+        self.assertEqual(multiprocessing.active_children(), [])
+
+        with open(history_filepath) as f:
+            history = json.load(f)
+        self.assertEqual(list(history), [race.last_key])
+        # One race per pathway
+        self.assertGreaterEqual(
+            sum(r['wins'] for r in history[race.last_key].values()),
+            len(pathways))
+        self.assertIn(race.best_config(race.last_key),
+                      ['CBC', 'CBC_no_presolve'])
+
+    def test_use_history(self):
+        lp_prob = pulp.LpProblem('test', pulp.LpMinimize)
+        x = pulp.LpVariable('x', lowBound=0, upBound=10, cat='Integer')
+        lp_prob += x
+        lp_prob += x >= 2.5
+        race = SolverRace(configs=CONFIGS, use_history=True, min_wins=1)
+        race.history = {problem_key(lp_prob): {'broken': dict(wins=0, time=[]),
+                                               'CBC': dict(wins=1, time=[])}}
+        lp_prob.solve(race)
+        self.assertEqual(pulp.LpStatus[lp_prob.status], 'Optimal')
+        self.assertEqual(x.varValue, 3)
+        self.assertEqual(list(race.last_race), ['CBC'])
+        self.assertEqual(race.history[problem_key(lp_prob)]['CBC']['wins'], 2)
+
+    def test_no_result(self):
+        lp_prob = pulp.LpProblem('test', pulp.LpMinimize)
+        x = pulp.LpVariable('x', lowBound=0)
+        lp_prob += x
+        race = SolverRace(configs=[CONFIGS[2]])
+        lp_prob.solve(race)
+        self.assertEqual(pulp.LpStatus[lp_prob.status], 'Not Solved')
+        self.assertEqual(race.last_race['broken'][0], 'Undefined')
+        self.assertEqual(race.history, {})
+
+    def test_unique_names(self):
+        with self.assertRaises(ValueError):
+            SolverRace(configs=[CONFIGS[0], CONFIGS[0]])
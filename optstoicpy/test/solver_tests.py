@@ -1,9 +1,16 @@
 import unittest
+import pulp
 from optstoicpy.script.solver import (
+    get_solver_kwargs,
     load_pulp_solver,
+    solver_warm_start,
+    supports_solution_pool,
+    SolverScheduler,
+    solve_with_solution_pool,
     ORDERED_SOLVERS,
     GLPK_CMD_OPTIONS,
     GUROBI_CMD_OPTIONS)
+from optstoicpy.test.fixtures import ToyTestCase
 
 
 class TestSolver(unittest.TestCase):
@@ -36,3 +43,91 @@ class TestSolver(unittest.TestCase):
             self.skipTest("GLPK_CMD is not available!")
         else:
             self.assertListEqual(GLPK_CMD_OPTIONS, solver.options)
+
+
+    def test_solver_warm_start(self):
+        pulp_solver = pulp.PULP_CBC_CMD(msg=0)
+        options = dict(pulp_solver.optionsDict)
+        with solver_warm_start(pulp_solver):
+            self.assertTrue(pulp_solver.optionsDict['warmStart'])
+        self.assertEqual(pulp_solver.optionsDict, options)
+        with solver_warm_start(pulp_solver, warm_start=False):
+            self.assertEqual(pulp_solver.optionsDict, options)
+
+
+class TestSolutionPool(ToyTestCase):
+    def solve(self, pulp_solver, **kwargs):
+        model = self.make_toy_optstoic(max_iteration=3,
+                                       pulp_solver=pulp_solver)
+        _, pathways = model.solve(**kwargs)
+        return [(sorted(p.reaction_ids_no_exchange), p.total_flux_no_exchange)
+                for _, p in sorted(pathways.items())]
+
+    def test_integer_cut_fallback(self):
+        pulp_solver = pulp.PULP_CBC_CMD(msg=0)
+        if not pulp_solver.available():
+            self.skipTest("CBC is not available.")
+        self.assertFalse(supports_solution_pool(pulp_solver))
+        with self.assertRaises(ValueError):
+            solve_with_solution_pool(pulp.LpProblem(), pulp_solver, 10)
+        self.assertEqual(self.solve(pulp_solver, pool_size=10),
+                         self.solve(pulp_solver))
+
+    def test_gurobi_solution_pool(self):
+        pulp_solver = load_pulp_solver(solver_names=['GUROBI'])
+        if not pulp_solver:
+            self.skipTest("GUROBI is not available!")
+        self.assertTrue(supports_solution_pool(pulp_solver))
+        self.assertEqual(self.solve(pulp_solver, pool_size=10),
+                         self.solve(pulp_solver))
+
+
+class TestSolverScheduler(ToyTestCase):
+    def create_model(self):
+        return self.make_toy_optstoic(max_iteration=2,
+                                      pulp_solver=pulp.PULP_CBC_CMD(msg=0))
+
+    def test_solver_threads(self):
+        self.assertEqual(get_solver_kwargs('GUROBI', threads=8)['Threads'], 8)
+        self.assertIn(('Threads', 8),
+                      get_solver_kwargs('GUROBI_CMD', threads=8)['options'])
+        self.assertEqual(
+            get_solver_kwargs('PULP_CBC_CMD', threads=3)['threads'], 3)
+
+    def test_thread_allocation(self):
+        scheduler = SolverScheduler(num_cores=64, max_threads=32)
+        job = scheduler.submit(None, solver_names=['PULP_CBC_CMD'])
+        # Nothing is running: start with all the cores (up to max_threads)
+        self.assertEqual(scheduler.allocate_threads(job, 'PULP_CBC_CMD', 1), 32)
+        self.assertEqual(scheduler.allocate_threads(job, 'PULP_CBC_CMD', 4), 16)
+        self.assertEqual(scheduler.allocate_threads(job, 'GLPK_CMD', 4), 1)
+
+    def test_run(self):
+        pulp_solver = pulp.PULP_CBC_CMD(msg=0)
+        if not pulp_solver.available():
+            self.skipTest("CBC is not available.")
+        _, expected = self.create_model().solve()
+
+        scheduler = SolverScheduler(num_cores=2,
+                                    licenses={'PULP_CBC_CMD': 1},
+                                    solver_names=['UNKNOWN', 'PULP_CBC_CMD'])
+        for _ in range(3):
+            scheduler.submit(self.create_model())
+        jobs = scheduler.run()
+
+        for job in jobs:
+            self.assertEqual(job.status, 'done')
+            self.assertEqual(job.solver_name, 'PULP_CBC_CMD')
+            self.assertEqual(job.threads, 2)
+            self.assertEqual(
+                [(p.reaction_ids, p.total_flux_no_exchange)
+                 for _, p in sorted(job.pathways.items())],
+                [(p.reaction_ids, p.total_flux_no_exchange)
+                 for _, p in sorted(expected.items())])
+
+        metrics = scheduler.metrics()
+        self.assertEqual(metrics['done'], 3)
+        self.assertEqual(metrics['queued'], 0)
+        self.assertEqual(metrics['solver_jobs'], {'PULP_CBC_CMD': 3})
+        self.assertGreater(metrics['core_seconds'], 0)
+        self.assertLessEqual(metrics['utilization'], 1.0)
@@ -13,7 +13,6 @@ install_requires = [
     'xlrd',
     'scipy>=0.17.0',
     'numpy>=1.11.1',
-    'sympy',
     'graphviz>=0.4.8',
     'PuLP>=1.6.1',
     'future'
@@ -47,7 +46,8 @@ setup(
     test_suite='nose.collector',
     tests_require=test_requires,
     extras_require={
-        "Jupyter": ['notebook', 'ipykernel']
+        "Jupyter": ['notebook', 'ipykernel'],
+        "HiGHS": ['highspy']
     },
     package_dir={'optstoicpy': 'optstoicpy'},
     package_data={